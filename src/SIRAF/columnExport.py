@@ -0,0 +1,220 @@
+import datetime
+import json
+import pathlib
+
+from recordCodec import RecordCodec
+from schema import FieldType
+
+try:
+    import numpy
+except ImportError:           # numpy is optional; only this module needs it
+    numpy = None
+
+# Bulk export of a schema-typed .ravrf file into NumPy columns.
+# The records are scanned in file order and handled a batch at a time. The fixed part of every record
+# in the batch (null bitmap, fixed-width fields and str offset table) is joined into one contiguous
+# buffer and viewed with a single structured dtype, so all numeric fields are decoded with one
+# frombuffer call per batch. Only str fields are sliced row by row. The columns are allocated once, for
+# the file's RecordCount, and only grow if records are added while the scan runs.
+#
+# Columns come back as (columns, nulls): columns maps field name -> array, with "rref" holding the
+# RREF of each row, and nulls maps field name -> bool array that is True where the value was None.
+# Field types map to int64, float64, bool, complex128, datetime64[D] (date), timedelta64[us] (time),
+# datetime64[us] (timestamp) and object (str).
+
+BATCH_SIZE = 65536
+RREF_COLUMN = "rref"
+ORDINAL_1970 = datetime.date(1970, 1, 1).toordinal()
+SIDECAR_MANIFEST = "columns.json"
+
+def exportColumns(rave, codec: RecordCodec = None, fields: list[str] = None,
+                  batchSize: int = BATCH_SIZE) -> tuple[dict, dict]:
+    exporter = ColumnExporter(codec or RecordCodec.fromMeta(rave.GetMeta()), fields, rave.RecordCount())
+    batch = []
+    for rref, data in rave.Scan():
+        batch.append((rref, data))
+        if len(batch) >= batchSize:
+            exporter.addBatch(batch)
+            batch = []
+    if batch:
+        exporter.addBatch(batch)
+    return exporter.finish()
+
+def exportRecords(rave, codec: RecordCodec = None, fields: list[str] = None,
+                  batchSize: int = BATCH_SIZE) -> tuple:
+    # Same export as one structured array, one row per record
+    columns, nulls = exportColumns(rave, codec, fields, batchSize)
+    count = len(columns[RREF_COLUMN])
+    records = numpy.empty(count, dtype = [(name, column.dtype) for name, column in columns.items()])
+    for name, column in columns.items():
+        records[name] = column
+    return records, nulls
+
+def writeSidecar(rave, directory: pathlib.Path, codec: RecordCodec = None, fields: list[str] = None,
+                 batchSize: int = BATCH_SIZE) -> pathlib.Path:
+    # Writes each column to <directory>/<field>.npy (memory mappable) with <field>.nulls.npy beside it.
+    # str columns are stored as <field>.utf8 plus <field>.offsets.npy.
+    directory = pathlib.Path(directory)
+    directory.mkdir(parents = True, exist_ok = True)
+    columns, nulls = exportColumns(rave, codec, fields, batchSize)
+
+    manifest = {"rows": len(columns[RREF_COLUMN]), "columns": {}}
+    for name, column in columns.items():
+        if column.dtype == object:
+            texts = [text.encode("utf-8") if text is not None else b"" for text in column]
+            offsets = numpy.zeros(len(texts) + 1, dtype = numpy.int64)
+            numpy.cumsum([len(text) for text in texts], out = offsets[1:])
+            (directory / f"{name}.utf8").write_bytes(b"".join(texts))
+            numpy.save(directory / f"{name}.offsets.npy", offsets)
+            manifest["columns"][name] = "str"
+        else:
+            numpy.save(directory / f"{name}.npy", column)
+            manifest["columns"][name] = str(column.dtype)
+        if name in nulls:
+            numpy.save(directory / f"{name}.nulls.npy", nulls[name])
+
+    path = directory / SIDECAR_MANIFEST
+    path.write_text(json.dumps(manifest, indent = 2), encoding = "utf-8")
+    return path
+
+def loadSidecar(directory: pathlib.Path, mmap: bool = True) -> tuple[dict, dict]:
+    requireNumpy()
+    directory = pathlib.Path(directory)
+    manifest = json.loads((directory / SIDECAR_MANIFEST).read_text(encoding = "utf-8"))
+    mode = "r" if mmap else None
+    columns = {}
+    nulls = {}
+    for name, columnType in manifest["columns"].items():
+        if columnType == "str":
+            textPath = directory / f"{name}.utf8"
+            text = numpy.memmap(textPath, mode = "r") if mmap and textPath.stat().st_size > 0 else \
+                numpy.frombuffer(textPath.read_bytes(), dtype = numpy.uint8)
+            columns[name] = TextColumn(numpy.load(directory / f"{name}.offsets.npy", mmap_mode = mode), text)
+        else:
+            columns[name] = numpy.load(directory / f"{name}.npy", mmap_mode = mode)
+        nullPath = directory / f"{name}.nulls.npy"
+        if nullPath.exists():
+            nulls[name] = numpy.load(nullPath, mmap_mode = mode)
+    return columns, nulls
+
+def requireNumpy() -> None:
+    if numpy is None:
+        raise ImportError("Column export needs numpy; install it with 'pip install numpy'")
+
+
+class TextColumn:
+    # A str column read from a sidecar: UTF-8 bytes plus n + 1 offsets, decoded on access
+    def __init__(self, offsets, text):
+        self.offsets = offsets
+        self.text = text
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, index: int) -> str:
+        return bytes(self.text[self.offsets[index]:self.offsets[index + 1]]).decode("utf-8")
+
+
+class ColumnExporter:
+    __INITIAL_ROWS = 1024
+    __NULLS = "__nulls"
+    __ENDS = "__ends"
+    __WIRE_FORMATS = {
+        FieldType.BOOL: "?", FieldType.INT: ">i8", FieldType.FLOAT: ">f8", FieldType.DATE: ">i4",
+        FieldType.TIME: ">i8", FieldType.TIMESTAMP: ">i8",
+    }
+    __COLUMN_FORMATS = {
+        FieldType.BOOL: "?", FieldType.INT: "i8", FieldType.FLOAT: "f8", FieldType.COMPLEX: "c16",
+        FieldType.DATE: "datetime64[D]", FieldType.TIME: "timedelta64[us]", FieldType.TIMESTAMP: "datetime64[us]",
+        FieldType.STR: object,
+    }
+
+    def __init__(self, codec: RecordCodec, fields: list[str] = None, expectedRows: int = 0):
+        # expectedRows sizes the columns up front; without it they start small and double as needed
+        requireNumpy()
+        schema = codec.schema
+        self.__codec = codec
+        self.__fields = list(fields) if fields is not None else [field.name for field in schema.fields]
+        for name in self.__fields:
+            schema.getField(name)
+        self.__positions = {field.name: position for position, field in enumerate(schema.fields)}
+        self.__types = {name: schema.getField(name).field_type for name in self.__fields}
+        self.__textIndex = {name: index for index, name in enumerate(codec.textFields)}
+
+        names, formats, offsets = [self.__NULLS], [("u1", codec.nullSize)], [0]
+        for name, fieldType, offset in codec.fixedFields:
+            if name not in self.__types:
+                continue
+            if fieldType == FieldType.COMPLEX:
+                names += [f"{name}.real", f"{name}.imag"]
+                formats += [">f8", ">f8"]
+                offsets += [offset, offset + 8]
+            else:
+                names.append(name)
+                formats.append(self.__WIRE_FORMATS[fieldType])
+                offsets.append(offset)
+        if self.__textIndex:
+            names.append(self.__ENDS)
+            formats.append((">u4", len(self.__textIndex)))
+            offsets.append(codec.offsetTableOffset)
+        self.__headerDtype = numpy.dtype({"names": names, "formats": formats, "offsets": offsets,
+                                          "itemsize": codec.fixedSize})
+
+        self.__count = 0
+        self.__capacity = expectedRows if expectedRows > 0 else self.__INITIAL_ROWS
+        self.__columns = {RREF_COLUMN: numpy.empty(self.__capacity, dtype = numpy.int64)}
+        self.__nulls = {}
+        for name in self.__fields:
+            self.__columns[name] = numpy.empty(self.__capacity, dtype = self.__COLUMN_FORMATS[self.__types[name]])
+            self.__nulls[name] = numpy.empty(self.__capacity, dtype = bool)
+
+    def addBatch(self, batch: list[tuple[int, bytes]]) -> None:
+        rows = len(batch)
+        self.__reserve(self.__count + rows)
+        fixedSize = self.__codec.fixedSize
+        header = numpy.frombuffer(b"".join(memoryview(data)[:fixedSize] for _, data in batch),
+                                  dtype = self.__headerDtype)
+        nullBits = numpy.unpackbits(header[self.__NULLS], axis = 1, bitorder = "little")
+        rowSlice = slice(self.__count, self.__count + rows)
+
+        self.__columns[RREF_COLUMN][rowSlice] = [rref for rref, _ in batch]
+        for name in self.__fields:
+            fieldType = self.__types[name]
+            self.__nulls[name][rowSlice] = nullBits[:, self.__positions[name]].astype(bool)
+            column = self.__columns[name]
+            match fieldType:
+                case FieldType.STR:
+                    column[rowSlice] = self.__decodeText(batch, header, self.__textIndex[name])
+                    column[rowSlice][self.__nulls[name][rowSlice]] = None
+                case FieldType.COMPLEX:
+                    column[rowSlice].real = header[f"{name}.real"]
+                    column[rowSlice].imag = header[f"{name}.imag"]
+                case FieldType.DATE:
+                    column[rowSlice] = (header[name].astype(numpy.int64) - ORDINAL_1970).astype("datetime64[D]")
+                case FieldType.TIME | FieldType.TIMESTAMP:
+                    column[rowSlice] = header[name].astype(numpy.int64).astype(column.dtype)
+                case _:
+                    column[rowSlice] = header[name]
+        self.__count += rows
+
+    def finish(self) -> tuple[dict, dict]:
+        columns = {name: column[:self.__count] for name, column in self.__columns.items()}
+        nulls = {name: null[:self.__count] for name, null in self.__nulls.items()}
+        return columns, nulls
+
+    def __decodeText(self, batch: list, header, textIndex: int) -> list:
+        varStart = self.__codec.fixedSize
+        ends = header[self.__ENDS][:, textIndex]
+        starts = header[self.__ENDS][:, textIndex - 1] if textIndex > 0 else numpy.zeros(len(batch), dtype = int)
+        return [str(data[varStart + start:varStart + end], "utf-8")
+                for (_, data), start, end in zip(batch, starts.tolist(), ends.tolist())]
+
+    def __reserve(self, rows: int) -> None:
+        if rows <= self.__capacity:
+            return
+        self.__capacity = max(rows, 2 * self.__capacity)
+        for store in (self.__columns, self.__nulls):
+            for name, column in store.items():
+                grown = numpy.empty(self.__capacity, dtype = column.dtype)
+                grown[:self.__count] = column[:self.__count]
+                store[name] = grown
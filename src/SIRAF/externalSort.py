@@ -0,0 +1,59 @@
+import heapq
+import struct
+import tempfile
+
+# Stable sort of an unbounded stream of byte records in bounded memory.
+# Records are gathered until they hold about memoryBytes, sorted and, when more follow, spilled to a
+# temporary run file; the runs are then merged lazily, one buffered reader per run. Each run entry is
+# the record's position in the input and its length, then the record, so equal keys keep input order.
+
+RUN_ENTRY = struct.Struct(">QI")
+READ_BUFFER = 65536
+
+def externalSort(records, keyOf, memoryBytes: int = 64 * 1024 * 1024):
+    # Yields the records ordered by keyOf(record)
+    with tempfile.TemporaryDirectory() as directory:
+        runs = []
+        batch = []
+        batchBytes = 0
+        for sequence, record in enumerate(records):
+            batch.append((keyOf(record), sequence, bytes(record)))
+            batchBytes += len(record) + 64
+            if batchBytes >= memoryBytes:
+                runs.append(writeRun(batch, f"{directory}/run{len(runs)}"))
+                batch = []
+                batchBytes = 0
+
+        if not runs:
+            batch.sort(key = lambda entry: entry[:2])
+            for _, _, record in batch:
+                yield record
+            return
+
+        if batch:
+            runs.append(writeRun(batch, f"{directory}/run{len(runs)}"))
+        readers = [readRun(path, keyOf) for path in runs]
+        try:
+            for _, _, record in heapq.merge(*readers, key = lambda entry: entry[:2]):
+                yield record
+        finally:
+            for reader in readers:
+                reader.close()
+
+def readRun(path: str, keyOf):
+    with open(path, "rb", buffering = READ_BUFFER) as run:
+        while True:
+            head = run.read(RUN_ENTRY.size)
+            if not head:
+                return
+            sequence, length = RUN_ENTRY.unpack(head)
+            record = run.read(length)
+            yield keyOf(record), sequence, record
+
+def writeRun(batch: list, path: str) -> str:
+    batch.sort(key = lambda entry: entry[:2])
+    with open(path, "wb", buffering = READ_BUFFER) as run:
+        for _, sequence, record in batch:
+            run.write(RUN_ENTRY.pack(sequence, len(record)))
+            run.write(record)
+    return path
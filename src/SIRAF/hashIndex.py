@@ -0,0 +1,248 @@
+import hashlib
+import struct
+
+from blockDescriptor import BlockType
+from externalSort import externalSort
+
+class HashIndex:
+    # Extendible hash index from encoded key to record RREF, kept in INDEX blocks of the same .ravrf file.
+    #   directory - global depth followed by 2^depth bucket RREFs; held in memory once loaded
+    #   bucket    - fixed size block: local depth and entry count, then (hash, RREF, key length, key)
+    # A key hashes to a 32 bit value and its low <global depth> bits pick the directory slot, so a find,
+    # add or duplicate check reads exactly one bucket. A full bucket splits on its own; the directory only
+    # doubles (a copy of the RREF list) when the bucket was already at the global depth. Nothing is ever
+    # rehashed as a whole.
+    BUCKET_SIZE = 4096
+    __MAX_DEPTH = 32
+    __BUCKET_HEAD = struct.Struct(">BH")
+    __ENTRY_HEAD = struct.Struct(">IIH")
+    __DEPTH = struct.Struct(">B")
+    __SORT_HEAD = struct.Struct(">II")
+
+    def __init__(self, rave, directoryRREF: int):
+        self.__rave = rave
+        self.__directoryRREF = directoryRREF
+        self.bucketReads = 0
+
+        directory = rave.ReadData(directoryRREF, BlockType.INDEX_BLOCK)
+        self.__depth = self.__DEPTH.unpack_from(directory)[0]
+        self.__directory = list(struct.unpack_from(f">{1 << self.__depth}I", directory, self.__DEPTH.size))
+
+    @property
+    def depth(self) -> int:
+        return self.__depth
+
+    @property
+    def directoryRREF(self) -> int:
+        # Changes when the directory outgrows its block; the owner must then record the new RREF
+        return self.__directoryRREF
+
+    def bucketRREFs(self) -> list[int]:
+        return sorted(set(self.__directory))
+
+    def find(self, key: bytes) -> int:
+        # The RREF stored for key, or None
+        keyHash = self.hashKey(key)
+        _, entries = self.__readBucket(self.__directory[keyHash & ((1 << self.__depth) - 1)])
+        for entryHash, recordRREF, entryKey in entries:
+            if entryHash == keyHash and entryKey == key:
+                return recordRREF
+        return None
+
+    def insert(self, key: bytes, recordRREF: int) -> None:
+        key = bytes(key)
+        if self.__ENTRY_HEAD.size + len(key) > self.BUCKET_SIZE - self.__BUCKET_HEAD.size:
+            raise ValueError("Key is too long for a hash bucket")
+
+        keyHash = self.hashKey(key)
+        while True:
+            slot = keyHash & ((1 << self.__depth) - 1)
+            bucketRREF = self.__directory[slot]
+            localDepth, entries = self.__readBucket(bucketRREF)
+            if any(entryHash == keyHash and entryKey == key for entryHash, _, entryKey in entries):
+                raise ValueError("Key already exists")
+
+            entries.append((keyHash, recordRREF, key))
+            if self.__bucketSize(entries) <= self.BUCKET_SIZE:
+                self.__writeBucket(bucketRREF, localDepth, entries)
+                return
+            entries.pop()
+            self.__split(slot, bucketRREF, localDepth, entries)
+
+    def remove(self, key: bytes) -> int:
+        # Drops key and returns its RREF, or None when it was not there. Buckets are never merged.
+        keyHash = self.hashKey(key)
+        bucketRREF = self.__directory[keyHash & ((1 << self.__depth) - 1)]
+        localDepth, entries = self.__readBucket(bucketRREF)
+        for index, (entryHash, recordRREF, entryKey) in enumerate(entries):
+            if entryHash == keyHash and entryKey == key:
+                del entries[index]
+                self.__writeBucket(bucketRREF, localDepth, entries)
+                return recordRREF
+        return None
+
+    def update(self, key: bytes, recordRREF: int) -> None:
+        # Points an existing key at a relocated record
+        keyHash = self.hashKey(key)
+        bucketRREF = self.__directory[keyHash & ((1 << self.__depth) - 1)]
+        localDepth, entries = self.__readBucket(bucketRREF)
+        for index, (entryHash, _, entryKey) in enumerate(entries):
+            if entryHash == keyHash and entryKey == key:
+                entries[index] = (entryHash, recordRREF, entryKey)
+                self.__writeBucket(bucketRREF, localDepth, entries)
+                return
+        raise KeyError("Key is not in the index")
+
+    @classmethod
+    def __bucketSize(cls, entries: list) -> int:
+        return cls.__BUCKET_HEAD.size + sum(cls.__ENTRY_HEAD.size + len(key) for _, _, key in entries)
+
+    def __readBucket(self, bucketRREF: int) -> tuple[int, list]:
+        self.bucketReads += 1
+        bucket = self.__rave.ReadData(bucketRREF, BlockType.INDEX_BLOCK)
+        localDepth, count = self.__BUCKET_HEAD.unpack_from(bucket)
+        entries = []
+        offset = self.__BUCKET_HEAD.size
+        for _ in range(count):
+            keyHash, recordRREF, keyLength = self.__ENTRY_HEAD.unpack_from(bucket, offset)
+            offset += self.__ENTRY_HEAD.size
+            entries.append((keyHash, recordRREF, bytes(bucket[offset:offset + keyLength])))
+            offset += keyLength
+        return localDepth, entries
+
+    def __split(self, slot: int, bucketRREF: int, localDepth: int, entries: list) -> None:
+        # Splits one bucket on its next hash bit, doubling the directory first when it has to
+        if localDepth == self.__depth:
+            if self.__depth == self.__MAX_DEPTH:
+                raise ValueError("Hash index cannot split any further")
+            self.__directory += self.__directory
+            self.__depth += 1
+
+        bit = 1 << localDepth
+        stay = [entry for entry in entries if not entry[0] & bit]
+        move = [entry for entry in entries if entry[0] & bit]
+        newRREF = self.__addBucket(localDepth + 1, move)
+        bucketRREF = self.__writeBucket(bucketRREF, localDepth + 1, stay)
+        low = slot & (bit - 1)
+        for index in range(low, len(self.__directory), bit):
+            self.__directory[index] = newRREF if index & bit else bucketRREF
+        self.__writeDirectory()
+
+    def __addBucket(self, localDepth: int, entries: list) -> int:
+        payload = self.__encodeBucket(localDepth, entries)
+        return self.__rave.Add(payload, self.BUCKET_SIZE - len(payload), BlockType.INDEX_BLOCK)
+
+    @classmethod
+    def __encodeBucket(cls, localDepth: int, entries: list) -> bytes:
+        parts = [cls.__BUCKET_HEAD.pack(localDepth, len(entries))]
+        for keyHash, recordRREF, key in entries:
+            parts += [cls.__ENTRY_HEAD.pack(keyHash, recordRREF, len(key)), key]
+        return b"".join(parts)
+
+    @staticmethod
+    def __lowBitsFirst(keyHash: int) -> int:
+        # The 32 bit hash with its bits reversed; sorting on it keeps each low-bit prefix together
+        return int(f"{keyHash:032b}"[::-1], 2)
+
+    def __writeBucket(self, bucketRREF: int, localDepth: int, entries: list) -> int:
+        # A bucket only moves when a snapshot forces the Save to copy it; the directory follows it
+        payload = self.__encodeBucket(localDepth, entries)
+        newRREF = self.__rave.Save(bucketRREF, payload, self.BUCKET_SIZE - len(payload), BlockType.INDEX_BLOCK)
+        if newRREF != bucketRREF:
+            self.__directory = [newRREF if rref == bucketRREF else rref for rref in self.__directory]
+            self.__writeDirectory()
+        return newRREF
+
+    def __writeDirectory(self) -> None:
+        payload = self.encodeDirectory(self.__depth, self.__directory)
+        self.__directoryRREF = self.__rave.Save(self.__directoryRREF, payload, len(payload), BlockType.INDEX_BLOCK)
+
+    @classmethod
+    def create(cls, rave) -> "HashIndex":
+        # An empty index: depth 0 and a single empty bucket
+        payload = cls.__BUCKET_HEAD.pack(0, 0)
+        bucketRREF = rave.Add(payload, cls.BUCKET_SIZE - len(payload), BlockType.INDEX_BLOCK)
+        directory = cls.encodeDirectory(0, [bucketRREF])
+        return cls(rave, rave.Add(directory, 64, BlockType.INDEX_BLOCK))
+
+    @classmethod
+    def build(cls, rave, entries, memoryBytes: int = 64 * 1024 * 1024, batchBytes: int = 1024 * 1024) -> "HashIndex":
+        # Bottom-up build from an iterable of (key, RREF) pairs with unique keys, in about memoryBytes.
+        # The pairs are sorted on their hash read low bit first (see externalSort.py), so every group
+        # that shares its low hash bits comes out in one run. A group is only split on its next bit when
+        # it does not fit one bucket, so buckets come out as full as they can be; only one bucket's worth
+        # of entries is looked at a time. Buckets are written back to back, AddMany about batchBytes at once.
+        def encoded():
+            for key, recordRREF in entries:
+                if cls.__bucketSize([(0, 0, key)]) > cls.BUCKET_SIZE:
+                    raise ValueError("Key is too long for a hash bucket")
+                yield cls.__SORT_HEAD.pack(cls.__lowBitsFirst(cls.hashKey(key)), recordRREF) + bytes(key)
+
+        def sortedEntries():
+            for record in externalSort(encoded(), lambda record: record[:cls.__SORT_HEAD.size], memoryBytes):
+                sortKey, recordRREF = cls.__SORT_HEAD.unpack_from(record)
+                yield cls.__lowBitsFirst(sortKey), recordRREF, bytes(record[cls.__SORT_HEAD.size:])
+
+        stream = sortedEntries()
+        ahead = []
+
+        def fitting(localDepth: int, prefix: int) -> int:
+            # How many entries at the front have these low hash bits, or -1 when they overflow a bucket
+            mask = (1 << localDepth) - 1
+            size = cls.__BUCKET_HEAD.size
+            count = 0
+            while True:
+                if count == len(ahead):
+                    entry = next(stream, None)
+                    if entry is None:
+                        return count
+                    ahead.append(entry)
+                if ahead[count][0] & mask != prefix:
+                    return count
+                size += cls.__ENTRY_HEAD.size + len(ahead[count][2])
+                if size > cls.BUCKET_SIZE:
+                    return -1
+                count += 1
+
+        buckets = []                # (local depth, low hash bits)
+        bucketRREFs = []
+        payloads = []
+
+        def flush() -> None:
+            bucketRREFs.extend(rave.AddMany(payloads, [cls.BUCKET_SIZE - len(payload) for payload in payloads],
+                                            BlockType.INDEX_BLOCK))
+            payloads.clear()
+
+        pending = [(0, 0)]
+        while pending:
+            localDepth, prefix = pending.pop()
+            count = fitting(localDepth, prefix)
+            if count >= 0:
+                buckets.append((localDepth, prefix))
+                payloads.append(cls.__encodeBucket(localDepth, ahead[:count]))
+                del ahead[:count]
+                if len(payloads) * cls.BUCKET_SIZE >= batchBytes:
+                    flush()
+                continue
+            if localDepth == cls.__MAX_DEPTH:
+                raise ValueError("Hash index cannot split any further")
+            pending.append((localDepth + 1, prefix | 1 << localDepth))
+            pending.append((localDepth + 1, prefix))
+        if payloads:
+            flush()
+
+        depth = max(localDepth for localDepth, _ in buckets)
+        directory = [0] * (1 << depth)
+        for (localDepth, prefix), bucketRREF in zip(buckets, bucketRREFs):
+            for index in range(prefix, len(directory), 1 << localDepth):
+                directory[index] = bucketRREF
+        payload = cls.encodeDirectory(depth, directory)
+        return cls(rave, rave.Add(payload, len(payload), BlockType.INDEX_BLOCK))
+
+    @classmethod
+    def encodeDirectory(cls, depth: int, directory: list[int]) -> bytes:
+        return cls.__DEPTH.pack(depth) + struct.pack(f">{len(directory)}I", *directory)
+
+    @staticmethod
+    def hashKey(key: bytes) -> int:
+        return int.from_bytes(hashlib.blake2b(key, digest_size = 4).digest(), "big")
@@ -0,0 +1,88 @@
+import hashlib
+import math
+import struct
+
+class KeyFilter:
+    # Counting Bloom filter over encoded keys: answers "certainly absent" or "maybe present".
+    # Each of the m counters is 4 bits, two to a byte; a key sets k counters picked by double hashing
+    # one 128 bit digest. Counters let a key be removed again; one that reaches 15 stays there, since
+    # it can no longer tell how many keys share it. Kept in an INDEX block as:
+    #   version, k, m, key count, then the counters
+    __HEAD = struct.Struct(">BBII")
+    __VERSION = 1
+    __SATURATED = 15
+
+    def __init__(self, hashCount: int, counterCount: int, counters: bytearray = None, count: int = 0):
+        if hashCount <= 0 or counterCount <= 0:
+            raise ValueError("A key filter needs at least one hash and one counter")
+        self.__hashCount = hashCount
+        self.__counterCount = counterCount
+        self.__counters = counters if counters is not None else bytearray((counterCount + 1) // 2)
+        self.count = count
+
+    def __contains__(self, key: bytes) -> bool:
+        return self.mayContain(key)
+
+    @property
+    def hashCount(self) -> int:
+        return self.__hashCount
+
+    @property
+    def counterCount(self) -> int:
+        return self.__counterCount
+
+    def add(self, key: bytes) -> None:
+        for position in self.__positions(key):
+            value = self.__get(position)
+            if value < self.__SATURATED:
+                self.__set(position, value + 1)
+        self.count += 1
+
+    def encode(self) -> bytes:
+        return self.__HEAD.pack(self.__VERSION, self.__hashCount, self.__counterCount, self.count) + self.__counters
+
+    def mayContain(self, key: bytes) -> bool:
+        return all(self.__get(position) for position in self.__positions(key))
+
+    def remove(self, key: bytes) -> None:
+        # Only for keys that were added; removing anything else can hide keys that are present
+        for position in self.__positions(key):
+            value = self.__get(position)
+            if 0 < value < self.__SATURATED:
+                self.__set(position, value - 1)
+        self.count = max(self.count - 1, 0)
+
+    def __get(self, position: int) -> int:
+        return (self.__counters[position >> 1] >> ((position & 1) << 2)) & 0x0F
+
+    def __positions(self, key: bytes):
+        digest = hashlib.blake2b(key, digest_size = 16).digest()
+        first = int.from_bytes(digest[:8], "big")
+        step = int.from_bytes(digest[8:], "big") | 1
+        for index in range(self.__hashCount):
+            yield (first + index * step) % self.__counterCount
+
+    def __set(self, position: int, value: int) -> None:
+        shift = (position & 1) << 2
+        index = position >> 1
+        self.__counters[index] = (self.__counters[index] & ~(0x0F << shift) & 0xFF) | (value << shift)
+
+    @classmethod
+    def decode(cls, data: bytes) -> "KeyFilter":
+        version, hashCount, counterCount, count = cls.__HEAD.unpack_from(data)
+        if version != cls.__VERSION:
+            raise ValueError(f"Unknown key filter version {version}")
+        counters = bytearray(data[cls.__HEAD.size:])
+        if len(counters) != (counterCount + 1) // 2:
+            raise ValueError("Key filter is truncated")
+        return cls(hashCount, counterCount, counters, count)
+
+    @classmethod
+    def sized(cls, expectedKeys: int, falsePositiveRate: float) -> "KeyFilter":
+        # The usual optimum: m = -n ln p / (ln 2)^2 counters and k = m / n ln 2 hashes
+        if not 0 < falsePositiveRate < 1:
+            raise ValueError("False positive rate must be between 0 and 1")
+        expectedKeys = max(int(expectedKeys), 1)
+        counterCount = math.ceil(-expectedKeys * math.log(falsePositiveRate) / math.log(2) ** 2)
+        hashCount = max(1, round(counterCount / expectedKeys * math.log(2)))
+        return cls(hashCount, counterCount)
@@ -0,0 +1,249 @@
+import datetime
+import struct
+
+from schema import FieldType, Schema
+
+class RecordCodec:
+    # Compiled binary layout for the records of one schema:
+    #   null bitmap    - 1 bit per field, set when the field is None; little-endian, so field n is bit
+    #                    n % 8 of byte n // 8 and decodeField can test it without building an integer
+    #   fixed section  - bool, int, float, complex, date, time and timestamp fields at fixed offsets
+    #   offset table   - 4 byte end offset, within the variable section, of each str field
+    #   variable part  - the UTF-8 text of the str fields, back to back
+    # Any single field can be decoded from its offset without touching the rest of the record.
+    #
+    # Encodings (big-endian like the rest of the file; only the null bitmap is little-endian):
+    #   bool ?, int q (64 bit), float d, complex dd, date i (proleptic ordinal),
+    #   time q (microseconds since midnight), timestamp q (microseconds since 1970-01-01).
+    #   Aware times and timestamps are converted to UTC; they decode as naive UTC values.
+    # encode checks every value against its field's type: a value of the wrong type raises TypeError
+    # (ints are accepted for float and complex, bool is never taken for a number) and an int outside
+    # 64 bits raises ValueError.
+    __EPOCH = datetime.datetime(1970, 1, 1)
+    __FORMATS = {
+        FieldType.BOOL: "?", FieldType.INT: "q", FieldType.FLOAT: "d", FieldType.COMPLEX: "dd",
+        FieldType.DATE: "i", FieldType.TIME: "q", FieldType.TIMESTAMP: "q",
+    }
+    __INT_RANGE = range(-(1 << 63), 1 << 63)
+    __TYPES = {
+        FieldType.BOOL: (bool,), FieldType.INT: (int,), FieldType.FLOAT: (int, float),
+        FieldType.COMPLEX: (int, float, complex), FieldType.DATE: (datetime.date,),
+        FieldType.TIME: (datetime.time,), FieldType.TIMESTAMP: (datetime.datetime,), FieldType.STR: (str,),
+    }
+
+    def __init__(self, schema: Schema):
+        self.schema = schema
+        self.__nullSize = (len(schema.fields) + 7) // 8
+
+        fixedFormat = ">"
+        self.__fixedFields = []       # (name, position, first struct slot, slot count, encoder, decoder, zeros)
+        self.__varFields = []         # (name, position in schema)
+        self.__fieldLayout = {}       # name -> (position, fixed struct or None, offset or var index)
+        slot = 0
+        for position, field in enumerate(schema.fields):
+            if field.field_type == FieldType.STR:
+                self.__fieldLayout[field.name] = (position, None, len(self.__varFields))
+                self.__varFields.append((field.name, position))
+                continue
+
+            fieldFormat = self.__FORMATS[field.field_type]
+            offset = self.__nullSize + struct.calcsize(fixedFormat)
+            self.__fieldLayout[field.name] = (position, struct.Struct(">" + fieldFormat), offset)
+            self.__fixedFields.append((field.name, position, slot, len(fieldFormat),
+                                       self.__checkedEncoder(field.name, field.field_type),
+                                       self.__slotDecoder(field.field_type),
+                                       (0,) * len(fieldFormat)))
+            fixedFormat += fieldFormat
+            slot += len(fieldFormat)
+
+        self.__fixedStruct = struct.Struct(fixedFormat)
+        self.__offsetStruct = struct.Struct(f">{len(self.__varFields)}I")
+        self.__varStart = self.__nullSize + self.__fixedStruct.size + self.__offsetStruct.size
+
+        # Decoding walks the fields in schema order: (name, null mask, first slot or -1 for text,
+        # slot count or text index, decoder or None when the slot is already the value)
+        self.__decodePlan = []
+        fixedPlan = {name: (slot, count, decoder) for name, _, slot, count, _, decoder, _ in self.__fixedFields}
+        for position, field in enumerate(schema.fields):
+            if field.name not in fixedPlan:
+                self.__decodePlan.append((field.name, 1 << position, -1, self.__fieldLayout[field.name][2], None))
+                continue
+            slot, count, decoder = fixedPlan[field.name]
+            plain = field.field_type in (FieldType.BOOL, FieldType.INT, FieldType.FLOAT)
+            self.__decodePlan.append((field.name, 1 << position, slot, count, None if plain else decoder))
+
+        keyFields = [schema.getField(name) for name in schema.key]
+        self.__keyCodec = self if keyFields == schema.fields else \
+            RecordCodec(Schema(schema.name, keyFields, schema.key))
+
+    @property
+    def fixedSize(self) -> int:
+        # Bytes taken by everything ahead of the variable part
+        return self.__varStart
+
+    @property
+    def fixedFields(self) -> list[tuple[str, FieldType, int]]:
+        # (name, type, byte offset) of every fixed-width field, in layout order
+        return [(name, self.schema.getField(name).field_type, self.__fieldLayout[name][2])
+                for name, *_ in self.__fixedFields]
+
+    @property
+    def nullSize(self) -> int:
+        return self.__nullSize
+
+    @property
+    def offsetTableOffset(self) -> int:
+        return self.__nullSize + self.__fixedStruct.size
+
+    @property
+    def textFields(self) -> list[str]:
+        # str fields in offset table order
+        return [name for name, _ in self.__varFields]
+
+    def encode(self, record: dict) -> bytes:
+        nulls = 0
+        slots = []
+        for name, position, _, _, encoder, _, zeros in self.__fixedFields:
+            value = record.get(name)
+            if value is None:
+                nulls |= 1 << position
+                slots.extend(zeros)
+            else:
+                slots.extend(encoder(value))
+
+        texts = []
+        ends = []
+        end = 0
+        for name, position in self.__varFields:
+            value = record.get(name)
+            if value is None:
+                nulls |= 1 << position
+            else:
+                self.__checkType(name, FieldType.STR, value)
+                text = value.encode("utf-8")
+                texts.append(text)
+                end += len(text)
+            ends.append(end)
+
+        return b"".join([nulls.to_bytes(self.__nullSize, "little"), self.__fixedStruct.pack(*slots),
+                         self.__offsetStruct.pack(*ends)] + texts)
+
+    def decode(self, data: bytes) -> dict:
+        nulls = int.from_bytes(data[:self.__nullSize], "little")
+        slots = self.__fixedStruct.unpack_from(data, self.__nullSize)
+        ends = (0,) + self.__offsetStruct.unpack_from(data, self.__nullSize + self.__fixedStruct.size)
+        varStart = self.__varStart
+        record = {}
+        for name, nullMask, slot, count, decoder in self.__decodePlan:
+            if nulls & nullMask:
+                record[name] = None
+            elif slot < 0:
+                record[name] = str(data[varStart + ends[count]:varStart + ends[count + 1]], "utf-8")
+            elif decoder is None:
+                record[name] = slots[slot]
+            else:
+                record[name] = decoder(slots[slot:slot + count])
+
+        return record
+
+    def checkValue(self, name: str, value) -> None:
+        # The check encode makes for one field: TypeError or ValueError when value does not fit it
+        if value is not None:
+            self.__checkType(name, self.schema.getField(name).field_type, value)
+
+    def decodeField(self, data: bytes, name: str):
+        if name not in self.__fieldLayout:
+            raise KeyError(f"Field '{name}' is not defined")
+
+        position, fieldStruct, location = self.__fieldLayout[name]
+        if data[position // 8] & (1 << (position % 8)):
+            return None
+        if fieldStruct is not None:
+            return self.__slotDecoder(self.schema.getField(name).field_type)(fieldStruct.unpack_from(data, location))
+
+        tableOffset = self.__nullSize + self.__fixedStruct.size
+        end = struct.unpack_from(">I", data, tableOffset + 4 * location)[0]
+        start = struct.unpack_from(">I", data, tableOffset + 4 * (location - 1))[0] if location > 0 else 0
+        return bytes(data[self.__varStart + start:self.__varStart + end]).decode("utf-8")
+
+    def encodeKey(self, record: dict) -> bytes:
+        # The key fields alone in this same layout; used wherever a key has to be compared or hashed
+        values = [record.get(name) for name in self.schema.key]
+        if any(value is None for value in values):
+            raise ValueError("All key values must be set and not None")
+        return self.__keyCodec.encode(dict(zip(self.schema.key, values)))
+
+    @property
+    def keyCodec(self) -> "RecordCodec":
+        return self.__keyCodec
+
+    @classmethod
+    def fromMeta(cls, data: bytes) -> "RecordCodec":
+        return cls(Schema.fromMeta(data))
+
+    @classmethod
+    def __checkType(cls, name: str, fieldType: FieldType, value) -> None:
+        if not isinstance(value, cls.__TYPES[fieldType]) or (isinstance(value, bool) and fieldType != FieldType.BOOL) or \
+                (fieldType == FieldType.DATE and isinstance(value, datetime.datetime)):
+            raise TypeError(f"Field '{name}' is {fieldType.value}, not {type(value).__name__}")
+        if fieldType == FieldType.INT and value not in cls.__INT_RANGE:
+            raise ValueError(f"Field '{name}' is out of the 64 bit int range")
+
+    @classmethod
+    def __checkedEncoder(cls, name: str, fieldType: FieldType):
+        encoder = cls.__slotEncoder(fieldType)
+
+        def encode(value) -> tuple:
+            cls.__checkType(name, fieldType, value)
+            return encoder(value)
+        return encode
+
+    @classmethod
+    def __slotEncoder(cls, fieldType: FieldType):
+        # Value -> struct slots, chosen once per field when the codec is built
+        match fieldType:
+            case FieldType.BOOL | FieldType.INT | FieldType.FLOAT:
+                return lambda value: (value,)
+            case FieldType.COMPLEX:
+                return lambda value: (complex(value).real, complex(value).imag)
+            case FieldType.DATE:
+                return lambda value: (value.toordinal(),)
+            case FieldType.TIME:
+                return cls.__encodeTime
+            case FieldType.TIMESTAMP:
+                return cls.__encodeTimestamp
+        raise ValueError(f"Field type {fieldType} is not fixed width")
+
+    @classmethod
+    def __slotDecoder(cls, fieldType: FieldType):
+        match fieldType:
+            case FieldType.BOOL | FieldType.INT | FieldType.FLOAT:
+                return lambda slots: slots[0]
+            case FieldType.COMPLEX:
+                return lambda slots: complex(slots[0], slots[1])
+            case FieldType.DATE:
+                return lambda slots: datetime.date.fromordinal(slots[0])
+            case FieldType.TIME:
+                return cls.__decodeTime
+            case FieldType.TIMESTAMP:
+                return lambda slots: cls.__EPOCH + datetime.timedelta(microseconds = slots[0])
+        raise ValueError(f"Field type {fieldType} is not fixed width")
+
+    @staticmethod
+    def __decodeTime(slots: tuple) -> datetime.time:
+        seconds, microsecond = divmod(slots[0], 1_000_000)
+        minutes, second = divmod(seconds, 60)
+        hour, minute = divmod(minutes, 60)
+        return datetime.time(hour, minute, second, microsecond)
+
+    @staticmethod
+    def __encodeTime(value: datetime.time) -> tuple:
+        if value.tzinfo is not None:
+            value = datetime.datetime.combine(datetime.date.today(), value).astimezone(datetime.timezone.utc).time()
+        return ((value.hour * 3600 + value.minute * 60 + value.second) * 1_000_000 + value.microsecond,)
+
+    @classmethod
+    def __encodeTimestamp(cls, value: datetime.datetime) -> tuple:
+        if value.tzinfo is not None:
+            value = value.astimezone(datetime.timezone.utc).replace(tzinfo = None)
+        return ((value - cls.__EPOCH) // datetime.timedelta(microseconds = 1),)
@@ -0,0 +1,116 @@
+import json
+import re
+from enum import Enum
+
+class FieldType(Enum):
+    BOOL = "bool"
+    INT = "int"
+    FLOAT = "float"
+    COMPLEX = "complex"
+    STR = "str"
+    DATE = "date"
+    TIME = "time"
+    TIMESTAMP = "timestamp"
+
+class Field:
+    def __init__(self, name: str, fieldType: FieldType):
+        self.name = name
+        self.field_type = fieldType
+
+    def __eq__(self, other):
+        return isinstance(other, Field) and (self.name, self.field_type) == (other.name, other.field_type)
+
+    def __repr__(self):
+        return f"Field({self.name!r}, {self.field_type})"
+
+    def __str__(self):
+        return f"{self.field_type.value} {self.name}"
+
+class Schema:
+    # The creation definition from the README:
+    #   <file name>: <field>, <field>, ..., <key>
+    #   <field>: <type> <id>
+    #   <key>: key (<id>, <id>, ...) or key hash (<id>, <id>, ...)
+    # e.g. "people: str last_name, str first_name, date birth_date, key (last_name, first_name)"
+    # "key hash" selects a hash index: point lookups only, no key order.
+    #
+    # The definition is kept in the META block as a JSON document under "schema". Other entries in
+    # that document belong to the rest of SIRAF and are carried through untouched.
+    __DEFINITION = re.compile(r"^\s*(\w+)\s*:(.*?),?\s*key\s*(hash\s*)?\(([^)]*)\)\s*$", re.DOTALL)
+    __FIELD = re.compile(r"^(\w+)\s+(\w+)$")
+    __META_SCHEMA = "schema"
+    HASH_INDEX = "hash"
+
+    def __init__(self, name: str, fields: list[Field], key: list[str], index: str = None):
+        if not fields:
+            raise ValueError("A schema needs at least one field")
+        names = [field.name for field in fields]
+        if len(set(names)) != len(names):
+            raise ValueError("Field names must be unique")
+        if "key" in names:
+            raise ValueError("A field cannot be named 'key'")
+        if not key:
+            raise ValueError("A schema needs a key")
+        for keyName in key:
+            if keyName not in names:
+                raise ValueError(f"Key field '{keyName}' is not defined")
+        if index not in (None, self.HASH_INDEX):
+            raise ValueError(f"Unknown index type '{index}'")
+
+        self.name = name
+        self.fields = fields
+        self.key = key
+        self.index = index
+
+    def __eq__(self, other):
+        return isinstance(other, Schema) and (self.name, self.fields, self.key, self.index) == (other.name, other.fields, other.key, other.index)
+
+    def __str__(self):
+        fields = ", ".join(str(field) for field in self.fields)
+        index = f"{self.index} " if self.index else ""
+        return f"{self.name}: {fields}, key {index}({', '.join(self.key)})"
+
+    def getField(self, name: str) -> Field:
+        for field in self.fields:
+            if field.name == name:
+                return field
+        raise KeyError(f"Field '{name}' is not defined")
+
+    def toMeta(self, meta: dict = None) -> bytes:
+        document = dict(meta or {})
+        document[self.__META_SCHEMA] = str(self)
+        return json.dumps(document).encode("utf-8")
+
+    @classmethod
+    def parse(cls, definition: str) -> "Schema":
+        match = cls.__DEFINITION.match(definition)
+        if match is None:
+            raise ValueError(f"Invalid schema definition '{definition}'")
+
+        name, fieldList, hashIndex, keyList = match.groups()
+        fields = []
+        for fieldText in (text.strip() for text in fieldList.split(",")):
+            fieldMatch = cls.__FIELD.match(fieldText)
+            if fieldMatch is None:
+                raise ValueError(f"Invalid field definition '{fieldText}'")
+            fieldType, fieldName = fieldMatch.groups()
+            try:
+                fields.append(Field(fieldName, FieldType(fieldType)))
+            except ValueError:
+                raise ValueError(f"Unknown field type '{fieldType}'") from None
+
+        key = [keyName.strip() for keyName in keyList.split(",") if keyName.strip()]
+        return cls(name, fields, key, cls.HASH_INDEX if hashIndex else None)
+
+    @classmethod
+    def fromMeta(cls, data: bytes) -> "Schema":
+        return cls.parse(cls.readMeta(data)[cls.__META_SCHEMA])
+
+    @classmethod
+    def readMeta(cls, data: bytes) -> dict:
+        if not data:
+            raise ValueError("The file has no META block")
+        document = json.loads(bytes(data).decode("utf-8"))
+        if cls.__META_SCHEMA not in document:
+            raise ValueError("The META block has no schema")
+        return document
@@ -0,0 +1,329 @@
+import json
+import operator
+import pathlib
+from enum import Enum
+
+from blockDescriptor import BlockType
+from externalSort import externalSort
+from hashIndex import HashIndex
+from keyFilter import KeyFilter
+from raFile import raFile
+from recordCodec import RecordCodec
+from schema import Schema
+
+class Result(Enum):
+    SUCCESS = "Success"
+    FAIL = "Fail"
+
+class Table:
+    # The SIRAF calls from the README over one .ravrf file. Every call returns a dictionary:
+    #   records - the affected records, result - a Result, message - usually the reason for a failure
+    # The META block holds the schema and, when the key is "key hash (...)", the hash index:
+    #   {"schema": "<definition>", "index": {"type": "hash", "directory": <RREF>}}
+    # With a hash index a find on the full key, and the duplicate check of an add, read one bucket.
+    # Without one, and for partial keys or comparisons, find scans the file.
+    #
+    # A table may also keep a key filter (a counting Bloom filter, see keyFilter.py) in an INDEX block:
+    #   "filter": {"rref": <RREF>, "capacity": <keys>, "falsePositiveRate": <rate>, "clean": <bool>}
+    # A key the filter rules out is reported absent, or accepted by add, without reading the index or
+    # scanning. The block is written back by close; "clean" is cleared in META before the first change
+    # after that, so a filter left stale by a crash is rebuilt from a scan at the next open.
+    SUFFIX = ".ravrf"
+    __META_FILTER = "filter"
+    __META_INDEX = "index"
+    __OPERATORS = {"==": operator.eq, "!=": operator.ne, ">": operator.gt, ">=": operator.ge,
+                   "<": operator.lt, "<=": operator.le}
+
+    def __init__(self, rave: raFile):
+        self.__rave = rave
+        self.__meta = Schema.readMeta(rave.GetMeta())
+        self.__codec = RecordCodec(Schema.parse(self.__meta["schema"]))
+        self.__index = None
+        if self.__codec.schema.index == Schema.HASH_INDEX:
+            indexMeta = self.__meta.get(self.__META_INDEX)
+            if indexMeta is None or indexMeta.get("type") != Schema.HASH_INDEX:
+                raise ValueError("The META block has no hash index")
+            self.__index = HashIndex(rave, indexMeta["directory"])
+
+        self.__filter: KeyFilter = None
+        filterMeta = self.__meta.get(self.__META_FILTER)
+        if filterMeta is not None:
+            if filterMeta["clean"]:
+                self.__filter = KeyFilter.decode(rave.ReadData(filterMeta["rref"], BlockType.INDEX_BLOCK))
+            else:
+                self.rebuildFilter()
+
+    @property
+    def schema(self) -> Schema:
+        return self.__codec.schema
+
+    def add(self, record: dict) -> dict:
+        try:
+            data = self.__codec.encode(record)
+            key = self.__codec.encodeKey(record)
+        except (TypeError, ValueError) as error:
+            return self.__reply(Result.FAIL, message = str(error))
+
+        if self.__locate(key) is not None:
+            return self.__reply(Result.FAIL, message = "Key already exists")
+        self.__touchFilter()
+        recordRREF = self.__rave.Add(data)
+        if self.__index is not None:
+            self.__index.insert(key, recordRREF)
+            self.__saveIndex()
+        if self.__filter is not None:
+            self.__filter.add(key)
+        return self.__reply(Result.SUCCESS, [self.__codec.decode(data)])
+
+    def close(self) -> dict:
+        try:
+            if self.__filter is not None and not self.__meta[self.__META_FILTER]["clean"]:
+                self.__writeFilter()
+            self.__rave.Close()
+        except IOError as error:
+            return self.__reply(Result.FAIL, message = str(error))
+        return self.__reply(Result.SUCCESS)
+
+    def delete(self, keys: list) -> dict:
+        try:
+            key = self.__codec.encodeKey(dict(zip(self.schema.key, keys)))
+        except (TypeError, ValueError) as error:
+            return self.__reply(Result.FAIL, message = str(error))
+
+        found = self.__locate(key)
+        if found is None:
+            return self.__reply(Result.FAIL, message = "Key not found")
+        recordRREF, data = found
+        self.__touchFilter()
+        if self.__index is not None:
+            self.__index.remove(key)
+            self.__saveIndex()
+        if self.__filter is not None:
+            self.__filter.remove(key)
+        self.__rave.Delete(recordRREF)
+        return self.__reply(Result.SUCCESS, [self.__codec.decode(data)])
+
+    def find(self, keys: list = None, fields: list[str] = None) -> dict:
+        # keys holds one entry per key field, in key order: a value, a (value, comparison) couple, or None
+        # (or missing) to match anything
+        keys = list(keys or [])
+        if len(keys) > len(self.schema.key):
+            return self.__reply(Result.FAIL, message = "Too many key values")
+        try:
+            for name in fields or []:
+                self.schema.getField(name)
+        except KeyError as error:
+            return self.__reply(Result.FAIL, message = error.args[0])
+
+        tests = []
+        for name, entry in zip(self.schema.key, keys):
+            value, comparison = entry if isinstance(entry, tuple) else (entry, "==")
+            if comparison not in self.__OPERATORS:
+                return self.__reply(Result.FAIL, message = f"Unknown comparison '{comparison}'")
+            try:
+                self.__codec.checkValue(name, value)
+            except (TypeError, ValueError) as error:
+                return self.__reply(Result.FAIL, message = str(error))
+            if value is not None:
+                tests.append((name, self.__OPERATORS[comparison], value))
+
+        if (self.__index is not None or self.__filter is not None) and len(tests) == len(self.schema.key) and \
+                all(test is operator.eq for _, test, _ in tests):
+            found = self.__locate(self.__codec.encodeKey({name: value for name, _, value in tests}))
+            matches = [] if found is None else [self.__codec.decode(found[1])]
+        else:
+            matches = []
+            for _, data in self.__rave.Scan():
+                record = self.__codec.decode(data)
+                try:
+                    if all(test(record[name], value) for name, test, value in tests):
+                        matches.append(record)
+                except TypeError as error:
+                    return self.__reply(Result.FAIL, message = str(error))
+
+        if fields:
+            matches = [{name: record[name] for name in fields} for record in matches]
+        return self.__reply(Result.SUCCESS, matches)
+
+    def load(self, records, memoryBytes: int = 64 * 1024 * 1024, batchBytes: int = 1024 * 1024,
+             padding: int = 0) -> dict:
+        # Bulk load of an empty table from an unsorted stream. The records are sorted by key in about
+        # memoryBytes (see externalSort.py), written in key order with AddMany about batchBytes at a
+        # time, and the hash index is then built bottom-up with full buckets from the (key, RREF) pairs,
+        # which are sorted again in about memoryBytes rather than kept. A record whose key was already
+        # loaded is skipped, the first one winning, and counted in "duplicates". A key filter is then
+        # rebuilt for the number of keys loaded.
+        if self.__rave.RecordCount() != 0:
+            return self.__reply(Result.FAIL, message = "Bulk load needs an empty table")
+
+        def keyOf(data: bytes) -> tuple:
+            return tuple(self.__codec.decodeField(data, name) for name in self.schema.key)
+
+        def encoded():
+            for record in records:
+                self.__codec.encodeKey(record)
+                yield self.__codec.encode(record)
+
+        batch = []
+        keys = []
+        counts = {"count": 0, "duplicates": 0}
+
+        def flush():
+            recordRREFs = self.__rave.AddMany(batch, padding) if batch else []
+            counts["count"] += len(batch)
+            yield from zip(list(keys), recordRREFs)
+            batch.clear()
+            keys.clear()
+
+        def loaded():
+            # Writes the records and yields the (key, RREF) of each, a batch at a time
+            previous = None
+            pendingBytes = 0
+            for data in externalSort(encoded(), keyOf, memoryBytes):
+                keyValues = keyOf(data)
+                if keyValues == previous:
+                    counts["duplicates"] += 1
+                    continue
+                if previous is None:
+                    self.__touchFilter()
+                previous = keyValues
+                batch.append(data)
+                keys.append(self.__codec.encodeKey(dict(zip(self.schema.key, keyValues))))
+                pendingBytes += len(data)
+                if pendingBytes >= batchBytes:
+                    yield from flush()
+                    pendingBytes = 0
+            yield from flush()
+
+        try:
+            if self.__index is not None:
+                emptyIndex = self.__index
+                self.__index = HashIndex.build(self.__rave, loaded(), memoryBytes, batchBytes)
+                self.__rave.DeleteMany([emptyIndex.directoryRREF] + emptyIndex.bucketRREFs())
+                self.__saveIndex()
+            else:
+                for _ in loaded():
+                    pass
+        except (TypeError, ValueError) as error:
+            return self.__reply(Result.FAIL, message = str(error))
+        if self.__filter is not None and counts["count"]:
+            filterReply = self.rebuildFilter(counts["count"])
+            if filterReply["result"] != Result.SUCCESS:
+                return filterReply
+        reply = self.__reply(Result.SUCCESS)
+        reply.update(counts)
+        return reply
+
+    def rebuildFilter(self, expectedKeys: int = 0, falsePositiveRate: float = None) -> dict:
+        # Sizes a new key filter for expectedKeys (at least the keys already in the file) and fills it
+        # from one scan. Without arguments the sizes in META are reused.
+        filterMeta = self.__meta.get(self.__META_FILTER, {"rref": 0, "capacity": 0, "falsePositiveRate": 0.01})
+        capacity = max(expectedKeys or filterMeta["capacity"], self.__rave.RecordCount())
+        falsePositiveRate = falsePositiveRate or filterMeta["falsePositiveRate"]
+        try:
+            keyFilter = KeyFilter.sized(capacity, falsePositiveRate)
+        except ValueError as error:
+            return self.__reply(Result.FAIL, message = str(error))
+
+        for _, data in self.__rave.Scan():
+            keyFilter.add(self.__codec.encodeKey({name: self.__codec.decodeField(data, name)
+                                                  for name in self.schema.key}))
+        self.__filter = keyFilter
+        self.__meta[self.__META_FILTER] = dict(filterMeta, capacity = capacity, falsePositiveRate = falsePositiveRate)
+        self.__writeFilter()
+        reply = self.__reply(Result.SUCCESS)
+        reply["count"] = keyFilter.count
+        return reply
+
+    def recordcount(self) -> dict:
+        reply = self.__reply(Result.SUCCESS)
+        reply["count"] = self.__rave.RecordCount()
+        return reply
+
+    def update(self, record: dict) -> dict:
+        try:
+            data = self.__codec.encode(record)
+            key = self.__codec.encodeKey(record)
+        except (TypeError, ValueError) as error:
+            return self.__reply(Result.FAIL, message = str(error))
+
+        found = self.__locate(key)
+        if found is None:
+            return self.__reply(Result.FAIL, message = "Key not found")
+        recordRREF = self.__rave.Save(found[0], data)
+        if self.__index is not None and recordRREF != found[0]:
+            self.__index.update(key, recordRREF)
+            self.__saveIndex()
+        return self.__reply(Result.SUCCESS, [self.__codec.decode(data)])
+
+    def __findScan(self, key: bytes) -> tuple[int, bytes]:
+        for recordRREF, data in self.__rave.Scan():
+            if self.__codec.encodeKey(self.__codec.decode(data)) == key:
+                return recordRREF, data
+        return None
+
+    def __locate(self, key: bytes) -> tuple[int, bytes]:
+        # (RREF, data) of the record with this encoded key, or None
+        if self.__filter is not None and key not in self.__filter:
+            return None
+        if self.__index is None:
+            return self.__findScan(key)
+        recordRREF = self.__index.find(key)
+        return None if recordRREF is None else (recordRREF, self.__rave.ReadData(recordRREF))
+
+    def __saveIndex(self) -> None:
+        # The directory moves when it outgrows its block; META has to follow it
+        indexMeta = self.__meta[self.__META_INDEX]
+        if indexMeta["directory"] != self.__index.directoryRREF:
+            indexMeta["directory"] = self.__index.directoryRREF
+            self.__rave.PutMeta(json.dumps(self.__meta).encode("utf-8"))
+
+    def __touchFilter(self) -> None:
+        # The filter block is about to fall behind the file; say so before anything changes
+        filterMeta = self.__meta.get(self.__META_FILTER)
+        if filterMeta is not None and filterMeta["clean"]:
+            filterMeta["clean"] = False
+            self.__rave.PutMeta(json.dumps(self.__meta).encode("utf-8"))
+
+    def __writeFilter(self) -> None:
+        filterMeta = self.__meta[self.__META_FILTER]
+        payload = self.__filter.encode()
+        if filterMeta["rref"]:
+            filterMeta["rref"] = self.__rave.Save(filterMeta["rref"], payload, 0, BlockType.INDEX_BLOCK)
+        else:
+            filterMeta["rref"] = self.__rave.Add(payload, 0, BlockType.INDEX_BLOCK)
+        filterMeta["clean"] = True
+        self.__rave.PutMeta(json.dumps(self.__meta).encode("utf-8"))
+
+    @staticmethod
+    def __reply(result: Result, records: list = None, message: str = "") -> dict:
+        return {"records": records or [], "result": result, "message": message}
+
+    @classmethod
+    def create(cls, definition: str, directory: pathlib.Path = ".", expectedKeys: int = 0,
+               falsePositiveRate: float = 0.01) -> "Table":
+        # The file is <directory>/<file name>.ravrf and is left open. A positive expectedKeys adds a key
+        # filter sized for that many keys at the given false positive rate.
+        schema = Schema.parse(definition)
+        rave = raFile.Create(pathlib.Path(directory) / (schema.name + cls.SUFFIX))
+        meta = {}
+        if schema.index == Schema.HASH_INDEX:
+            meta[cls.__META_INDEX] = {"type": Schema.HASH_INDEX, "directory": HashIndex.create(rave).directoryRREF}
+        rave.PutMeta(schema.toMeta(meta))
+        table = cls(rave)
+        if expectedKeys > 0:
+            reply = table.rebuildFilter(expectedKeys, falsePositiveRate)
+            if reply["result"] != Result.SUCCESS:
+                rave.Close()
+                raise ValueError(reply["message"])
+        return table
+
+    @classmethod
+    def open(cls, path: pathlib.Path) -> "Table":
+        rave = raFile(pathlib.Path(path))
+        rave.Open()
+        try:
+            return cls(rave)
+        except ValueError:
+            rave.Close()
+            raise
@@ -27,7 +27,7 @@ def evaluateRAFile(filePath: pathlib.Path, textPath: pathlib.Path) -> None:
         config = inputFile.read(readSize)
         configuration = RavrfConfig.decode(config)
         textFile.write(f"Configuration: {configuration}\n\n")
-        validBlockTypes = [BlockType.DATA_BLOCK.value, BlockType.META_BLOCK.value, BlockType.AVAILABLE.value]
+        validBlockTypes = [blockType.value for blockType in BlockType]
 
         headBlockSize = HeadBlock.getStorageSize()
         endBlockSize = EndBlock.getStorageSize()
@@ -56,6 +56,18 @@ def evaluateRAFile(filePath: pathlib.Path, textPath: pathlib.Path) -> None:
                 case BlockType.META_BLOCK:
                     headingString = expandDataHeader(headBlock, "Meta Block")
                     data_size = headBlock.data_size
+                case BlockType.SUMMARY_BLOCK:
+                    headingString = expandDataHeader(headBlock, "Summary Block")
+                    printData = False
+                case BlockType.INDEX_BLOCK:
+                    headingString = expandDataHeader(headBlock, "Index Block")
+                    printData = False
+                case BlockType.PAD_BLOCK:
+                    headingString = expandDataHeader(headBlock, "Pad Block")
+                    printData = False
+                case BlockType.RESERVED_BLOCK:
+                    headingString = expandDataHeader(headBlock, "Reserved Block")
+                    printData = False
                 case BlockType.AVAILABLE:  
                     headingString = expandAvailableHeader(headBlock)
                     printData = False
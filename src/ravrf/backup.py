@@ -0,0 +1,109 @@
+import os
+import pathlib
+import struct
+import sys
+
+# Full and incremental backups of a .ravrf file that has its change log enabled (raFile.EnableChangeLog).
+# A backup file holds a header and then the copied ranges, each as (start, length) and the bytes:
+#   magic, version, kind (F full, I incremental), epoch, file size, range count
+# A full backup is one range covering the whole file. An incremental backup holds only the ranges in the
+# change log, which covers everything written since the previous backup. Both are taken while the
+# raFile holds off its writers, so each one is a consistent image.
+# restore applies a full backup and then the incremental backups that follow it, epoch by epoch.
+
+MAGIC = b"RVBK"
+VERSION = 1
+FULL = ord("F")
+INCREMENTAL = ord("I")
+HEADER = struct.Struct(">4sBBIQI")
+RANGE = struct.Struct(">II")
+COPY_CHUNK = 1024 * 1024
+
+def fullBackup(rave, target: pathlib.Path) -> int:
+    # Returns the epoch of the backup; the increments that follow it start at the next one
+    return rave.Checkpoint(lambda readAt, epoch, size, ranges:
+                           writeBackup(target, FULL, epoch, size, [(0, size)], readAt))
+
+def incrementalBackup(rave, target: pathlib.Path) -> int:
+    def consumer(readAt, epoch, size, ranges):
+        if epoch == 0:
+            raise ValueError("Take a full backup before an incremental one")
+        writeBackup(target, INCREMENTAL, epoch, size, ranges, readAt)
+    return rave.Checkpoint(consumer)
+
+def readHeader(path: pathlib.Path) -> tuple[int, int, int, int]:
+    # (kind, epoch, file size, range count)
+    with open(path, "rb") as backup:
+        magic, version, kind, epoch, size, count = HEADER.unpack(backup.read(HEADER.size))
+    if magic != MAGIC or version != VERSION:
+        raise ValueError(f"'{path}' is not a ravrf backup")
+    return kind, epoch, size, count
+
+def restore(backups: list[pathlib.Path], output: pathlib.Path) -> pathlib.Path:
+    headers = [readHeader(path) for path in backups]
+    if not headers or headers[0][0] != FULL:
+        raise ValueError("A restore must start with a full backup")
+    for (_, previousEpoch, _, _), (kind, epoch, _, _), path in zip(headers, headers[1:], backups[1:]):
+        if kind != INCREMENTAL or epoch != previousEpoch + 1:
+            raise ValueError(f"'{path}' does not follow epoch {previousEpoch}")
+
+    output = pathlib.Path(output)
+    temporary = output.with_name(output.name + ".tmp")
+    with open(temporary, "wb") as target:
+        for path, (_, _, size, count) in zip(backups, headers):
+            target.truncate(size)
+            with open(path, "rb") as backup:
+                backup.seek(HEADER.size)
+                for _ in range(count):
+                    start, length = RANGE.unpack(backup.read(RANGE.size))
+                    target.seek(start)
+                    while length > 0:
+                        chunk = backup.read(min(length, COPY_CHUNK))
+                        if not chunk:
+                            raise ValueError(f"'{path}' is truncated")
+                        target.write(chunk)
+                        length -= len(chunk)
+    os.replace(temporary, output)
+    return output
+
+def writeBackup(target: pathlib.Path, kind: int, epoch: int, size: int, ranges: list, readAt) -> None:
+    ranges = [(start, min(end, size)) for start, end in ranges if start < size]
+    target = pathlib.Path(target)
+    temporary = target.with_name(target.name + ".tmp")
+    with open(temporary, "wb") as backup:
+        backup.write(HEADER.pack(MAGIC, VERSION, kind, epoch, size, len(ranges)))
+        for start, end in ranges:
+            backup.write(RANGE.pack(start, end - start))
+            for offset in range(start, end, COPY_CHUNK):
+                backup.write(readAt(offset, min(COPY_CHUNK, end - offset)))
+    os.replace(temporary, target)
+
+def main():
+    if len(sys.argv) < 4:
+        print("Usage: backup.py full|incremental <file.ravrf> <backup>")
+        print("       backup.py restore <output.ravrf> <full backup> [<incremental backup> ...]")
+        sys.exit(1)
+
+    command = sys.argv[1]
+    if command == "restore":
+        restore([pathlib.Path(path) for path in sys.argv[3:]], pathlib.Path(sys.argv[2]))
+        return
+
+    from raFile import raFile
+    rave = raFile(pathlib.Path(sys.argv[2]))
+    rave.Open()
+    try:
+        rave.EnableChangeLog()
+        if command == "full":
+            epoch = fullBackup(rave, pathlib.Path(sys.argv[3]))
+        elif command == "incremental":
+            epoch = incrementalBackup(rave, pathlib.Path(sys.argv[3]))
+        else:
+            raise ValueError(f"Unknown command '{command}'")
+        print(f"Backed up epoch {epoch}")
+    finally:
+        rave.Close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+import copy
+import threading
+from collections import OrderedDict
+
+from blockDescriptor import HeadBlock
+
+
+class BlockCache:
+    # Byte-budgeted LRU cache of decoded heads and payloads, keyed by RREF.
+    # An entry always holds the head; the payload is added once it has been read or written. Each entry
+    # costs the encoded head size plus the payload length against the budget, and the least recently
+    # used entries are evicted until the total fits. Payloads larger than the whole budget are not kept.
+    #
+    # The owner must invalidate an RREF whenever the bytes at that address are rewritten.
+    # A reader that fills the cache from disk takes the epoch before its read and passes it to put;
+    # any invalidate or clear in between moves the epoch on, and the possibly stale put is dropped.
+    # Heads are copied in and out, so callers are free to change the ones they get.
+    def __init__(self, budget: int):
+        if budget <= 0:
+            raise ValueError("Cache budget must be positive")
+
+        self.__budget = budget
+        self.__entries: OrderedDict[int, tuple] = OrderedDict()     # RREF -> (head, data or None, cost)
+        self.__lock = threading.Lock()
+        self.__size = 0
+        self.__epoch = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self.__entries)
+
+    @property
+    def budget(self) -> int:
+        return self.__budget
+
+    @property
+    def epoch(self) -> int:
+        return self.__epoch
+
+    @property
+    def size(self) -> int:
+        return self.__size
+
+    def clear(self) -> None:
+        with self.__lock:
+            self.__entries.clear()
+            self.__size = 0
+            self.__epoch += 1
+
+    def getData(self, recordRREF: int) -> tuple[HeadBlock, bytes]:
+        # (head, payload) when both are cached, otherwise (None, None)
+        with self.__lock:
+            entry = self.__entries.get(recordRREF)
+            if entry is None or entry[1] is None:
+                self.misses += 1
+                return None, None
+            self.__entries.move_to_end(recordRREF)
+            self.hits += 1
+            return copy.copy(entry[0]), entry[1]
+
+    def getHead(self, recordRREF: int) -> HeadBlock:
+        with self.__lock:
+            entry = self.__entries.get(recordRREF)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.__entries.move_to_end(recordRREF)
+            self.hits += 1
+            return copy.copy(entry[0])
+
+    def getStats(self) -> dict:
+        return {"cacheHits": self.hits, "cacheMisses": self.misses, "cacheEvictions": self.evictions,
+                "cacheBytes": self.__size, "cacheEntries": len(self.__entries), "cacheBudget": self.__budget}
+
+    def invalidate(self, recordRREF: int) -> None:
+        with self.__lock:
+            entry = self.__entries.pop(recordRREF, None)
+            if entry is not None:
+                self.__size -= entry[2]
+            self.__epoch += 1
+
+    def put(self, recordRREF: int, headBlock: HeadBlock, data = None, epoch: int = None) -> None:
+        # Caches the head, and the payload when one is given, replacing any previous entry
+        headBlock = copy.copy(headBlock)
+        cost = HeadBlock.getStorageSize()
+        if data is not None:
+            if cost + len(data) > self.__budget:
+                data = None
+            else:
+                data = bytes(data)
+                cost += len(data)
+
+        with self.__lock:
+            if epoch is not None and epoch != self.__epoch:
+                return
+            previous = self.__entries.pop(recordRREF, None)
+            if previous is not None:
+                self.__size -= previous[2]
+            self.__entries[recordRREF] = (headBlock, data, cost)
+            self.__size += cost
+
+            while self.__size > self.__budget:
+                _, (_, _, evictedCost) = self.__entries.popitem(last = False)
+                self.__size -= evictedCost
+                self.evictions += 1
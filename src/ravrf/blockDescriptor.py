@@ -1,3 +1,4 @@
+import re
 import struct
 from typing import Tuple
 from checksum import calc_16bit_checksum
@@ -6,7 +7,11 @@ from enum import IntEnum
 class BlockType(IntEnum):      ## limited to 1 byte (0 - 128) value is an ascii letter
     AVAILABLE = 65             ## 0X41 ascii A
     DATA_BLOCK = 68            ## 0X44 ascii D
+    INDEX_BLOCK = 73           ## 0X49 ascii I
     META_BLOCK = 77            ## 0X4D ascii M
+    PAD_BLOCK = 80             ## 0X50 ascii P
+    RESERVED_BLOCK = 82        ## 0X52 ascii R
+    SUMMARY_BLOCK = 83         ## 0X53 ascii S
 
 class HeadBlock:
     # A normal block layout is:
@@ -153,3 +158,46 @@ class EndBlock:
 
 def CalcMinBlockSize() -> int:
     return HeadBlock.getStorageSize() + EndBlock.getStorageSize()
+
+
+# Finding blocks without the free list: recovery after a torn write and parallel scans of byte ranges.
+# Both look for a block type letter and check the candidate's fences. readAt(offset, length) reads the
+# file and may come back short at its end.
+BLOCK_TYPES = re.compile(b"[" + bytes(blockType.value for blockType in BlockType) + b"]")
+SEARCH_CHUNK = 65536
+
+def fencedHead(readAt, recordRREF: int, fileSize: int) -> HeadBlock:
+    # The head at recordRREF when it decodes and its EndBlock fence agrees with it, otherwise None
+    headSize = HeadBlock.getStorageSize()
+    endSize = EndBlock.getStorageSize()
+    if recordRREF + CalcMinBlockSize() > fileSize:
+        return None
+    try:
+        headBlock = HeadBlock.decode(readAt(recordRREF, headSize))
+        endRREF = recordRREF + headSize + headBlock.record_size
+        if endRREF + endSize > fileSize:
+            return None
+        endBlock = EndBlock.decode(readAt(endRREF, endSize))
+    except (ValueError, IndexError, struct.error):
+        return None
+    if (endBlock.block_type, endBlock.record_size) != (headBlock.block_type, headBlock.record_size):
+        return None
+    return headBlock
+
+def findBlockStart(readAt, location: int, fileSize: int) -> int:
+    # The first address at or after location holding a fenced block that is followed by another
+    # fenced block or the end of the file; fileSize when there is none
+    while location < fileSize:
+        window = readAt(location, min(SEARCH_CHUNK, fileSize - location))
+        if not window:
+            break
+        for match in BLOCK_TYPES.finditer(window):
+            candidateRREF = location + match.start()
+            headBlock = fencedHead(readAt, candidateRREF, fileSize)
+            if headBlock is None:
+                continue
+            nextRREF = candidateRREF + CalcMinBlockSize() + headBlock.record_size
+            if nextRREF == fileSize or fencedHead(readAt, nextRREF, fileSize) is not None:
+                return candidateRREF
+        location += len(window)
+    return fileSize
@@ -0,0 +1,88 @@
+import bisect
+import os
+import pathlib
+import struct
+
+class ChangeLog:
+    # Byte ranges of a .ravrf file written since the last backup, kept in a sidecar (<file>.changes).
+    #   header  - magic, version, epoch
+    #   entries - (start, end) pairs, appended as writes happen
+    # A range is appended before the write it covers, and only when it is not already covered, so a
+    # record that is rewritten over and over is logged once per epoch. Loading merges the entries back
+    # into sorted, disjoint ranges. Each backup closes the epoch and starts the log again, empty.
+    SUFFIX = ".changes"
+    __MAGIC = b"RVCL"
+    __VERSION = 1
+    __HEADER = struct.Struct(">4sBI")
+    __ENTRY = struct.Struct(">II")
+
+    def __init__(self, path: pathlib.Path):
+        self.__path = pathlib.Path(path)
+        self.__starts: list[int] = []
+        self.__ends: list[int] = []
+        self.epoch = 0
+
+        content = self.__path.read_bytes()
+        if len(content) < self.__HEADER.size:
+            raise ValueError(f"Change log '{self.__path}' is truncated")
+        magic, version, self.epoch = self.__HEADER.unpack_from(content)
+        if magic != self.__MAGIC or version != self.__VERSION:
+            raise ValueError(f"'{self.__path}' is not a change log")
+        entries = len(content) - self.__HEADER.size
+        for start, end in self.__ENTRY.iter_unpack(content[self.__HEADER.size:][:entries - entries % self.__ENTRY.size]):
+            self.__merge(start, end)
+
+        self.__fd = os.open(self.__path, os.O_WRONLY | os.O_APPEND | getattr(os, "O_BINARY", 0))
+
+    def __len__(self):
+        return len(self.__starts)
+
+    def close(self) -> None:
+        if self.__fd >= 0:
+            os.close(self.__fd)
+            self.__fd = -1
+
+    def covers(self, start: int, end: int) -> bool:
+        index = bisect.bisect_right(self.__starts, start) - 1
+        return index >= 0 and self.__ends[index] >= end
+
+    def ranges(self) -> list[tuple[int, int]]:
+        # Sorted, disjoint (start, end) ranges written in this epoch
+        return list(zip(self.__starts, self.__ends))
+
+    def record(self, start: int, end: int) -> None:
+        if end <= start or self.covers(start, end):
+            return
+        os.write(self.__fd, self.__ENTRY.pack(start, end))
+        self.__merge(start, end)
+
+    def rotate(self) -> int:
+        # Starts the next epoch with an empty log; the new header replaces the old file atomically
+        self.epoch += 1
+        self.__starts, self.__ends = [], []
+        self.close()
+        self.write(self.__path, self.epoch)
+        self.__fd = os.open(self.__path, os.O_WRONLY | os.O_APPEND | getattr(os, "O_BINARY", 0))
+        return self.epoch
+
+    def __merge(self, start: int, end: int) -> None:
+        # Touching or overlapping ranges are joined
+        low = bisect.bisect_left(self.__ends, start)
+        high = bisect.bisect_right(self.__starts, end)
+        if low < high:
+            start = min(start, self.__starts[low])
+            end = max(end, self.__ends[high - 1])
+        self.__starts[low:high] = [start]
+        self.__ends[low:high] = [end]
+
+    @classmethod
+    def pathFor(cls, path: pathlib.Path) -> pathlib.Path:
+        path = pathlib.Path(path)
+        return path.with_name(path.name + cls.SUFFIX)
+
+    @classmethod
+    def write(cls, path: pathlib.Path, epoch: int) -> None:
+        path = pathlib.Path(path)
+        temporary = path.with_name(path.name + ".tmp")
+        temporary.write_bytes(cls.__HEADER.pack(cls.__MAGIC, cls.__VERSION, epoch))
+        os.replace(temporary, path)
@@ -8,18 +8,28 @@ class RavrfConfig:
     # 4 bytes - Meta block address
     # 4 bytes - First available block address
     # 2 bytes - Checksum
-    # 20 bytes - Expansion area for future use
+    # 20 bytes - Expansion area
+    #     4 bytes - Allocation summary block address; zero when there is none
+    #     4 bytes - Summary generation: bumped on Open, matches the summary block only after a clean Close
+    #     1 byte  - Block alignment as a power of two; zero when blocks are packed
+    #     11 bytes - Expansion area for future use
     __MAGIC = b"/~ravrf~/"
-    # 20 byte expansion area for future use
-    __EXPANSION_AREA = b"\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00"
+    # 11 byte expansion area for future use
+    __EXPANSION_AREA = b"\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00"
     __CURRENT_VERSION = 1
-    __STRUCT_MASK = ">9sBIIH20s"  # 9 bytes string, 1 byte, 4 bytes, 4 bytes, 2 bytes 20 bytes
+    __STRUCT_MASK = ">9sBIIHIIB11s"  # 9 bytes string, 1 byte, 4 bytes, 4 bytes, 2 bytes, 4 bytes, 4 bytes, 1 byte, 11 bytes
 
     def __init__(self, version: int = __CURRENT_VERSION, meta_address: int = 0, 
-                 first_available_address: int = 0, checksum: int = 0):
+                 first_available_address: int = 0, checksum: int = 0,
+                 summary_address: int = 0, summary_generation: int = 0, alignment: int = 0):
+        if alignment & (alignment - 1):
+            raise ValueError("Alignment must be a power of two")
         self.__version = version
         self.meta_address = meta_address
         self.first_available_address = first_available_address
+        self.summary_address = summary_address
+        self.summary_generation = summary_generation
+        self.alignment = alignment
 
         calc_checksum = self.__getChecksum()
         all_zero = (checksum == 0 and meta_address == 0 and first_available_address == 0)
@@ -30,25 +40,34 @@ class RavrfConfig:
         
     def __str__(self):
         return f"RavrfConfig(version={self.__version}, meta_address={self.meta_address}, " + \
-               f"first_available_address={self.first_available_address})"
+               f"first_available_address={self.first_available_address}, " + \
+               f"summary_address={self.summary_address}, summary_generation={self.summary_generation}, " + \
+               f"alignment={self.alignment})"
 
     def encode(self) -> bytes:
         return bytes(struct.pack(self.__STRUCT_MASK, 
                                  self.__MAGIC, self.__version, self.meta_address, self.first_available_address, 
-                                 self.__getChecksum(), self.__EXPANSION_AREA
+                                 self.__getChecksum(), self.summary_address, self.summary_generation,
+                                 self.__alignmentShift(), self.__EXPANSION_AREA
         ))
     
     def __getChecksum(self) -> int:
-        return calc_16bit_checksum([self.__version, self.meta_address, self.first_available_address]) 
+        return calc_16bit_checksum([self.__version, self.meta_address, self.first_available_address,
+                                    self.summary_address, self.summary_generation, self.__alignmentShift()])
+
+    def __alignmentShift(self) -> int:
+        return self.alignment.bit_length() - 1 if self.alignment else 0
 
     @classmethod
     def decode(cls, data: bytes) -> "RavrfConfig":
         if len(data) != cls.getStorageSize():
             raise ValueError("bytes must be exactly 22 bytes")
-        magic, version, meta_address, first_available_address, checksum, _ = struct.unpack(cls.__STRUCT_MASK, data)
+        magic, version, meta_address, first_available_address, checksum, summary_address, summary_generation, \
+            alignmentShift, _ = struct.unpack(cls.__STRUCT_MASK, data)
         if magic != cls.__MAGIC:
             raise ValueError("Invalid magic header")
-        return cls(version, meta_address, first_available_address, checksum)
+        return cls(version, meta_address, first_available_address, checksum, summary_address, summary_generation,
+                   1 << alignmentShift if alignmentShift else 0)
     
     @classmethod
     def getStorageSize(cls) -> int:
@@ -0,0 +1,166 @@
+import collections
+import threading
+from concurrent.futures import Future
+
+from blockDescriptor import BlockType
+
+# Front end that lets many producer threads write to one raFile without a lock of their own.
+# Add, Save, Delete and PutMeta only queue the operation and return a Future at once. A single writer
+# thread takes everything that queued up while it was busy and commits it as one group:
+#   - consecutive Adds of the same block type go to the file with one AddMany (one region, one write)
+#   - Saves, Deletes and PutMetas are applied in between, in submission order
+#   - with durable set, the whole group then shares one Sync
+# Futures resolve once their group is committed: to the RREF for Add and Save, to None otherwise.
+# Reads go straight to the raFile; they do not queue behind the writer.
+
+ADD = "add"
+DELETE = "delete"
+PUT_META = "putMeta"
+SAVE = "save"
+FLUSH = "flush"
+
+class GroupWriter:
+    def __init__(self, rave, durable: bool = False, maxGroup: int = 4096, maxPending: int = 65536):
+        if maxGroup <= 0 or maxPending <= 0:
+            raise ValueError("Group and queue limits must be positive")
+        self.__rave = rave
+        self.__closed = False
+        self.__durable = durable
+        self.__maxGroup = maxGroup
+        self.__maxPending = maxPending
+        self.__queue = collections.deque()          # (op, future, arguments)
+        self.__ready = threading.Condition()
+        self.__stats = {"groups": 0, "operations": 0, "largestGroup": 0}
+        self.__thread = threading.Thread(target = self.__run, name = "ravrf-group-writer", daemon = True)
+        self.__thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, excType, excValue, traceback):
+        self.Close()
+
+    @property
+    def rave(self):
+        return self.__rave
+
+    def Add(self, data: bytes, padding: int = 0, blockType: BlockType = BlockType.DATA_BLOCK) -> Future:
+        # Checked here so that one bad Add cannot fail the AddMany it would be grouped into
+        if data is None or len(data) == 0:
+            raise ValueError("Data cannot be None or empty")
+        if not isinstance(padding, int) or padding < 0:
+            raise ValueError("Padding must be a non-negative integer")
+        if blockType not in (BlockType.DATA_BLOCK, BlockType.INDEX_BLOCK):
+            raise ValueError(f"Block type {blockType} cannot be written directly")
+        return self.__submit(ADD, (bytes(data), padding, blockType))
+
+    def Close(self) -> None:
+        # Commits everything already queued and stops the writer; the raFile itself stays open
+        with self.__ready:
+            self.__closed = True
+            self.__ready.notify_all()
+        self.__thread.join()
+
+    def Delete(self, recordRREF: int) -> Future:
+        return self.__submit(DELETE, (recordRREF,))
+
+    def Flush(self) -> None:
+        # Waits until everything submitted before the call is committed
+        self.__submit(FLUSH, ()).result()
+
+    def GetStats(self) -> dict:
+        # groups committed, operations in them and the largest group
+        with self.__ready:
+            return dict(self.__stats)
+
+    def PutMeta(self, data: bytes, padding: int = 0) -> Future:
+        return self.__submit(PUT_META, (bytes(data), padding))
+
+    def ReadData(self, recordRREF: int, blockType: BlockType = BlockType.DATA_BLOCK) -> bytes:
+        return self.__rave.ReadData(recordRREF, blockType)
+
+    def Save(self, recordRREF: int, record: bytes, padding: int = 0,
+             blockType: BlockType = BlockType.DATA_BLOCK) -> Future:
+        return self.__submit(SAVE, (recordRREF, bytes(record), padding, blockType))
+
+    def __submit(self, op: str, arguments: tuple) -> Future:
+        future = Future()
+        with self.__ready:
+            # A full queue holds producers back until the writer catches up
+            while len(self.__queue) >= self.__maxPending and not self.__closed:
+                self.__ready.wait()
+            if self.__closed:
+                raise IOError("Group writer is closed")
+            self.__queue.append((op, future, arguments))
+            self.__ready.notify_all()
+        return future
+
+    def __run(self) -> None:
+        while True:
+            with self.__ready:
+                while not self.__queue and not self.__closed:
+                    self.__ready.wait()
+                if not self.__queue:
+                    return
+                group = [self.__queue.popleft() for _ in range(min(len(self.__queue), self.__maxGroup))]
+                self.__ready.notify_all()
+            self.__commit(group)
+
+    def __commit(self, group: list) -> None:
+        # Applies the group, then resolves its futures; a failed Sync fails every one of them
+        group = [entry for entry in group if entry[1].set_running_or_notify_cancel()]
+        results = []
+        index = 0
+        while index < len(group):
+            op, future, arguments = group[index]
+            if op == ADD:
+                end = index + 1
+                while end < len(group) and group[end][0] == ADD and group[end][2][2] == arguments[2]:
+                    end += 1
+                results += self.__addRun(group[index:end])
+                index = end
+                continue
+            try:
+                if op == SAVE:
+                    results.append((future, self.__rave.Save(*arguments), None))
+                elif op == DELETE:
+                    results.append((future, self.__rave.Delete(*arguments), None))
+                elif op == PUT_META:
+                    results.append((future, self.__rave.PutMeta(*arguments), None))
+                else:
+                    results.append((future, None, None))
+            except Exception as error:
+                results.append((future, None, error))
+            index += 1
+
+        if self.__durable and results:
+            try:
+                self.__rave.Sync()
+            except Exception as error:
+                results = [(future, None, error) for future, _, _ in results]
+
+        with self.__ready:
+            self.__stats["groups"] += 1
+            self.__stats["operations"] += len(results)
+            self.__stats["largestGroup"] = max(self.__stats["largestGroup"], len(results))
+        for future, result, error in results:
+            if error is None:
+                future.set_result(result)
+            else:
+                future.set_exception(error)
+
+    def __addRun(self, run: list) -> list:
+        records = [arguments[0] for _, _, arguments in run]
+        paddings = [arguments[1] for _, _, arguments in run]
+        try:
+            recordRREFs = self.__rave.AddMany(records, paddings, run[0][2][2])
+        except Exception:
+            # Whatever failed, each Add gets its own result
+            return [self.__addOne(future, arguments) for _, future, arguments in run]
+        return [(future, recordRREF, None) for (_, future, _), recordRREF in zip(run, recordRREFs)]
+
+    def __addOne(self, future: Future, arguments: tuple) -> tuple:
+        try:
+            return future, self.__rave.Add(*arguments), None
+        except Exception as error:
+            return future, None, error
@@ -0,0 +1,86 @@
+import os
+import pathlib
+import struct
+from concurrent.futures import ProcessPoolExecutor
+
+from config import RavrfConfig
+from blockDescriptor import BlockType, HeadBlock, CalcMinBlockSize, findBlockStart
+from storage import FileStorage
+
+# Splits a .ravrf file into byte ranges and filters each range in its own process.
+# A range rarely starts on a block boundary, so each worker first snaps forward to the next valid head:
+# a checksummed HeadBlock whose EndBlock fence matches it and which is followed by another fenced block
+# (blockDescriptor.findBlockStart, as recovery uses). The worker then owns every block that starts inside
+# its range.
+# Workers report where they started and stopped. The parent checks that the ranges join up and rescans
+# any range whose snap was wrong, so a payload that happens to look like a fence cannot lose records.
+# The file must not be written while it is being scanned.
+
+MIN_RANGE_SIZE = 1024 * 1024
+READ_CHUNK = 1024 * 1024
+
+def parallelScan(path: pathlib.Path, predicate = None, projection = None, workers: int = None,
+                 minRangeSize: int = MIN_RANGE_SIZE) -> list:
+    # Returns [(RREF, value)] in file order for every DATA record where predicate(data) is true.
+    # value is projection(data), or the data itself. Both callables must be picklable.
+    fileSize = os.path.getsize(path)
+    firstRREF = RavrfConfig.getStorageSize()
+    workers = workers or os.cpu_count() or 1
+    rangeSize = max(minRangeSize, -(-(fileSize - firstRREF) // (workers * 4)))
+    ranges = [(start, min(start + rangeSize, fileSize)) for start in range(firstRREF, fileSize, rangeSize)]
+
+    with ProcessPoolExecutor(max_workers = workers) as executor:
+        futures = [executor.submit(scanRange, path, start, end, predicate, projection, start != firstRREF)
+                   for start, end in ranges]
+
+        matches = []
+        expectedRREF = firstRREF
+        for (start, end), future in zip(ranges, futures):
+            try:
+                snappedRREF, stopRREF, rangeMatches = future.result()
+            except (ValueError, struct.error):
+                snappedRREF = -1
+            if snappedRREF != expectedRREF:
+                snappedRREF, stopRREF, rangeMatches = scanRange(path, expectedRREF, end, predicate, projection, False)
+            matches.extend(rangeMatches)
+            expectedRREF = stopRREF
+
+    return matches
+
+def scanRange(path: pathlib.Path, startRREF: int, endRREF: int, predicate = None, projection = None,
+              snap: bool = True) -> tuple[int, int, list]:
+    # Walks the blocks that start in [startRREF, endRREF). Returns (first block, first block at or
+    # past endRREF, matches).
+    storage = FileStorage(path)
+    try:
+        fileSize = storage.getSize()
+        recordRREF = findBlockStart(storage.readAt, startRREF, fileSize) if snap else startRREF
+        snappedRREF = recordRREF
+        matches = []
+        headSize = HeadBlock.getStorageSize()
+        bufferRREF = recordRREF
+        buffer = bytearray()
+        while recordRREF < min(endRREF, fileSize):
+            del buffer[:recordRREF - bufferRREF]
+            bufferRREF = recordRREF
+            fillBuffer(storage, bufferRREF, buffer, recordRREF + headSize)
+
+            headBlock = HeadBlock.decode(bytes(buffer[:headSize]))
+            if headBlock.block_type == BlockType.DATA_BLOCK:
+                dataEnd = headSize + headBlock.data_size
+                fillBuffer(storage, bufferRREF, buffer, recordRREF + dataEnd)
+                data = bytes(buffer[headSize:dataEnd])
+                if predicate is None or predicate(data):
+                    matches.append((recordRREF, projection(data) if projection else data))
+            recordRREF += headBlock.record_size + CalcMinBlockSize()
+
+        return snappedRREF, max(recordRREF, snappedRREF), matches
+    finally:
+        storage.close()
+
+def fillBuffer(storage: FileStorage, bufferRREF: int, buffer: bytearray, endRREF: int) -> None:
+    bufferEnd = bufferRREF + len(buffer)
+    if bufferEnd < endRREF:
+        buffer += storage.readAt(bufferEnd, max(endRREF - bufferEnd, READ_CHUNK))
+        if bufferRREF + len(buffer) < endRREF:
+            raise ValueError(f"Block at {bufferRREF} runs past the end of the file")
@@ -1,21 +1,65 @@
-import io
 import os
 import pathlib
+import struct
+import threading
+from contextlib import nullcontext
 
+from blockCache import BlockCache
+from changeLog import ChangeLog
 from config import RavrfConfig
-from blockDescriptor import BlockType, HeadBlock, EndBlock
+from blockDescriptor import BlockType, HeadBlock, EndBlock, CalcMinBlockSize, fencedHead, findBlockStart
+from recordStream import RecordReader, RecordWriter
+from snapshot import ReadSnapshot
+from storage import DirectReader, FileStorage, Storage
+from workloadTrace import ADD, ADD_MANY, BLOCK, DELETE, PUT_META, SAVE, TraceWriter
 
 
-class raFile(io.BytesIO):
-    __BUFFER_SIZE = 4096
+class raFile:
+    # Aligned files start their first real block here; a PAD block covers the bytes after the config
+    __MIN_ALIGNMENT = 64
+    __MAX_ALIGNMENT = 1 << 20
     __DOT = "."
+    # Adaptive padding: the growth of each Save goes into a histogram of power of two buckets
+    # (bucket 0 is no growth, bucket k is 2^(k-2) < growth <= 2^(k-1)). New and relocated records get
+    # the bucket bound that covers this share of updates, once there are enough updates to go on.
+    __GROWTH_BUCKETS = 32
+    __GROWTH_PERCENTILE = 0.9
+    __GROWTH_MIN_SAMPLES = 16
+    __READ_AHEAD = 65536                # Scan and recovery read this far past the block they need
+    __READ_MANY_GAP = 4096
     __SUFFIX = ".ravrf"
+    # SUMMARY block payload: version, generation, record count, logical EOF and extent count,
+    # followed by (RREF, record size) for every AVAILABLE block and, from version 2, the growth histogram
+    __SUMMARY_HEAD = struct.Struct(">BIIII")
+    __SUMMARY_EXTENT = struct.Struct(">II")
+    __SUMMARY_GROWTH = struct.Struct(f">{__GROWTH_BUCKETS}I")
+    __SUMMARY_READ = 4096
+    __SUMMARY_VERSION = 2
     
-    def __init__(self, path: pathlib.Path = None):
+    def __init__(self, path: pathlib.Path = None, cacheSize: int = 0, adaptivePadding: bool = False,
+                 storage: type[Storage] = FileStorage):
+        # cacheSize is the byte budget of the record and head cache; zero leaves caching off.
+        # adaptivePadding adds the slack learned from past Save growth to the padding of Add and Save.
+        # storage is the backend class the bytes live in: FileStorage, MmapStorage or MemoryStorage.
+        self.__adaptivePadding = adaptivePadding
+        self.__cache: BlockCache = BlockCache(cacheSize) if cacheSize > 0 else None
+        self.__births: dict[int, int] = {}          # RREF -> generation, for blocks written while snapshots are held
+        self.__changeLog: ChangeLog = None
         self.__config: RavrfConfig = None
-        self.__file: io.BufferedRandom = None
+        self.__deferred: dict[int, tuple] = {}      # RREF -> (generation, head) of blocks freed under a snapshot
+        self.__file: Storage = None
+        self.__freeExtents: dict[int, int] = {}     # RREF -> record size of every AVAILABLE block
+        self.__generation: int = 0
+        self.__growth: list[int] = [0] * self.__GROWTH_BUCKETS
+        self.__lock = threading.RLock()             # held by writers, and by snapshot scans one block at a time
         self.__path: pathlib.Path = None
+        self.__recordCount: int = 0
+        self.__reservations: dict[int, int] = {}   # RREF -> record size of each block an open RecordWriter holds
         self.__size: int = 0
+        self.__snapshots: dict[int, int] = {}       # generation -> number of snapshots holding it
+        self.__storage = storage
+        self.__trace: TraceWriter = None
+        self.__saveCounts: list[int] = [0, 0]       # Saves of existing records: [in place, relocated]
 
         if path:
             self.setPath(path)
@@ -40,38 +84,159 @@ class raFile(io.BytesIO):
                 raise IsADirectoryError(f"Path '{self.__path}' is not a file")
             self.__size = self.__path.stat().st_size
 
-    def Add(self, data: bytes, padding: int = 0) -> int:
+    def Add(self, data: bytes, padding: int = 0, blockType: BlockType = BlockType.DATA_BLOCK) -> int:
+        # blockType is DATA_BLOCK for records, or INDEX_BLOCK for index structures kept by SIRAF
         if self.__file is None:
             raise IOError("File is not open")
-        if data is None or len(data) == 0:
+        if data is None:
             raise ValueError("Data cannot be None or empty")
-        if isinstance(data, bytes):
-            return self.__addRecord(data, padding, BlockType.DATA_BLOCK)
-        
-        return self.__addRecord(bytes(data), padding, BlockType.DATA_BLOCK)
+        data = self.__asBuffer(data)
+        if len(data) == 0:
+            raise ValueError("Data cannot be None or empty")
+        self.__checkUserType(blockType)
+
+        with self.__lock:
+            slack = self.__adaptPadding(padding) if blockType == BlockType.DATA_BLOCK else padding
+            recordRREF = self.__addRecord(data, slack, blockType)
+            self.__traceOp(ADD, blockType, len(data), padding, 0, recordRREF)
+            return recordRREF
+
+    def AddMany(self, records: list, padding: int | list[int] = 0,
+                blockType: BlockType = BlockType.DATA_BLOCK) -> list[int]:
+        # Adds the records back to back in one region of the file, written with a single vectored write.
+        # padding is one value for every record or a list with one per record. Returns the RREFs in order.
+        if self.__file is None:
+            raise IOError("File is not open")
+        self.__checkUserType(blockType)
+        views = [self.__asBuffer(record) for record in records if record is not None]
+        if len(views) != len(records) or any(len(view) == 0 for view in views):
+            raise ValueError("Data cannot be None or empty")
+        if not views:
+            return []
+        paddings = list(padding) if isinstance(padding, (list, tuple)) else [padding] * len(views)
+        if len(paddings) != len(views):
+            raise ValueError("Padding must be one value or one per record")
+
+        with self.__lock:
+            slacks = [self.__adaptPadding(int(slack)) if blockType == BlockType.DATA_BLOCK else int(slack)
+                      for slack in paddings]
+            sizes = [self.__alignedSize(len(view) + slack) for view, slack in zip(views, slacks)]
+            requiredSize = sum(sizes) + CalcMinBlockSize() * (len(sizes) - 1)
+            regionSize, regionRREF = self.__allocate(requiredSize)
+            sizes[-1] += regionSize - requiredSize
+
+            buffers = []
+            recordRREFs = []
+            recordRREF = regionRREF
+            for view, recordSize in zip(views, sizes):
+                recordRREFs.append(recordRREF)
+                buffers += self.__buildRecord(blockType, view, recordSize)
+                recordRREF = self.__calc_next_record_RREF(recordRREF, recordSize)
+            try:
+                self.__write_vector(regionRREF, buffers)
+            except Exception:
+                self.__releaseRegion(regionRREF, regionSize)
+                raise
+
+            self.__traceOp(ADD_MANY, blockType, len(recordRREFs), 0, 0, 0)
+            for recordRREF, view, recordSize, slack in zip(recordRREFs, views, sizes, paddings):
+                if self.__cache is not None:
+                    headBlock = HeadBlock(blockType, recordSize, len(view), recordSize - len(view), 0)
+                    self.__cache.put(recordRREF, headBlock, view)
+                if self.__snapshots:
+                    self.__births[recordRREF] = self.__generation
+                self.__traceOp(ADD, blockType, len(view), slack, 0, recordRREF)
+            if blockType == BlockType.DATA_BLOCK:
+                self.__recordCount += len(recordRREFs)
+            return recordRREFs
+
+    def Checkpoint(self, consumer) -> int:
+        # Calls consumer(readAt, epoch, size, ranges) with writers held off, where ranges are the
+        # (start, end) byte ranges written during the change log epoch, then starts the next epoch.
+        # Returns the epoch that was handed to the consumer. See backup.py.
+        if self.__changeLog is None:
+            raise IOError("The change log is not enabled")
+
+        with self.__lock:
+            epoch = self.__changeLog.epoch
+            consumer(self.__read, epoch, self.__size, self.__changeLog.ranges())
+            self.__changeLog.rotate()
+            return epoch
 
     def Close(self) -> None:
-        if self.__file is not None:
-            self.flush()
-            self.__file.close()
-            self.__file = None
-            self.__config = None
+        with self.__lock:
+            if self.__file is not None:
+                if self.__config is not None:
+                    # Closing ends every snapshot, so the deferred blocks can all be freed
+                    self.__snapshots.clear()
+                    self.__releaseDeferred()
+                    # A writer left open cannot commit any more; its block goes back to the free list
+                    if self.__reservations:
+                        self.__deleteRecords({recordRREF: self.__reservedHead(recordSize)
+                                              for recordRREF, recordSize in self.__reservations.items()})
+                        self.__reservations.clear()
+                    self.__writeSummary()
+                self.__file.close()
+                self.__file = None
+                self.__config = None
+                if self.__cache is not None:
+                    self.__cache.clear()
+                if self.__changeLog is not None:
+                    self.__changeLog.close()
+                    self.__changeLog = None
+                self.StopTrace()
 
     def Delete(self, recordId: int) -> None:
+        self.DeleteMany([recordId])
+
+    def DeleteMany(self, recordIds: list[int]) -> None:
+        # Frees all the records at once. Adjacent records, and any AVAILABLE blocks around them, are
+        # merged into a single AVAILABLE block; the free list and config are then written once.
         if self.__file is None:
             raise IOError("File is not open")
-        if recordId < RavrfConfig.getStorageSize():
-            raise ValueError("Record ID is invalid")
 
-        headBlock = self.__readAnyHead(recordId)
-        if headBlock.block_type not in (BlockType.DATA_BLOCK, BlockType.META_BLOCK):
-            raise ValueError(f"Record ID {recordId} is not a data or meta block. It is {headBlock.block_type}")
-        
-        self.__deleteRecord(recordId, headBlock)
-        if headBlock.block_type != BlockType.META_BLOCK:
-            self.__config.meta_address = 0
-            self.__write_data(0, self.__config.encode())
+        with self.__lock:
+            headBlocks = {}
+            for recordId in sorted(set(recordIds)):
+                if recordId < RavrfConfig.getStorageSize():
+                    raise ValueError("Record ID is invalid")
+                self.__checkLive(recordId)
+
+                headBlock = self.__readAnyHead(recordId)
+                if headBlock.block_type not in (BlockType.DATA_BLOCK, BlockType.META_BLOCK, BlockType.INDEX_BLOCK) and \
+                        recordId not in self.__reservations:
+                    raise ValueError(f"Record ID {recordId} is not a data, meta or index block. It is {headBlock.block_type}")
+                headBlocks[recordId] = headBlock
+
+            if headBlocks:
+                for recordId in headBlocks:
+                    self.__reservations.pop(recordId, None)
+                self.__freeRecords(headBlocks)
+                for recordId in headBlocks:
+                    self.__traceOp(DELETE, headBlocks[recordId].block_type, 0, 0, recordId, 0)
     
+    def EnableChangeLog(self) -> int:
+        # Starts recording the byte ranges written to the file in <file>.changes, for incremental
+        # backups. The log stays on for every later Open. Returns the current epoch.
+        if self.__file is None:
+            raise IOError("File is not open")
+        if not self.__storage.PERSISTENT:
+            raise IOError("A change log needs storage that outlives the process")
+
+        with self.__lock:
+            if self.__changeLog is None:
+                changeLogPath = ChangeLog.pathFor(self.__path)
+                if not changeLogPath.exists():
+                    ChangeLog.write(changeLogPath, 0)
+                self.__changeLog = ChangeLog(changeLogPath)
+            return self.__changeLog.epoch
+
+    def GetFreeExtents(self) -> list[tuple[int, int]]:
+        # (RREF, record size) of every AVAILABLE block, in file order
+        if self.__config is None:
+            raise IOError("File is not open")
+        return sorted(self.__freeExtents.items())
+
     def GetMeta(self) -> bytes:
         if self.__config is None:
             raise IOError("File is not open")
@@ -82,6 +247,18 @@ class raFile(io.BytesIO):
         
         return self.__readData(metaRREF, BlockType.META_BLOCK)
 
+    def GetStats(self) -> dict:
+        # Cache counters (all zero when the file has no cache), Save relocations and the padding that
+        # adaptive mode currently adds
+        if self.__cache is None:
+            stats = {"cacheHits": 0, "cacheMisses": 0, "cacheEvictions": 0,
+                     "cacheBytes": 0, "cacheEntries": 0, "cacheBudget": 0}
+        else:
+            stats = self.__cache.getStats()
+        stats.update({"fileSize": self.__size, "savesInPlace": self.__saveCounts[0], "relocations": self.__saveCounts[1],
+                      "learnedPadding": self.__learnedPadding(), "growthHistogram": list(self.__growth)})
+        return stats
+
     def Open(self, path: pathlib.Path = None) -> None:
         if path is not None:
             self.setPath(path)
@@ -89,12 +266,48 @@ class raFile(io.BytesIO):
         if self.__path is None:
             raise ValueError("File path is not set")
         
-        self.__file = io.BufferedRandom(io.FileIO(self.__path, mode = "r+b", closefd = True), 
-                                                  buffer_size = self.__BUFFER_SIZE)
-        
-        self.__file.seek(0, io.SEEK_SET)
-        config = self.__file.read(RavrfConfig.getStorageSize())
-        self.__config = RavrfConfig.decode(config)
+        if self.__cache is not None:
+            self.__cache.clear()
+        self.__reservations.clear()
+        self.__file = self.__storage(self.__path)
+        self.__size = self.__file.getSize()
+        changeLogPath = ChangeLog.pathFor(self.__path)
+        if self.__storage.PERSISTENT and changeLogPath.exists():
+            self.__changeLog = ChangeLog(changeLogPath)
+        config = self.__file.readAt(0, RavrfConfig.getStorageSize())
+        if config[:9] != RavrfConfig().encode()[:9]:
+            self.Close()
+            raise ValueError(f"'{self.__path}' is not a ravrf file")
+        try:
+            self.__config = RavrfConfig.decode(config)
+        except ValueError:
+            self.__config = None
+
+        # After anything but a clean Close the free list cannot be trusted, so it is checked and rebuilt
+        # from one pass over the file
+        if self.__config is None:
+            self.__config = RavrfConfig()
+            self.__recover(configDamaged = True)
+        elif not (self.__loadSummary() and self.__freeListStartValid()):
+            self.__recover()
+
+        # Any summary on disk is stale from here on, until Close writes a new one
+        self.__config.summary_generation = (self.__config.summary_generation + 1) & 0xFFFFFFFF
+        self.__write_data(0, self.__config.encode())
+
+    def OpenReader(self, recordRREF: int) -> RecordReader:
+        self.__checkLive(recordRREF)
+        headBlock = self.__readHead(recordRREF, expectedType = BlockType.DATA_BLOCK)
+        return RecordReader(self.__file, recordRREF + HeadBlock.getStorageSize(), headBlock.data_size)
+
+    def OpenWriter(self, sizeHint: int, padding: int = 0) -> RecordWriter:
+        # Streams a new DATA record in chunks; its RREF is available as .rref once closed
+        if self.__file is None:
+            raise IOError("File is not open")
+
+        raFileOps = (self.__reserveRecord, self.__write_vector, self.__read, self.__commitRecord,
+                     lambda recordRREF: self.DeleteMany([recordRREF]))
+        return RecordWriter(raFileOps, int(sizeHint) + int(padding))
 
     def PutMeta(self, data: bytes, padding: int = 0) -> None:
         if self.__config is None:
@@ -102,63 +315,213 @@ class raFile(io.BytesIO):
         if data is None:
             raise ValueError("Data cannot be None")
         
+        data = self.__asBuffer(data)
         padding = int(padding)
         requiredSize = self.__calcRequiredLength(data, padding)
-        metaRREF = self.__config.meta_address
-        if metaRREF == 0:
-            metaRREF = self.__addRecord(data, padding, BlockType.META_BLOCK)
-            self.__config.meta_address = metaRREF
-            self.__write_data(0, self.__config.encode())
-        else:
-            headBlock = self.__readHead(metaRREF, expectedType = BlockType.META_BLOCK)
-            if headBlock.record_size >= requiredSize:
-                record = self.__buildRecord(BlockType.META_BLOCK, data, headBlock.record_size)
-                self.__write_data(metaRREF, record)
-            else:
-                newMetaRREF = self.__addRecord(data, padding, BlockType.META_BLOCK)
+        with self.__lock:
+            self.__traceOp(PUT_META, BlockType.META_BLOCK, len(data), padding, 0, 0)
+            metaRREF = self.__config.meta_address
+            if metaRREF == 0:
+                metaRREF = self.__addRecord(data, padding, BlockType.META_BLOCK)
                 self.__config.meta_address = metaRREF
                 self.__write_data(0, self.__config.encode())
-                self.__config.meta_address = newMetaRREF
-                self.__write_data(0, self.__config.encode())
-                self.__deleteRecord(metaRREF, headBlock)
+            else:
+                headBlock = self.__readHead(metaRREF, expectedType = BlockType.META_BLOCK)
+                if headBlock.record_size >= requiredSize and not self.__snapshots:
+                    self.__writeRecord(metaRREF, self.__buildRecord(BlockType.META_BLOCK, data, headBlock.record_size), data)
+                else:
+                    newMetaRREF = self.__addRecord(data, padding, BlockType.META_BLOCK)
+                    self.__config.meta_address = newMetaRREF
+                    self.__write_data(0, self.__config.encode())
+                    self.__freeRecords({metaRREF: headBlock})
+
+    def Recover(self) -> dict:
+        # Checks every block fence in one sequential pass and rebuilds the free list from what it finds.
+        # Open runs this by itself whenever the file was not closed cleanly. Returns a report.
+        if self.__config is None:
+            raise IOError("File is not open")
+        if self.__snapshots:
+            raise IOError("Cannot recover while a snapshot is held")
+
+        with self.__lock:
+            report = self.__recover()
+            if self.__cache is not None:
+                self.__cache.clear()
+            return report
+
+    def ReadData(self, recordRREF: int, blockType: BlockType = BlockType.DATA_BLOCK) -> bytes:
+        self.__checkLive(recordRREF)
+        return self.__readData(recordRREF, blockType)
+
+    def RecordCount(self) -> int:
+        # Number of live DATA records
+        if self.__config is None:
+            raise IOError("File is not open")
+        return self.__recordCount
+
+    def ReadMany(self, recordRREFs: list[int], gap: int = __READ_MANY_GAP) -> list[bytes]:
+        # Same results as calling ReadData for each RREF, in the order given
+        records = dict(self.StreamMany(recordRREFs, gap))
+        return [records[recordRREF] for recordRREF in recordRREFs]
+
+    def Scan(self, direct: bool = False):
+        # Yields (RREF, data) for every DATA block in file order, reading the file sequentially.
+        # direct reads with O_DIRECT where the storage is a file and the platform allows it, so a scan
+        # of a large file leaves the page cache alone.
+        if self.__file is None:
+            raise IOError("File is not open")
 
-    def ReadData(self, recordRREF: int) -> bytes:
-        return self.__readData(recordRREF)
+        reader = None
+        if direct and issubclass(self.__storage, FileStorage):
+            reader = DirectReader(self.__path, self.__config.alignment)
+        try:
+            for recordRREF, _, data in self.__walkBlocks((BlockType.DATA_BLOCK,), reader = reader):
+                if data is not None and recordRREF not in self.__deferred:
+                    yield recordRREF, data
+        finally:
+            if reader is not None:
+                reader.close()
 
-    def Save(self, recordRREF: int, record: str, padding: int = 0) -> int:
+    def Snapshot(self) -> ReadSnapshot:
+        # A read view of the file as it is now, which stays valid while this object writes. Release it
+        # (or use it in a with block) when done.
+        if self.__config is None:
+            raise IOError("File is not open")
+
+        with self.__lock:
+            generation = self.__generation
+            self.__generation += 1
+            self.__snapshots[generation] = self.__snapshots.get(generation, 0) + 1
+            metaRREF = self.__config.meta_address
+
+        snapshotOps = (lambda: self.__scanSnapshot(generation),
+                       lambda recordRREF: self.__readSnapshot(recordRREF, generation),
+                       lambda: self.__readSnapshot(metaRREF, generation, BlockType.META_BLOCK) if metaRREF else bytes(0),
+                       lambda: self.__releaseSnapshot(generation))
+        return ReadSnapshot(generation, snapshotOps)
+
+    def StartTrace(self, path: pathlib.Path) -> None:
+        # Records every Add, Save, Delete and PutMeta (sizes, padding and RREFs, not data) to a trace
+        # file until StopTrace or Close. The trace starts with the blocks already in the file, so a replay
+        # can lay them out before the first operation. See workloadTrace.py to replay it.
+        if self.__file is None:
+            raise IOError("File is not open")
+
+        with self.__lock:
+            self.StopTrace()
+            self.__trace = TraceWriter(path)
+            for blockRREF, headBlock, _ in self.__walkBlocks():
+                self.__trace.record(BLOCK, headBlock.block_type, headBlock.data_size, headBlock.record_size, blockRREF, 0)
+
+    def StopTrace(self) -> None:
+        with self.__lock:
+            if self.__trace is not None:
+                self.__trace.close()
+                self.__trace = None
+
+    def StreamMany(self, recordRREFs, gap: int = __READ_MANY_GAP):
+        # Yields (RREF, data) in file order. The requests are sorted by address and every read runs gap
+        # bytes past the block it needs, so requested blocks no more than gap bytes apart arrive with one
+        # sequential read; the heads are decoded straight out of that buffer. gap = 0 reads only the
+        # requested heads and data.
+        if self.__file is None:
+            raise IOError("File is not open")
+        if gap < 0:
+            raise ValueError("Gap must be non-negative")
+
+        headSize = HeadBlock.getStorageSize()
+        bufferRREF = 0
+        buffer = bytearray()
+        for recordRREF in sorted(set(recordRREFs)):
+            if recordRREF < RavrfConfig.getStorageSize():
+                raise ValueError("Record ID is invalid")
+            self.__checkLive(recordRREF)
+
+            bufferEnd = bufferRREF + len(buffer)
+            if not buffer or recordRREF > bufferEnd + gap:
+                bufferRREF = recordRREF
+                buffer.clear()
+            elif recordRREF > bufferEnd:
+                bufferRREF = bufferEnd
+                buffer.clear()
+
+            self.__fillBuffer(bufferRREF, buffer, recordRREF + headSize, gap)
+            del buffer[:recordRREF - bufferRREF]
+            bufferRREF = recordRREF
+
+            headBlock = HeadBlock.decode(bytes(buffer[:headSize]))
+            if headBlock.block_type != BlockType.DATA_BLOCK:
+                raise ValueError(f"Expected block type {BlockType.DATA_BLOCK}, but found {headBlock.block_type}")
+
+            dataEnd = headSize + headBlock.data_size
+            self.__fillBuffer(bufferRREF, buffer, recordRREF + dataEnd, gap)
+            yield recordRREF, bytes(buffer[headSize:dataEnd])
+
+    def Sync(self) -> None:
+        # Flushes everything written so far to stable storage
+        if self.__file is None:
+            raise IOError("File is not open")
+        with self.__lock:
+            self.__file.sync()
+
+    def Save(self, recordRREF: int, record: str | bytes | bytearray | memoryview, padding: int = 0,
+             blockType: BlockType = BlockType.DATA_BLOCK) -> int:
         if self.__config is None:
             raise IOError("File is not open")
         if record is None:
             raise ValueError("Record cannot be None")
+        self.__checkUserType(blockType)
 
         if isinstance(record, str):
-            data = bytes(record, 'utf-8')
+            data = self.__asBuffer(record.encode("utf-8"))
         else:
-            data = bytes(record)
+            data = self.__asBuffer(record)
 
         requiredSize = self.__calcRequiredLength(data, padding)
         if recordRREF == 0:
-            return self.Add(data, padding, BlockType.DATA_BLOCK)
+            return self.Add(data, padding, blockType)
         
-        headBlock = self.__readHead(recordRREF, expectedType = BlockType.DATA_BLOCK)
-        if headBlock.record_size >= requiredSize:
-            record = self.__buildRecord(BlockType.DATA_BLOCK, data, headBlock.record_size)
-            self.__write_data(recordRREF, record)
-            return recordRREF
-        
-        newRecordRREF = self.__addRecord(data, padding, BlockType.DATA_BLOCK)
-        self.Delete(recordRREF)
-        return newRecordRREF
+        with self.__lock:
+            self.__checkLive(recordRREF)
+            headBlock = self.__readHead(recordRREF, expectedType = blockType)
+            growth = len(data) - headBlock.data_size
+            if blockType == BlockType.DATA_BLOCK:
+                self.__recordGrowth(growth)
+            # While a snapshot is held the record is copied instead, so the snapshot keeps the old bytes
+            if headBlock.record_size >= requiredSize and not self.__snapshots:
+                self.__writeRecord(recordRREF, self.__buildRecord(blockType, data, headBlock.record_size), data)
+                self.__saveCounts[0] += 1
+                self.__traceOp(SAVE, blockType, len(data), padding, recordRREF, recordRREF)
+                return recordRREF
+
+            # A record that outgrew its block is likely to grow again, so it gets at least that much slack
+            slack = self.__adaptPadding(padding, growth) if blockType == BlockType.DATA_BLOCK else padding
+            newRecordRREF = self.__addRecord(data, slack, blockType)
+            self.__freeRecords({recordRREF: headBlock})
+            self.__saveCounts[1] += 1
+            self.__traceOp(SAVE, blockType, len(data), padding, recordRREF, newRecordRREF)
+            return newRecordRREF
     
-    def __addRecord(self, data: bytes, padding: int = 0, blockType: BlockType = BlockType.DATA_BLOCK) -> int:
+    def __addRecord(self, data: memoryview, padding: int = 0, blockType: BlockType = BlockType.DATA_BLOCK) -> int:
         requiredSize = self.__calcRequiredLength(data, padding)
-        BlockRREF, availableHeading = self.__findAvailableSpace(requiredSize)
-        recordSize, RecordRREF = self.__updateAvailableList(BlockRREF, availableHeading, requiredSize)
-        record = self.__buildRecord(blockType, data, recordSize)
-        self.__write_data(RecordRREF, record)
+        recordSize, RecordRREF = self.__allocate(requiredSize)
+        try:
+            self.__writeRecord(RecordRREF, self.__buildRecord(blockType, data, recordSize), data)
+        except Exception:
+            self.__releaseRegion(RecordRREF, recordSize)
+            raise
+        if blockType == BlockType.DATA_BLOCK:
+            self.__recordCount += 1
+        if self.__snapshots:
+            self.__births[RecordRREF] = self.__generation
 
         return RecordRREF
 
+    def __adaptPadding(self, padding: int, growth: int = 0) -> int:
+        if not self.__adaptivePadding:
+            return padding
+        return max(int(padding), self.__learnedPadding(), growth)
+
     def __adjustAvailableLinks(self, prevAvailableRREF: int, nextAvailableRREF: int, availableRREF: int):
         if nextAvailableRREF > 0:
             nextHead = self.__readHead(nextAvailableRREF, expectedType = BlockType.AVAILABLE)
@@ -176,14 +539,35 @@ class raFile(io.BytesIO):
             self.__config.first_available_address = availableRREF if availableRREF > 0 else nextAvailableRREF
             self.__write_data(0, self.__config.encode())
 
-    def __buildRecord(self, blockType: BlockType, data: bytes, requiredSize: int) -> bytes:
+    def __allocate(self, requiredSize: int) -> tuple[int, int]:
+        # In an aligned file every block is a whole number of alignment units, so every block start,
+        # and the end of the file, stays on a boundary
+        requiredSize = self.__alignedSize(requiredSize)
+        BlockRREF, availableHeading = self.__findAvailableSpace(requiredSize)
+        return self.__updateAvailableList(BlockRREF, availableHeading, requiredSize)
+
+    def __alignedSize(self, requiredSize: int) -> int:
+        alignment = self.__config.alignment
+        if not alignment:
+            return requiredSize
+        return -(-(requiredSize + CalcMinBlockSize()) // alignment) * alignment - CalcMinBlockSize()
+
+    def __asBuffer(self, data) -> memoryview:
+        # A flat byte view over any buffer; no copy is made of bytes, bytearray or memoryview input
+        view = memoryview(data)
+        if view.format != "B" or view.ndim != 1:
+            view = view.cast("B")
+        return view
+
+    def __buildRecord(self, blockType: BlockType, data: memoryview, requiredSize: int) -> list:
+        # The record is returned as separate buffers (head, data, padding, end) for a vectored write
         dataLength = len(data)
         padding = requiredSize - dataLength
         
         headBlock = HeadBlock(blockType, requiredSize, dataLength, padding, 0)
         endBlock = EndBlock(requiredSize, blockType)
 
-        return bytes(headBlock.encode() + data + bytes(b"\x00" * padding) + endBlock.encode())
+        return [headBlock.encode(), data] + Storage.zeros(padding) + [endBlock.encode()]
 
     def __calc_end_block_RREF(self, recordRREF: int, dataSize: int) -> int:
         return recordRREF + HeadBlock.getStorageSize() + dataSize
@@ -194,76 +578,232 @@ class raFile(io.BytesIO):
     def __calc_record_size(self, dataSize: int) -> int:
         return dataSize + HeadBlock.getStorageSize() + EndBlock.getStorageSize()
 
-    def __calcRequiredLength(self, data: bytes, padding: int) -> int:
+    def __calcRequiredLength(self, data: memoryview, padding: int) -> int:
         return len(data) + padding
 
-    def __deleteRecord(self, recordRREF: int, headBlock: HeadBlock) -> None:
+    def __checkLive(self, recordRREF: int) -> None:
+        # A block freed while a snapshot is held still looks like a record on disk
+        if recordRREF in self.__deferred:
+            raise ValueError(f"Record ID {recordRREF} has been deleted")
 
+    def __traceOp(self, op: int, blockType: BlockType, size: int, padding: int, recordRREF: int, resultRREF: int) -> None:
+        if self.__trace is not None:
+            self.__trace.record(op, blockType, size, padding, recordRREF, resultRREF)
+
+    def __checkUserType(self, blockType: BlockType) -> None:
+        if blockType not in (BlockType.DATA_BLOCK, BlockType.INDEX_BLOCK):
+            raise ValueError(f"Block type {blockType} cannot be written directly")
+
+    def __commitRecord(self, recordRREF: int, recordSize: int, dataSize: int) -> None:
+        # Turns a reserved block into a DATA record; the end fence goes first, so a torn commit fails
+        # its fence check and recovery frees the block
+        with self.__lock:
+            if self.__reservations.pop(recordRREF, None) is None:
+                raise ValueError(f"Record ID {recordRREF} is not a reserved block")
+            self.__write_data(self.__calc_end_block_RREF(recordRREF, recordSize),
+                              EndBlock(recordSize, BlockType.DATA_BLOCK).encode())
+            self.__write_data(recordRREF, HeadBlock.initData(recordSize, dataSize, recordSize - dataSize, 0).encode())
+            self.__recordCount += 1
+
+    def __deleteRecords(self, headBlocks: dict[int, HeadBlock]) -> None:
         if self.__config is None:
             raise IOError("File is not open")        
 
-        headBlock.block_type = BlockType.AVAILABLE
-        recordSize = headBlock.record_size
-
-        nextRREF = self.__calc_next_record_RREF(recordRREF, recordSize)
-        if nextRREF < self.__size:
-            nextHead = self.__readAnyHead(nextRREF)
-            if nextHead.block_type == BlockType.AVAILABLE:
-                # Merge with next available
-                recordSize += self.__calc_record_size(nextHead.record_size)
-                headBlock.record_size = recordSize
-                self.__adjustAvaliableLinks(nextHead.prev_available, nextHead.next_available, 0)
-
-        prevEndRREF = recordRREF - EndBlock.getStorageSize()
-        if prevEndRREF >= RavrfConfig.getStorageSize():
-            prevEndBlock = self.__readEndBlock(prevEndRREF)
-            if prevEndBlock.block_type == BlockType.AVAILABLE:
-                prevTotalSize = self.__calc_record_size(prevEndBlock.record_size)
-                availableRREF = recordRREF - prevTotalSize
-                prevAvailableHead = self.__readHead(availableRREF, expectedType = BlockType.AVAILABLE)
-                prevAvailableHead.record_size += recordSize + headBlock.getStorageSize() + EndBlock.getStorageSize()
-                availableSize = prevAvailableHead.record_size
-                self.__write_data(availableRREF, prevAvailableHead.encode())
-                self.__write_data(self.__calc_end_block_RREF(availableRREF, availableSize), 
-                                  EndBlock(availableSize, BlockType.AVAILABLE).encode())
-                return
-        
-        headBlock.prev_available = 0
-        headBlock.next_available = self.__config.first_available_address
-        availableSize = headBlock.record_size
-        self.__write_data(recordRREF, headBlock.encode())
-        self.__write_data(self.__calc_end_block_RREF(recordRREF, availableSize), 
-                                                     EndBlock(availableSize, BlockType.AVAILABLE).encode())
-        self.__config.first_available_address = recordRREF
-        nextAvailRREF = headBlock.next_available
-        if nextAvailRREF > 0:
-            self.__setPrevAvailable(nextAvailRREF, id)
+        extents, absorbed = self.__collectFreeExtents(headBlocks)
+        if self.__cache is not None:
+            for recordRREF in list(headBlocks) + list(absorbed):
+                self.__cache.invalidate(recordRREF)
+
+        # Unlink the AVAILABLE blocks that were swallowed by a merge. Their surviving neighbours
+        # are collected first so each one is rewritten only once.
+        def survivor(availableRREF: int, step) -> int:
+            while availableRREF in absorbed:
+                availableRREF = step(absorbed[availableRREF])
+            return availableRREF
+
+        firstAvailable = survivor(self.__config.first_available_address, lambda head: head.next_available)
+        linkUpdates: dict[int, list] = {}
+        for availableHead in absorbed.values():
+            prevRREF = survivor(availableHead.prev_available, lambda head: head.prev_available)
+            nextRREF = survivor(availableHead.next_available, lambda head: head.next_available)
+            if prevRREF > 0:
+                linkUpdates.setdefault(prevRREF, [None, None])[1] = nextRREF
+            if nextRREF > 0:
+                linkUpdates.setdefault(nextRREF, [None, None])[0] = prevRREF
+
+        # The merged blocks go to the front of the free list, in file order
+        for index, (startRREF, endRREF) in enumerate(extents):
+            prevRREF = extents[index - 1][0] if index > 0 else 0
+            nextRREF = extents[index + 1][0] if index + 1 < len(extents) else firstAvailable
+            availableSize = endRREF - startRREF - CalcMinBlockSize()
+            self.__write_data(startRREF, HeadBlock.initAvailable(availableSize, prevRREF, nextRREF, 0).encode())
+            self.__write_data(self.__calc_end_block_RREF(startRREF, availableSize),
+                              EndBlock(availableSize, BlockType.AVAILABLE).encode())
+        if extents and firstAvailable > 0:
+            linkUpdates.setdefault(firstAvailable, [None, None])[0] = extents[-1][0]
+
+        for availableRREF, (prevRREF, nextRREF) in linkUpdates.items():
+            availableHead = self.__readHead(availableRREF, expectedType = BlockType.AVAILABLE)
+            if prevRREF is not None:
+                availableHead.prev_available = prevRREF
+            if nextRREF is not None:
+                availableHead.next_available = nextRREF
+            self.__write_data(availableRREF, availableHead.encode())
+
+        for availableRREF in absorbed:
+            del self.__freeExtents[availableRREF]
+        for startRREF, endRREF in extents:
+            self.__freeExtents[startRREF] = endRREF - startRREF - CalcMinBlockSize()
+
+        self.__config.first_available_address = extents[0][0] if extents else firstAvailable
+        if self.__config.meta_address in headBlocks:
+            self.__config.meta_address = 0
+        if self.__config.summary_address in headBlocks:
+            self.__config.summary_address = 0
         self.__write_data(0, self.__config.encode())
 
+    def __collectFreeExtents(self, headBlocks: dict[int, HeadBlock]) -> tuple[list, dict]:
+        # Groups the records being freed into runs of physically adjacent blocks. A run also takes in
+        # the AVAILABLE blocks that touch it; those are returned so they can be unlinked.
+        extents = []
+        absorbed: dict[int, HeadBlock] = {}
+        for recordRREF in sorted(headBlocks):
+            recordEnd = self.__calc_next_record_RREF(recordRREF, headBlocks[recordRREF].record_size)
+            if extents and extents[-1][1] == recordRREF:
+                extents[-1][1] = recordEnd
+            else:
+                startRREF = recordRREF
+                prevEndRREF = recordRREF - EndBlock.getStorageSize()
+                if prevEndRREF >= RavrfConfig.getStorageSize():
+                    prevEndBlock = self.__readEndBlock(prevEndRREF)
+                    if prevEndBlock.block_type == BlockType.AVAILABLE:
+                        startRREF = recordRREF - self.__calc_record_size(prevEndBlock.record_size)
+                        absorbed[startRREF] = self.__readHead(startRREF, expectedType = BlockType.AVAILABLE)
+                extents.append([startRREF, recordEnd])
+
+            nextRREF = extents[-1][1]
+            while nextRREF < self.__size and nextRREF not in headBlocks:
+                nextHead = self.__readAnyHead(nextRREF)
+                if nextHead.block_type != BlockType.AVAILABLE:
+                    break
+                absorbed[nextRREF] = nextHead
+                nextRREF = self.__calc_next_record_RREF(nextRREF, nextHead.record_size)
+                extents[-1][1] = nextRREF
+
+        return extents, absorbed
+
+    def __fillBuffer(self, bufferRREF: int, buffer: bytearray, endRREF: int, readAhead: int = __READ_AHEAD,
+                     reader = None) -> None:
+        # Extends buffer with the bytes that follow it until it reaches endRREF, reading readAhead bytes
+        # past it in the same call so that the blocks that follow usually arrive with this one
+        bufferEnd = bufferRREF + len(buffer)
+        if bufferEnd >= endRREF:
+            return
+
+        buffer += (reader or self.__file).readAt(bufferEnd, endRREF - bufferEnd + readAhead)
+        if bufferRREF + len(buffer) < endRREF:
+            raise IOError(f"Short read at {bufferEnd}: file ends before {endRREF}")
+
+    def __freeRecords(self, headBlocks: dict[int, HeadBlock]) -> None:
+        # Deletes the records, or only marks them deleted while a snapshot is held. Their blocks then keep
+        # their bytes until __releaseDeferred hands them to __deleteRecords.
+        self.__recordCount -= sum(1 for headBlock in headBlocks.values() if headBlock.block_type == BlockType.DATA_BLOCK)
+        if not self.__snapshots:
+            self.__deleteRecords(headBlocks)
+            return
+
+        for recordRREF, headBlock in headBlocks.items():
+            self.__deferred[recordRREF] = (self.__generation, headBlock)
+        if self.__config.meta_address in headBlocks:
+            self.__config.meta_address = 0
+            self.__write_data(0, self.__config.encode())
+
     def __findAvailableSpace(self, requiredSize: int) -> tuple[int, HeadBlock]:
         if self.__file is None:
             raise IOError("File is not open")
         if requiredSize <= 0:
             raise ValueError("Required size must be positive")
 
-        availableRREF = self.__config.first_available_address
-        saved_RREF = 0
-
-        while availableRREF > 0:
-            availHead = self.__readHead(availableRREF, expectedType = BlockType.AVAILABLE)
-            recordSize = availHead.record_size
+        # First fit by address, chosen from the in-memory extent table; only the chosen head is read
+        fitRREF = trailingRREF = 0
+        for availableRREF, recordSize in self.__freeExtents.items():
             if recordSize >= requiredSize:
-                return availableRREF, availHead
-            if availableRREF + self.__calc_record_size(recordSize) >= self.__size:
-                saved_RREF = availableRREF
-            availableRREF = availHead.next_available
-
-        if saved_RREF > 0:
-            self.__size = saved_RREF     ## Adjust EOF to remove trailing available space
-                                         ## We already know that the trailing available block is too small
-                                         ## So we will be expanding the file size
+                if fitRREF == 0 or availableRREF < fitRREF:
+                    fitRREF = availableRREF
+            elif availableRREF + self.__calc_record_size(recordSize) >= self.__size:
+                trailingRREF = availableRREF
+
+        if fitRREF > 0:
+            return fitRREF, self.__readHead(fitRREF, expectedType = BlockType.AVAILABLE)
+
+        if trailingRREF > 0 and not self.__snapshots:
+            ## Not while a snapshot is held: a scan may be stepping over this block using its old size.
+            ## The trailing available block is too small, so the file is expanding anyway.
+            ## Take it off the free list and start the new record where it begins.
+            trailingHead = self.__readHead(trailingRREF, expectedType = BlockType.AVAILABLE)
+            self.__adjustAvailableLinks(trailingHead.prev_available, trailingHead.next_available, 0)
+            del self.__freeExtents[trailingRREF]
+            self.__size = trailingRREF
         
-        return self.__size, HeadBlock.initAvailable(requiredSize, 0, 0, 0)
+        return self.__size, None
+
+    def __freeListStartValid(self) -> bool:
+        availableRREF = self.__config.first_available_address
+        if availableRREF == 0:
+            return not self.__freeExtents
+        if availableRREF not in self.__freeExtents:
+            return False
+        try:
+            headBlock = self.__readAnyHead(availableRREF)
+        except (ValueError, IOError, struct.error):
+            return False
+        return headBlock.block_type == BlockType.AVAILABLE and headBlock.prev_available == 0
+
+    def __learnedPadding(self) -> int:
+        total = sum(self.__growth)
+        if total < self.__GROWTH_MIN_SAMPLES:
+            return 0
+        covered = 0
+        for bucket, count in enumerate(self.__growth):
+            covered += count
+            if covered >= total * self.__GROWTH_PERCENTILE:
+                return 0 if bucket == 0 else 1 << (bucket - 1)
+        return 0
+
+    def __loadSummary(self) -> bool:
+        # Loads the free extents and record count from the SUMMARY block in (usually) one read.
+        # Returns False when there is no summary, or it was not written by the last clean Close.
+        summaryRREF = self.__config.summary_address
+        if summaryRREF < RavrfConfig.getStorageSize() or summaryRREF >= self.__size:
+            return False
+
+        headSize = HeadBlock.getStorageSize()
+        block = self.__file.readAt(summaryRREF, min(self.__SUMMARY_READ, self.__size - summaryRREF))
+        try:
+            headBlock = HeadBlock.decode(block[:headSize])
+        except (ValueError, struct.error):
+            headBlock = None
+        if headBlock is None or headBlock.block_type != BlockType.SUMMARY_BLOCK:
+            self.__config.summary_address = 0
+            return False
+
+        if headBlock.data_size < self.__SUMMARY_HEAD.size or headBlock.data_size > headBlock.record_size:
+            return False
+        if headSize + headBlock.data_size > len(block):
+            block += self.__file.readAt(summaryRREF + len(block), headSize + headBlock.data_size - len(block))
+        payload = memoryview(block)[headSize:headSize + headBlock.data_size]
+        version, generation, recordCount, logicalEOF, extentCount = self.__SUMMARY_HEAD.unpack_from(payload)
+        extentsEnd = self.__SUMMARY_HEAD.size + extentCount * self.__SUMMARY_EXTENT.size
+        growthSize = self.__SUMMARY_GROWTH.size if version >= 2 else 0
+        if (version not in (1, 2) or generation != self.__config.summary_generation or
+                logicalEOF != self.__size or extentsEnd + growthSize != len(payload)):
+            return False
+
+        self.__freeExtents = dict(self.__SUMMARY_EXTENT.iter_unpack(payload[self.__SUMMARY_HEAD.size:extentsEnd]))
+        self.__recordCount = recordCount
+        if growthSize:
+            self.__growth = list(self.__SUMMARY_GROWTH.unpack_from(payload, extentsEnd))
+        return True
 
     def __read(self, recordRREF: int, length: int) -> bytes:
         if self.__file is None:
@@ -273,21 +813,39 @@ class raFile(io.BytesIO):
         if length <= 0:
             raise ValueError("Read length must be positive")
         
-        self.__file.seek(recordRREF, io.SEEK_SET)
-        record = bytearray(length)
-        self.__file.readinto(record)
-        return bytes(record)
+        record = self.__file.readAt(recordRREF, length)
+        if len(record) != length:
+            raise IOError(f"Short read at {recordRREF}: expected {length} bytes, got {len(record)}")
+        return record
     
     def __readAnyHead(self, recordRREF: int) -> HeadBlock:
+        if self.__cache is not None:
+            headBlock = self.__cache.getHead(recordRREF)
+            if headBlock is not None:
+                return headBlock
+            epoch = self.__cache.epoch
+
         headSize = HeadBlock.getStorageSize()
         headData = self.__read(recordRREF, headSize)
-        return HeadBlock.decode(headData)
+        headBlock = HeadBlock.decode(headData)
+        if self.__cache is not None:
+            self.__cache.put(recordRREF, headBlock, epoch = epoch)
+        return headBlock
     
     def __readData(self, recordRREF: int, blockType: BlockType = BlockType.DATA_BLOCK) -> bytes:
+        if self.__cache is not None:
+            headBlock, data = self.__cache.getData(recordRREF)
+            if data is not None and headBlock.block_type == blockType:
+                return data
+            # Taken before the head is read: a write to the record from here on drops the put below
+            epoch = self.__cache.epoch
+
         headBlock = self.__readHead(recordRREF, expectedType = blockType)
         dataSize = headBlock.data_size
         dataStart = recordRREF + HeadBlock.getStorageSize()
         data = self.__read(dataStart, dataSize)
+        if self.__cache is not None:
+            self.__cache.put(recordRREF, headBlock, data, epoch)
         return data
 
     def __readEndBlock(self, recordRREF: int) -> EndBlock:
@@ -302,13 +860,171 @@ class raFile(io.BytesIO):
 
         return headBlock
     
-    def __setPrevAvailable(self, nextAvailRREF: int, availableRREF: int) -> None:
-        nextHead = self.__readHead(nextAvailRREF, expectedType = BlockType.AVAILABLE)
-        nextHead.prev_available = availableRREF
-        self.__write_data(nextAvailRREF, nextHead.encode())
+    def __recordGrowth(self, growth: int) -> None:
+        bucket = 0 if growth <= 0 else min((growth - 1).bit_length() + 1, self.__GROWTH_BUCKETS - 1)
+        self.__growth[bucket] += 1
+
+    def __readSnapshot(self, recordRREF: int, generation: int, blockType: BlockType = BlockType.DATA_BLOCK) -> bytes:
+        with self.__lock:
+            if not self.__visible(recordRREF, generation):
+                raise ValueError(f"Record ID {recordRREF} is not in snapshot {generation}")
+            return self.__readData(recordRREF, blockType)
+
+    def __recover(self, configDamaged: bool = False) -> dict:
+        # One streaming pass over the head and end fences. Blocks with matching fences are kept; a block
+        # whose fences do not match is treated as free space up to the next good block. Free blocks that
+        # touch are merged, stale SUMMARY blocks are freed and a partial block at the end is cut off.
+        # The free list is only rewritten, in address order, when what is on disk does not check out.
+        report = {"blocks": 0, "records": 0, "freeBlocks": 0, "merged": 0, "damaged": [], "truncated": 0,
+                  "relinked": False, "configRebuilt": configDamaged}
+        runs = []                     # [start, end, head when the run is one untouched AVAILABLE block]
+        metaRREFs = []
+
+        def addFree(startRREF: int, endRREF: int, headBlock: HeadBlock = None) -> None:
+            if runs and runs[-1][1] == startRREF:
+                runs[-1][1:] = [endRREF, None]
+                report["merged"] += 1
+            else:
+                runs.append([startRREF, endRREF, headBlock])
+
+        def bufferedRead(offset: int, length: int) -> bytes:
+            if bufferRREF <= offset and offset + length <= bufferRREF + len(buffer):
+                return bytes(buffer[offset - bufferRREF:offset - bufferRREF + length])
+            return self.__file.readAt(offset, length)
+
+        fileSize = self.__size
+        recordRREF = bufferRREF = RavrfConfig.getStorageSize()
+        buffer = bytearray()
+        while recordRREF < fileSize:
+            del buffer[:recordRREF - bufferRREF]
+            bufferRREF = recordRREF
+            if recordRREF + HeadBlock.getStorageSize() <= fileSize:
+                self.__fillBuffer(bufferRREF, buffer, recordRREF + HeadBlock.getStorageSize())
+
+            headBlock = fencedHead(bufferedRead, recordRREF, fileSize)
+            if headBlock is None:
+                if fileSize - recordRREF < CalcMinBlockSize():
+                    report["truncated"] = fileSize - recordRREF
+                    self.__file.truncate(recordRREF)
+                    fileSize = self.__size = recordRREF
+                    break
+                nextRREF = findBlockStart(self.__file.readAt, recordRREF + CalcMinBlockSize(), fileSize)
+                report["damaged"].append((recordRREF, nextRREF))
+                addFree(recordRREF, nextRREF)
+                recordRREF = nextRREF
+                continue
+
+            report["blocks"] += 1
+            nextRREF = self.__calc_next_record_RREF(recordRREF, headBlock.record_size)
+            match headBlock.block_type:
+                case BlockType.AVAILABLE:
+                    addFree(recordRREF, nextRREF, headBlock)
+                case BlockType.DATA_BLOCK:
+                    report["records"] += 1
+                case BlockType.META_BLOCK:
+                    metaRREFs.append(recordRREF)
+                case BlockType.RESERVED_BLOCK:
+                    # Left by a writer that never committed, unless one is still open on this object
+                    if recordRREF not in self.__reservations:
+                        addFree(recordRREF, nextRREF)
+                case BlockType.SUMMARY_BLOCK:
+                    if recordRREF != self.__config.summary_address:
+                        addFree(recordRREF, nextRREF)
+                case BlockType.PAD_BLOCK:
+                    # Only an aligned file has one, right after the config, and it ends on the boundary
+                    if configDamaged and recordRREF == RavrfConfig.getStorageSize():
+                        self.__config.alignment = nextRREF
+            recordRREF = nextRREF
+
+        # The free list on disk stands if it links up every free block exactly once
+        intact = {startRREF: headBlock for startRREF, _, headBlock in runs if headBlock is not None}
+        chained = 0
+        prevRREF, availableRREF = 0, self.__config.first_available_address
+        while availableRREF in intact and intact[availableRREF].prev_available == prevRREF and chained < len(runs):
+            chained += 1
+            prevRREF, availableRREF = availableRREF, intact[availableRREF].next_available
+        if configDamaged or availableRREF != 0 or chained != len(runs):
+            for index, (startRREF, endRREF, _) in enumerate(runs):
+                prevRREF = runs[index - 1][0] if index > 0 else 0
+                nextRREF = runs[index + 1][0] if index + 1 < len(runs) else 0
+                availableSize = endRREF - startRREF - CalcMinBlockSize()
+                self.__write_data(startRREF, HeadBlock.initAvailable(availableSize, prevRREF, nextRREF, 0).encode())
+                self.__write_data(self.__calc_end_block_RREF(startRREF, availableSize),
+                                  EndBlock(availableSize, BlockType.AVAILABLE).encode())
+            self.__config.first_available_address = runs[0][0] if runs else 0
+            report["relinked"] = True
+
+        if self.__config.meta_address not in metaRREFs:
+            self.__config.meta_address = metaRREFs[-1] if metaRREFs else 0
+        if self.__config.summary_address >= fileSize:
+            self.__config.summary_address = 0
+        self.__write_data(0, self.__config.encode())
+
+        self.__freeExtents = {startRREF: endRREF - startRREF - CalcMinBlockSize() for startRREF, endRREF, _ in runs}
+        self.__recordCount = report["records"]
+        self.__growth = [0] * self.__GROWTH_BUCKETS
+        report["freeBlocks"] = len(runs)
+        return report
+
+    def __releaseDeferred(self) -> None:
+        # Frees the deferred blocks that no remaining snapshot can see, in one batch
+        oldest = min(self.__snapshots, default = None)
+        if oldest is None:
+            self.__births.clear()
+        else:
+            self.__births = {recordRREF: born for recordRREF, born in self.__births.items() if born > oldest}
+
+        released = {recordRREF: headBlock for recordRREF, (freed, headBlock) in self.__deferred.items()
+                    if oldest is None or freed <= oldest}
+        for recordRREF in released:
+            del self.__deferred[recordRREF]
+        if released:
+            self.__deleteRecords(released)
+
+    def __releaseSnapshot(self, generation: int) -> None:
+        with self.__lock:
+            if generation not in self.__snapshots:
+                return
+            self.__snapshots[generation] -= 1
+            if self.__snapshots[generation] == 0:
+                del self.__snapshots[generation]
+            if self.__file is not None:
+                self.__releaseDeferred()
+
+    def __releaseRegion(self, regionRREF: int, regionSize: int) -> None:
+        # Hands an allocated region whose write failed back to the free list as one AVAILABLE block
+        self.__deleteRecords({regionRREF: HeadBlock.initData(regionSize, 0, regionSize, 0)})
+
+    def __reserveRecord(self, requiredSize: int) -> tuple[int, int, int]:
+        # Claims a RESERVED block without writing its data area, so the file stays walkable. Scans and
+        # the record count pass it over until __commitRecord makes it a DATA record.
+        with self.__lock:
+            recordSize, recordRREF = self.__allocate(requiredSize)
+            self.__write_data(recordRREF, self.__reservedHead(recordSize).encode())
+            self.__write_data(self.__calc_end_block_RREF(recordRREF, recordSize),
+                              EndBlock(recordSize, BlockType.RESERVED_BLOCK).encode())
+            self.__reservations[recordRREF] = recordSize
+            if self.__snapshots:
+                self.__births[recordRREF] = self.__generation
+            # Traced as the Add of an empty record; growing or aborting the writer deletes it again
+            self.__traceOp(ADD, BlockType.DATA_BLOCK, requiredSize, 0, 0, recordRREF)
+        return recordRREF, recordSize, recordRREF + HeadBlock.getStorageSize()
+
+    def __reservedHead(self, recordSize: int) -> HeadBlock:
+        return HeadBlock(BlockType.RESERVED_BLOCK, recordSize, 0, recordSize, 0)
+
+    def __scanSnapshot(self, generation: int):
+        # Writers may run between blocks, but never merge blocks or reuse freed ones while the snapshot
+        # is held, so every block boundary the walk steps onto stays a boundary
+        for recordRREF, _, data in self.__walkBlocks((BlockType.DATA_BLOCK,), self.__lock):
+            if data is not None and self.__visible(recordRREF, generation):
+                yield recordRREF, data
 
     def __updateAvailableList(self, availableRREF: int, availableHeading: HeadBlock, 
                               requiredSize: int) -> {int, int}:
+        if availableHeading is None:
+            return requiredSize, availableRREF      ## Appending at the end of the file
+
         prevAvailableRREF = availableHeading.prev_available
         nextAvailableRREF = availableHeading.next_available
         dataAreaSize = availableHeading.record_size
@@ -321,6 +1037,7 @@ class raFile(io.BytesIO):
                 # This method reduces IOs since the prev and next locations do not change
                 remainingSize = dataAreaSize - totalSize
                 availableHeading.record_size = remainingSize
+                self.__freeExtents[availableRREF] = remainingSize
                 self.__write_data(availableRREF, availableHeading.encode())
                 endEREF = self.__calc_end_block_RREF(availableRREF, remainingSize)
                 self.__write_data(endEREF, EndBlock(remainingSize, BlockType.AVAILABLE).encode())
@@ -330,36 +1047,132 @@ class raFile(io.BytesIO):
                 self.__adjustAvailableLinks(prevAvailableRREF, nextAvailableRREF, 0)
         else:
             self.__adjustAvailableLinks(prevAvailableRREF, nextAvailableRREF, 0)
+        self.__freeExtents.pop(availableRREF, None)
     
         return requiredSize, availableRREF
 
+    def __visible(self, recordRREF: int, generation: int) -> bool:
+        if self.__births.get(recordRREF, generation) > generation:
+            return False
+        freed = self.__deferred.get(recordRREF)
+        return freed is None or freed[0] > generation
+
+    def __walkBlocks(self, dataTypes: tuple = (), lock = None, reader = None):
+        # Yields (RREF, head, data) for every block in file order, reading the file sequentially.
+        # data is read only for the block types in dataTypes and is None for the others. When a lock
+        # is given it is held while each block is read, but not across the yield. reader replaces the
+        # storage for the reads, e.g. a DirectReader.
+        if self.__file is None:
+            raise IOError("File is not open")
+
+        lock = lock or nullcontext()
+        headSize = HeadBlock.getStorageSize()
+        recordRREF = bufferRREF = RavrfConfig.getStorageSize()
+        buffer = bytearray()
+        while True:
+            with lock:
+                if recordRREF >= self.__size:
+                    break
+                del buffer[:recordRREF - bufferRREF]
+                bufferRREF = recordRREF
+                self.__fillBuffer(bufferRREF, buffer, recordRREF + headSize, reader = reader)
+
+                headBlock = HeadBlock.decode(bytes(buffer[:headSize]))
+                data = None
+                if headBlock.block_type in dataTypes:
+                    dataEnd = headSize + headBlock.data_size
+                    self.__fillBuffer(bufferRREF, buffer, recordRREF + dataEnd, reader = reader)
+                    data = bytes(buffer[headSize:dataEnd])
+            yield recordRREF, headBlock, data
+            recordRREF = self.__calc_next_record_RREF(recordRREF, headBlock.record_size)
+
+    def __writeRecord(self, recordRREF: int, buffers: list, data: memoryview) -> None:
+        # Writes a whole record built by __buildRecord; with a cache the record is written through
+        self.__write_vector(recordRREF, buffers)
+        if self.__cache is not None:
+            self.__cache.put(recordRREF, HeadBlock.decode(buffers[0]), data)
+
     def __write_data(self, recordRREF: int, record: bytes) -> None:
+        if record is None or len(record) == 0:
+            raise ValueError("Record cannot be None or empty")
+
+        self.__write_vector(recordRREF, [record])
+
+    def __write_vector(self, recordRREF: int, buffers: list) -> None:
         if self.__file is None:
             raise IOError("File is not open")
         if recordRREF < 0:
             raise ValueError("Location must be non-negative")
-        if record is None or len(record) == 0:
-            raise ValueError("Record cannot be None or empty")
 
-        self.__file.seek(recordRREF, io.SEEK_SET)
-        self.__file.write(record)
-        self.__file.flush()
-        end_position = recordRREF + len(record)
-        if end_position > self.__size:
-            self.__size = end_position
+        end_position = recordRREF + sum(memoryview(buffer).nbytes for buffer in buffers)
+        with self.__lock:
+            if self.__changeLog is not None:
+                self.__changeLog.record(recordRREF, end_position)     # logged ahead of the write
+            self.__file.writevAt(recordRREF, buffers)
+            if self.__cache is not None:
+                self.__cache.invalidate(recordRREF)
+            if end_position > self.__size:
+                self.__size = end_position
+
+    def __writeSummary(self) -> None:
+        # Checkpoints the extent table and record count for the next Open. The block is rewritten in
+        # place while it is big enough; the config is written last, with the generation in the block.
+        summaryRREF = self.__config.summary_address
+        recordSize = 0
+        if summaryRREF > 0:
+            headBlock = self.__readAnyHead(summaryRREF)
+            if headBlock.block_type != BlockType.SUMMARY_BLOCK:
+                summaryRREF = 0
+            elif headBlock.record_size < self.__summarySize(len(self.__freeExtents)):
+                self.__deleteRecords({summaryRREF: headBlock})
+                summaryRREF = 0
+            else:
+                recordSize = headBlock.record_size
+        if summaryRREF == 0:
+            # Room to spare so a few more extents still fit next time; allocating never adds an extent
+            extentCount = len(self.__freeExtents)
+            recordSize, summaryRREF = self.__allocate(self.__summarySize(extentCount + extentCount // 4 + 4))
+
+        logicalEOF = max(self.__size, self.__calc_next_record_RREF(summaryRREF, recordSize))
+        extents = sorted(self.__freeExtents.items())
+        payload = self.__SUMMARY_HEAD.pack(self.__SUMMARY_VERSION, self.__config.summary_generation,
+                                           self.__recordCount, logicalEOF, len(extents)) + \
+            b"".join(self.__SUMMARY_EXTENT.pack(*extent) for extent in extents) + \
+            self.__SUMMARY_GROWTH.pack(*self.__growth)
+        self.__write_vector(summaryRREF, self.__buildRecord(BlockType.SUMMARY_BLOCK, memoryview(payload), recordSize))
+        self.__config.summary_address = summaryRREF
+        self.__write_data(0, self.__config.encode())
+
+    def __summarySize(self, extentCount: int) -> int:
+        return self.__SUMMARY_HEAD.size + extentCount * self.__SUMMARY_EXTENT.size + self.__SUMMARY_GROWTH.size
 
     def __del__(self):
         self.Close()
 
     @classmethod
-    def Create(cls, path: pathlib.Path) -> "raFile":
+    def Create(cls, path: pathlib.Path, cacheSize: int = 0, adaptivePadding: bool = False,
+               storage: type[Storage] = FileStorage, alignment: int = 0) -> "raFile":
+        # alignment (a power of two from 64 bytes to 1 MiB, or zero for packed blocks) puts every block
+        # start and size on that boundary, so no record straddles more pages than it must
         print(f"Enter Create: path = {path}")
-        with io.open(path, "x+b") as file:
-            config = RavrfConfig()
-            file.write(config.encode())
-            file.flush()
+        if alignment and not cls.__MIN_ALIGNMENT <= alignment <= cls.__MAX_ALIGNMENT:
+            raise ValueError(f"Alignment must be zero or from {cls.__MIN_ALIGNMENT} to {cls.__MAX_ALIGNMENT} bytes")
+        config = RavrfConfig(alignment = alignment)
+        ravrFile = raFile(path, cacheSize, adaptivePadding, storage)
+        file = storage(ravrFile.__path, create = True)
+        # A new file has no history, so a change log left behind by an earlier file of that name goes
+        if storage.PERSISTENT:
+            ChangeLog.pathFor(ravrFile.__path).unlink(missing_ok = True)
+        try:
+            file.writeAt(0, config.encode())
+            if alignment:
+                padSize = alignment - config.getStorageSize() - CalcMinBlockSize()
+                file.writevAt(config.getStorageSize(),
+                              [HeadBlock(BlockType.PAD_BLOCK, padSize, 0, padSize, 0).encode()] +
+                              Storage.zeros(padSize) + [EndBlock(padSize, BlockType.PAD_BLOCK).encode()])
+        finally:
+            file.close()
 
-        ravrFile = raFile(path)
         ravrFile.Open()
         return ravrFile
     
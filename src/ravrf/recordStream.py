@@ -0,0 +1,121 @@
+import io
+
+class RecordReader(io.RawIOBase):
+    # Read only, seekable view of the data area of one record.
+    # Every read goes straight to the storage at an absolute offset, so only the caller's chunk is
+    # ever held in memory.
+
+    def __init__(self, storage, dataRREF: int, dataSize: int):
+        self.__storage = storage
+        self.__dataRREF = dataRREF
+        self.__dataSize = dataSize
+        self.__position = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        if self.closed:
+            raise ValueError("I/O operation on closed record")
+
+        view = memoryview(buffer).cast("B")
+        length = min(view.nbytes, self.__dataSize - self.__position)
+        if length <= 0:
+            return 0
+
+        data = self.__storage.readAt(self.__dataRREF + self.__position, length)
+        view[:len(data)] = data
+        self.__position += len(data)
+        return len(data)
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        match whence:
+            case io.SEEK_SET:
+                position = offset
+            case io.SEEK_CUR:
+                position = self.__position + offset
+            case io.SEEK_END:
+                position = self.__dataSize + offset
+            case _:
+                raise ValueError(f"Invalid whence ({whence})")
+        if position < 0:
+            raise ValueError("Negative seek position")
+        self.__position = position
+        return position
+
+    def tell(self) -> int:
+        return self.__position
+
+    @property
+    def size(self) -> int:
+        return self.__dataSize
+
+
+class RecordWriter(io.RawIOBase):
+    # Sequential writer for one new DATA record.
+    # The block is reserved up front from the size hint and the chunks are written directly into its
+    # data area. The final head block is written on close, which is when rref becomes valid.
+    # Writing past the reservation moves what has been written so far, a chunk at a time, into a
+    # block twice the size. An exception inside a with block frees the reserved block instead.
+    __COPY_CHUNK = 1024 * 1024
+
+    def __init__(self, raFileOps, requiredSize: int):
+        self.__reserve, self.__writeVector, self.__readAt, self.__commit, self.__release = raFileOps
+        self.__recordRREF = 0
+        self.__position = 0
+        self.rref = 0
+        self.__dataRREF, self.__recordRREF, self.__recordSize = self.__reserveBlock(max(requiredSize, 1))
+
+    def __exit__(self, excType, excValue, traceback):
+        if excType is not None:
+            self.abort()
+        else:
+            self.close()
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, buffer) -> int:
+        if self.closed:
+            raise ValueError("I/O operation on closed record")
+
+        view = memoryview(buffer).cast("B")
+        needed = self.__position + view.nbytes
+        if needed > self.__recordSize:
+            self.__grow(max(needed, 2 * self.__recordSize))
+
+        self.__writeVector(self.__dataRREF + self.__position, [view])
+        self.__position = needed
+        return view.nbytes
+
+    def tell(self) -> int:
+        return self.__position
+
+    def close(self) -> None:
+        # A failed commit still closes the writer: its block is not reserved any more
+        try:
+            if not self.closed and self.__recordRREF > 0:
+                self.__commit(self.__recordRREF, self.__recordSize, self.__position)
+                self.rref = self.__recordRREF
+        finally:
+            super().close()
+
+    def abort(self) -> None:
+        if not self.closed and self.__recordRREF > 0:
+            self.__release(self.__recordRREF)
+        super().close()
+
+    def __grow(self, requiredSize: int) -> None:
+        oldDataRREF, oldRecordRREF = self.__dataRREF, self.__recordRREF
+        self.__dataRREF, self.__recordRREF, self.__recordSize = self.__reserveBlock(requiredSize)
+        for offset in range(0, self.__position, self.__COPY_CHUNK):
+            chunk = self.__readAt(oldDataRREF + offset, min(self.__COPY_CHUNK, self.__position - offset))
+            self.__writeVector(self.__dataRREF + offset, [chunk])
+        self.__release(oldRecordRREF)
+
+    def __reserveBlock(self, requiredSize: int) -> tuple[int, int, int]:
+        recordRREF, recordSize, dataRREF = self.__reserve(requiredSize)
+        return dataRREF, recordRREF, recordSize
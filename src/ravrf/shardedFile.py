@@ -0,0 +1,248 @@
+import bisect
+import json
+import os
+import pathlib
+import zlib
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import NamedTuple
+
+from changeLog import ChangeLog
+from config import RavrfConfig
+from parallelScan import scanRange
+from raFile import raFile
+
+class ShardRREF(NamedTuple):
+    # Composite handle: which shard holds the record and its RREF inside that shard.
+    # RREFs are 32 bit addresses so the pair also packs into a single integer.
+    shard: int
+    rref: int
+
+    def encode(self) -> int:
+        return (self.shard << 32) | self.rref
+
+    @classmethod
+    def decode(cls, handle: int) -> "ShardRREF":
+        return cls(handle >> 32, handle & 0xFFFFFFFF)
+
+
+class ShardedRaFile:
+    # Spreads records across N .ravrf files in one directory.
+    # Each record is placed by its key, either hashed (crc32, stable across processes) or by range
+    # against sorted boundary keys. The layout is kept in a small JSON manifest next to the shards.
+    # Every shard is a normal raFile with its own free list and 4 GiB address space.
+    HASH = "hash"
+    RANGE = "range"
+    __MANIFEST = "manifest.json"
+    __MANIFEST_VERSION = 1
+    __SHARD_NAME = "shard{:04d}.ravrf"
+
+    def __init__(self, directory: pathlib.Path):
+        self.__directory = pathlib.Path(directory)
+        self.__shards: list[raFile] = []
+        self.__partition: str = self.HASH
+        self.__boundaries: list = []
+        self.__shardCount: int = 0
+
+    def __str__(self):
+        return (f"ShardedRaFile(directory={self.__directory}, partition={self.__partition}, "
+                f"shards={self.__shardCount})")
+
+    def Add(self, key, data, padding: int = 0) -> ShardRREF:
+        shard = self.ShardFor(key)
+        return ShardRREF(shard, self.__getShard(shard).Add(data, padding))
+
+    def Close(self) -> None:
+        for shard in self.__shards:
+            shard.Close()
+        self.__shards = []
+
+    def CompactShards(self, processes: int = None) -> dict[ShardRREF, ShardRREF]:
+        # Rewrites every shard with its records packed back to back (see compactShard), each in its own
+        # process. The shards are closed while the workers own them and opened again afterwards.
+        # Records move: returns old handle -> new handle for every record whose RREF changed.
+        if not self.__shards:
+            raise IOError("File is not open")
+
+        self.Close()
+        try:
+            results = self.MapShards(compactShard, processes = processes)
+        finally:
+            self.__shards = self.__openShards(self.__openShard)
+        return {ShardRREF(shard, oldRREF): ShardRREF(shard, newRREF)
+                for shard, moved in enumerate(results) for oldRREF, newRREF in moved}
+
+    def Delete(self, handle: ShardRREF) -> None:
+        self.__getShard(handle.shard).Delete(handle.rref)
+
+    def DeleteMany(self, handles: list[ShardRREF]) -> None:
+        for shard, rrefs in self.__groupByShard(handles).items():
+            self.__getShard(shard).DeleteMany(rrefs)
+
+    def MapShards(self, function, *args, processes: int = None) -> list:
+        # Runs function(shardPath, *args) for every shard in a process pool and returns the results in
+        # shard order. The function and arguments must be picklable. Records should not be written
+        # through this object while the workers run.
+        with ProcessPoolExecutor(max_workers = processes) as executor:
+            futures = [executor.submit(function, self.GetShardPath(shard), *args)
+                       for shard in range(self.__shardCount)]
+            return [future.result() for future in futures]
+
+    def Open(self) -> None:
+        manifest = json.loads((self.__directory / self.__MANIFEST).read_text(encoding = "utf-8"))
+        if manifest.get("version") != self.__MANIFEST_VERSION:
+            raise ValueError(f"Unsupported manifest version {manifest.get('version')}")
+
+        self.__partition = manifest["partition"]
+        self.__boundaries = manifest["boundaries"]
+        self.__shardCount = manifest["shards"]
+        self.__shards = self.__openShards(lambda path: self.__openShard(path))
+
+    def ReadData(self, handle: ShardRREF) -> bytes:
+        return self.__getShard(handle.shard).ReadData(handle.rref)
+
+    def ReadMany(self, handles: list[ShardRREF]) -> list[bytes]:
+        records = {}
+        for shard, rrefs in self.__groupByShard(handles).items():
+            for rref, data in self.__getShard(shard).StreamMany(rrefs):
+                records[ShardRREF(shard, rref)] = data
+        return [records[ShardRREF(*handle)] for handle in handles]
+
+    def Save(self, handle: ShardRREF, record, padding: int = 0) -> ShardRREF:
+        return ShardRREF(handle.shard, self.__getShard(handle.shard).Save(handle.rref, record, padding))
+
+    def Scan(self):
+        for shard in range(self.__shardCount):
+            for rref, data in self.__getShard(shard).Scan():
+                yield ShardRREF(shard, rref), data
+
+    def ScanShards(self, predicate, processes: int = None) -> list:
+        # Parallel Scan: each shard is filtered in its own process by a picklable predicate
+        results = self.MapShards(scanShard, predicate, processes = processes)
+        return [(ShardRREF(shard, rref), data) for shard, matches in enumerate(results) for rref, data in matches]
+
+    def ShardFor(self, key) -> int:
+        if self.__partition == self.RANGE:
+            return bisect.bisect_right(self.__boundaries, key)
+
+        return zlib.crc32(self.__keyBytes(key)) % self.__shardCount
+
+    def GetShardPath(self, shard: int) -> pathlib.Path:
+        return self.__directory / self.__SHARD_NAME.format(shard)
+
+    def __getShard(self, shard: int) -> raFile:
+        if not self.__shards:
+            raise IOError("File is not open")
+        if shard < 0 or shard >= self.__shardCount:
+            raise ValueError(f"Shard {shard} does not exist")
+        return self.__shards[shard]
+
+    def __groupByShard(self, handles: list[ShardRREF]) -> dict[int, list[int]]:
+        groups: dict[int, list[int]] = {}
+        for shard, rref in handles:
+            groups.setdefault(shard, []).append(rref)
+        return groups
+
+    def __openShard(self, path: pathlib.Path) -> raFile:
+        shard = raFile(path)
+        shard.Open()
+        return shard
+
+    def __openShards(self, opener) -> list[raFile]:
+        with ThreadPoolExecutor() as executor:
+            return list(executor.map(opener, [self.GetShardPath(shard) for shard in range(self.__shardCount)]))
+
+    def __writeManifest(self) -> None:
+        manifest = {"version": self.__MANIFEST_VERSION, "partition": self.__partition,
+                    "shards": self.__shardCount, "boundaries": self.__boundaries}
+        path = self.__directory / self.__MANIFEST
+        temporaryPath = path.with_suffix(".tmp")
+        temporaryPath.write_text(json.dumps(manifest, indent = 2), encoding = "utf-8")
+        os.replace(temporaryPath, path)
+
+    @staticmethod
+    def __keyBytes(key) -> bytes:
+        if isinstance(key, (bytes, bytearray, memoryview)):
+            return bytes(key)
+        return str(key).encode("utf-8")
+
+    @classmethod
+    def Create(cls, directory: pathlib.Path, shardCount: int = 4, partition: str = HASH,
+               boundaries: list = None) -> "ShardedRaFile":
+        # Range partitioning takes the sorted boundary keys (str or int); shard n holds the keys
+        # from boundaries[n - 1] up to, but not including, boundaries[n].
+        if partition == cls.RANGE:
+            boundaries = list(boundaries or [])
+            if boundaries != sorted(boundaries) or len(set(boundaries)) != len(boundaries):
+                raise ValueError("Range boundaries must be sorted and unique")
+            shardCount = len(boundaries) + 1
+        elif partition == cls.HASH:
+            boundaries = []
+        else:
+            raise ValueError(f"Unknown partition '{partition}'")
+        if shardCount < 1:
+            raise ValueError("Shard count must be positive")
+
+        sharded = cls(directory)
+        sharded.__directory.mkdir(parents = True, exist_ok = True)
+        if (sharded.__directory / cls.__MANIFEST).exists():
+            raise FileExistsError(f"'{sharded.__directory}' already holds a sharded file")
+
+        sharded.__partition = partition
+        sharded.__boundaries = boundaries
+        sharded.__shardCount = shardCount
+        sharded.__shards = sharded.__openShards(raFile.Create)
+        sharded.__writeManifest()
+        return sharded
+
+
+def compactShard(path: pathlib.Path, batchBytes: int = 1024 * 1024) -> list:
+    # Copies the shard's META block and DATA records, in file order and without padding, into a new
+    # file with the same alignment, which then replaces the shard. The shard must not be open anywhere
+    # else. Returns (old RREF, new RREF) for every record that moved.
+    path = pathlib.Path(path)
+    with open(path, "rb") as shardFile:
+        alignment = RavrfConfig.decode(shardFile.read(RavrfConfig.getStorageSize())).alignment
+    compactPath = path.with_name(path.stem + ".compact.ravrf")
+    source = raFile(path)
+    source.Open()
+    moved = []
+    try:
+        target = raFile.Create(compactPath, alignment = alignment)
+        try:
+            meta = source.GetMeta()
+            if meta:
+                target.PutMeta(meta)
+            batch = []
+            oldRREFs = []
+            pendingBytes = 0
+            for recordRREF, data in source.Scan():
+                batch.append(data)
+                oldRREFs.append(recordRREF)
+                pendingBytes += len(data)
+                if pendingBytes >= batchBytes:
+                    moved += zip(oldRREFs, target.AddMany(batch))
+                    batch, oldRREFs, pendingBytes = [], [], 0
+            if batch:
+                moved += zip(oldRREFs, target.AddMany(batch))
+            target.Sync()
+        finally:
+            target.Close()
+    except BaseException:
+        compactPath.unlink(missing_ok = True)
+        raise
+    finally:
+        source.Close()
+    changeLogPath = ChangeLog.pathFor(path)
+    if changeLogPath.exists():
+        # Every byte is new to the next incremental backup; logged ahead of the swap like any write
+        changeLog = ChangeLog(changeLogPath)
+        changeLog.record(0, compactPath.stat().st_size)
+        changeLog.close()
+    os.replace(compactPath, path)
+    return [(oldRREF, newRREF) for oldRREF, newRREF in moved if oldRREF != newRREF]
+
+def scanShard(path: pathlib.Path, predicate) -> list:
+    # Walks the shard's blocks read-only; opening it as a raFile would rewrite the config and the
+    # summary under the parent that still has it open
+    _, _, matches = scanRange(path, RavrfConfig.getStorageSize(), os.path.getsize(path), predicate, snap = False)
+    return matches
@@ -0,0 +1,56 @@
+class ReadSnapshot:
+    # Consistent read view of a raFile as of the moment it was taken.
+    # Records added or relocated afterwards are not seen, and records deleted afterwards still are: their
+    # blocks are kept off the free list until every snapshot that can see them has been released.
+    # Writers carry on while the snapshot is held; release it promptly, since freed space is not reused
+    # and every Save relocates its record until then.
+
+    def __init__(self, generation: int, snapshotOps: tuple):
+        self.__generation = generation
+        self.__scan, self.__readData, self.__getMeta, self.__release = snapshotOps
+        self.__released = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, excType, excValue, traceback):
+        self.Release()
+
+    def __del__(self):
+        self.Release()
+
+    @property
+    def generation(self) -> int:
+        return self.__generation
+
+    @property
+    def released(self) -> bool:
+        return self.__released
+
+    def GetMeta(self) -> bytes:
+        self.__checkHeld()
+        return self.__getMeta()
+
+    def ReadData(self, recordRREF: int) -> bytes:
+        self.__checkHeld()
+        return self.__readData(recordRREF)
+
+    def ReadMany(self, recordRREFs: list[int]) -> list[bytes]:
+        return [self.ReadData(recordRREF) for recordRREF in recordRREFs]
+
+    def Release(self) -> None:
+        if not self.__released:
+            self.__released = True
+            self.__release()
+
+    def Scan(self):
+        # Yields (RREF, data) for every record in the snapshot, in file order
+        self.__checkHeld()
+        for recordRREF, data in self.__scan():
+            if self.__released:
+                raise ValueError("Snapshot has been released")
+            yield recordRREF, data
+
+    def __checkHeld(self) -> None:
+        if self.__released:
+            raise ValueError("Snapshot has been released")
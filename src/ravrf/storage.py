@@ -0,0 +1,350 @@
+import mmap
+from abc import ABC, abstractmethod
+import os
+import pathlib
+import threading
+
+class Storage(ABC):
+    # The byte store under a raFile. Backends are built as <class>(path, create) and offer:
+    #   readAt(offset, length)   - short only at the end of the store
+    #   writeAt, writevAt        - grow the store as needed
+    #   getSize, truncate, sync, close, isOpen
+    # PERSISTENT is False for backends whose content does not outlive the process.
+    PERSISTENT = True
+    __ZERO_SIZE = 65536
+    __ZEROS = bytes(__ZERO_SIZE)
+
+    @abstractmethod
+    def close(self) -> None:
+        pass
+
+    @abstractmethod
+    def isOpen(self) -> bool:
+        pass
+
+    @abstractmethod
+    def getSize(self) -> int:
+        pass
+
+    @abstractmethod
+    def readAt(self, offset: int, length: int) -> bytes:
+        pass
+
+    def writeAt(self, offset: int, data) -> None:
+        self.writevAt(offset, [data])
+
+    @abstractmethod
+    def writevAt(self, offset: int, buffers: list) -> None:
+        pass
+
+    @abstractmethod
+    def sync(self) -> None:
+        pass
+
+    @abstractmethod
+    def truncate(self, size: int) -> None:
+        pass
+
+    @classmethod
+    def zeros(cls, length: int) -> list:
+        # Zero fill as a list of views on a shared buffer, so padding never allocates
+        fill = []
+        while length > 0:
+            size = min(length, cls.__ZERO_SIZE)
+            fill.append(memoryview(cls.__ZEROS)[:size])
+            length -= size
+        return fill
+
+    @staticmethod
+    def views(buffers: list) -> list:
+        # Flat byte views of the non-empty buffers
+        return [view for view in (memoryview(buffer).cast("B") for buffer in buffers) if view.nbytes > 0]
+
+class FileStorage(Storage):
+    # Positional I/O on a single file descriptor.
+    # Every read and write carries its own offset (pread/pwrite/pwritev) so there is no shared file
+    # position and no user space buffer. Concurrent readers do not need to coordinate with each other.
+    # Platforms without positional I/O (Windows) fall back to seek + read/write under a lock.
+    __IOV_MAX = 1024
+    __POSITIONAL = hasattr(os, "pread") and hasattr(os, "pwrite")
+    __VECTORED = hasattr(os, "pwritev")
+
+    def __init__(self, path: pathlib.Path, create: bool = False):
+        flags = os.O_RDWR | getattr(os, "O_BINARY", 0)
+        if create:
+            flags |= os.O_CREAT | os.O_EXCL
+        self.__fd: int = os.open(path, flags, 0o666)
+        self.__lock = threading.Lock()
+        self.__path = path
+
+    def __str__(self):
+        return f"FileStorage(path={self.__path}, fd={self.__fd})"
+
+    def close(self) -> None:
+        if self.__fd >= 0:
+            os.close(self.__fd)
+            self.__fd = -1
+
+    def isOpen(self) -> bool:
+        return self.__fd >= 0
+
+    def fileno(self) -> int:
+        return self.__fd
+
+    def getSize(self) -> int:
+        return os.fstat(self.__fd).st_size
+
+    def readAt(self, offset: int, length: int) -> bytes:
+        if not self.__POSITIONAL:
+            with self.__lock:
+                os.lseek(self.__fd, offset, os.SEEK_SET)
+                return self.__readFully(lambda size, _: os.read(self.__fd, size), offset, length)
+
+        return self.__readFully(lambda size, position: os.pread(self.__fd, size, position), offset, length)
+
+    def writevAt(self, offset: int, buffers: list) -> None:
+        # Writes the buffers back to back starting at offset without joining them
+        views = self.views(buffers)
+        if self.__VECTORED:
+            while views:
+                written = os.pwritev(self.__fd, views[:self.__IOV_MAX], offset)
+                offset += written
+                views = self.__consume(views, written)
+        elif self.__POSITIONAL:
+            for view in views:
+                while view.nbytes > 0:
+                    written = os.pwrite(self.__fd, view, offset)
+                    offset += written
+                    view = view[written:]
+        else:
+            with self.__lock:
+                os.lseek(self.__fd, offset, os.SEEK_SET)
+                for view in views:
+                    while view.nbytes > 0:
+                        view = view[os.write(self.__fd, view):]
+
+    def sync(self) -> None:
+        os.fsync(self.__fd)
+
+    def truncate(self, size: int) -> None:
+        os.ftruncate(self.__fd, size)
+
+    @staticmethod
+    def __consume(views: list, written: int) -> list:
+        while views and written >= views[0].nbytes:
+            written -= views[0].nbytes
+            views = views[1:]
+        if written > 0:
+            views = [views[0][written:]] + views[1:]
+        return views
+
+    @staticmethod
+    def __readFully(reader, offset: int, length: int) -> bytes:
+        data = reader(length, offset)
+        if len(data) == length or len(data) == 0:
+            return data
+
+        # Short reads are legal; keep going until EOF or the full length
+        parts = [data]
+        received = len(data)
+        while received < length:
+            part = reader(length - received, offset + received)
+            if len(part) == 0:
+                break
+            parts.append(part)
+            received += len(part)
+        return b"".join(parts)
+
+class MmapStorage(Storage):
+    # The file mapped into memory: reads and writes are slice copies with no system call per access.
+    # A write past the end grows the file and the mapping with it. sync flushes the dirty pages.
+    # Growing can move or replace the mapping, so every access to it holds the lock.
+    def __init__(self, path: pathlib.Path, create: bool = False):
+        self.__file = FileStorage(path, create)
+        self.__lock = threading.Lock()
+        self.__map: mmap.mmap = None
+        self.__path = path
+        self.__size = self.__file.getSize()
+        if self.__size > 0:
+            self.__map = mmap.mmap(self.__file.fileno(), self.__size)
+
+    def __str__(self):
+        return f"MmapStorage(path={self.__path}, size={self.__size})"
+
+    def close(self) -> None:
+        with self.__lock:
+            if self.__map is not None:
+                self.__map.close()
+                self.__map = None
+        self.__file.close()
+
+    def isOpen(self) -> bool:
+        return self.__file.isOpen()
+
+    def getSize(self) -> int:
+        return self.__size
+
+    def readAt(self, offset: int, length: int) -> bytes:
+        with self.__lock:
+            if self.__map is None:
+                return b""
+            return self.__map[offset:min(offset + length, self.__size)]
+
+    def writevAt(self, offset: int, buffers: list) -> None:
+        views = self.views(buffers)
+        with self.__lock:
+            end = offset + sum(view.nbytes for view in views)
+            if end > self.__size:
+                self.__resize(end)
+            for view in views:
+                self.__map[offset:offset + view.nbytes] = view
+                offset += view.nbytes
+
+    def sync(self) -> None:
+        with self.__lock:
+            if self.__map is not None:
+                self.__map.flush()
+
+    def truncate(self, size: int) -> None:
+        with self.__lock:
+            self.__resize(size)
+
+    def __resize(self, size: int) -> None:
+        # mremap where the platform has it, otherwise a new mapping of the resized file
+        if self.__map is not None and size > 0:
+            try:
+                self.__map.resize(size)
+                self.__size = size
+                return
+            except (OSError, SystemError):
+                self.__map.close()
+                self.__map = None
+        elif self.__map is not None:
+            self.__map.close()
+            self.__map = None
+        self.__file.truncate(size)
+        self.__size = size
+        if size > 0:
+            self.__map = mmap.mmap(self.__file.fileno(), size)
+
+class MemoryStorage(Storage):
+    # A bytearray in this process; nothing touches the disk. Stores are kept by path until removed, so
+    # a raFile can be created, closed and opened again like a file for as long as the process runs.
+    PERSISTENT = False
+    __stores: dict[str, bytearray] = {}
+    __storesLock = threading.Lock()
+
+    def __init__(self, path: pathlib.Path, create: bool = False):
+        key = self.__key(path)
+        with self.__storesLock:
+            if create:
+                if key in self.__stores:
+                    raise FileExistsError(f"Memory store '{path}' already exists")
+                self.__stores[key] = bytearray()
+            elif key not in self.__stores:
+                raise FileNotFoundError(f"Memory store '{path}' does not exist")
+            self.__data: bytearray = self.__stores[key]
+        self.__lock = threading.Lock()
+        self.__open = True
+        self.__path = path
+
+    def __str__(self):
+        return f"MemoryStorage(path={self.__path}, size={len(self.__data)})"
+
+    def close(self) -> None:
+        self.__open = False
+
+    def isOpen(self) -> bool:
+        return self.__open
+
+    def getSize(self) -> int:
+        return len(self.__data)
+
+    def readAt(self, offset: int, length: int) -> bytes:
+        return bytes(self.__data[offset:offset + length])
+
+    def writevAt(self, offset: int, buffers: list) -> None:
+        with self.__lock:
+            if offset > len(self.__data):
+                self.__data.extend(bytes(offset - len(self.__data)))
+            for view in self.views(buffers):
+                self.__data[offset:offset + view.nbytes] = view
+                offset += view.nbytes
+
+    def sync(self) -> None:
+        pass
+
+    def truncate(self, size: int) -> None:
+        with self.__lock:
+            if size < len(self.__data):
+                del self.__data[size:]
+            else:
+                self.__data.extend(bytes(size - len(self.__data)))
+
+    @classmethod
+    def exists(cls, path: pathlib.Path) -> bool:
+        return cls.__key(path) in cls.__stores
+
+    @classmethod
+    def remove(cls, path: pathlib.Path) -> None:
+        # Drops the store; a raFile still open on it keeps the bytes until it is closed
+        with cls.__storesLock:
+            cls.__stores.pop(cls.__key(path), None)
+
+    @staticmethod
+    def __key(path: pathlib.Path) -> str:
+        return str(pathlib.Path(path).absolute())
+
+class DirectReader:
+    # Read-only pass over a file that bypasses the page cache (O_DIRECT), for large scans that should
+    # not evict everything else from memory. O_DIRECT needs the offset, length and buffer address all
+    # aligned, so every read is widened to the alignment and lands in a page aligned anonymous mapping.
+    # Where O_DIRECT is missing or the file system refuses it, reads go through FileStorage instead.
+    IO_ALIGNMENT = 4096
+    __BUFFER_SIZE = 1024 * 1024
+
+    def __init__(self, path: pathlib.Path, alignment: int = 0):
+        self.__alignment = max(alignment, self.IO_ALIGNMENT)
+        self.__buffer = mmap.mmap(-1, self.__BUFFER_SIZE)
+        self.__fallback: FileStorage = None
+        self.__fd = -1
+        self.__path = path
+        if hasattr(os, "O_DIRECT") and hasattr(os, "preadv"):
+            try:
+                self.__fd = os.open(path, os.O_RDONLY | os.O_DIRECT)
+            except OSError:
+                pass
+        if self.__fd < 0:
+            self.__fallback = FileStorage(path)
+
+    @property
+    def direct(self) -> bool:
+        return self.__fallback is None
+
+    def close(self) -> None:
+        if self.__fd >= 0:
+            os.close(self.__fd)
+            self.__fd = -1
+        if self.__fallback is not None:
+            self.__fallback.close()
+        self.__buffer.close()
+
+    def readAt(self, offset: int, length: int) -> bytes:
+        if self.__fallback is not None:
+            return self.__fallback.readAt(offset, length)
+
+        start = offset - offset % self.__alignment
+        end = -(-(offset + length) // self.__alignment) * self.__alignment
+        if end - start > len(self.__buffer):
+            self.__buffer.close()
+            self.__buffer = mmap.mmap(-1, end - start)
+        try:
+            with memoryview(self.__buffer) as view:
+                received = os.preadv(self.__fd, [view[:end - start]], start)
+        except OSError:
+            # Accepted at open but not at read time; carry on without bypassing the cache
+            os.close(self.__fd)
+            self.__fd = -1
+            self.__fallback = FileStorage(self.__path)
+            return self.__fallback.readAt(offset, length)
+        return self.__buffer[offset - start:min(received, offset - start + length)]
@@ -0,0 +1,207 @@
+import itertools
+import os
+import pathlib
+import struct
+import sys
+import tempfile
+import time
+
+from blockDescriptor import BlockType, CalcMinBlockSize
+from config import RavrfConfig
+
+# Binary trace of the calls that shape a .ravrf file's allocation, for replaying real traffic against
+# a fresh file. raFile.StartTrace writes one; replay runs one.
+#   header   - magic, version
+#   prologue - a Block entry for every block in the file when the trace started, in file order
+#   entry    - op, block type, data size, padding, RREF and resulting RREF
+# Add has no RREF, and its result is where the record went; Save has both, and they differ when the
+# record moved; Delete has only the RREF; PutMeta has neither. A Block entry carries the block's
+# record size in place of padding. An AddMany entry carries the number of records in place of the
+# data size and is followed by one Add entry per record, which replay adds with a single AddMany.
+# A record written through OpenWriter is traced as the Add of its reservation, at the reserved size.
+
+MAGIC = b"RVTR"
+VERSION = 3
+ADD = ord("A")
+ADD_MANY = ord("G")
+BLOCK = ord("B")
+DELETE = ord("D")
+PUT_META = ord("M")
+SAVE = ord("S")
+HEADER = struct.Struct(">4sB")
+ENTRY = struct.Struct(">BBIIII")
+FLUSH_SIZE = 65536
+
+class TraceWriter:
+    def __init__(self, path: pathlib.Path):
+        self.__buffer = bytearray()
+        self.__fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC | getattr(os, "O_BINARY", 0), 0o666)
+        self.__path = pathlib.Path(path)
+        os.write(self.__fd, HEADER.pack(MAGIC, VERSION))
+
+    @property
+    def path(self) -> pathlib.Path:
+        return self.__path
+
+    def close(self) -> None:
+        if self.__fd >= 0:
+            self.flush()
+            os.close(self.__fd)
+            self.__fd = -1
+
+    def flush(self) -> None:
+        if self.__buffer:
+            os.write(self.__fd, self.__buffer)
+            self.__buffer.clear()
+
+    def record(self, op: int, blockType: BlockType, size: int, padding: int, recordRREF: int, resultRREF: int) -> None:
+        self.__buffer += ENTRY.pack(op, blockType.value, size, padding, recordRREF, resultRREF)
+        if len(self.__buffer) >= FLUSH_SIZE:
+            self.flush()
+
+def readTrace(path: pathlib.Path):
+    # Yields (op, block type, size, padding, RREF, resulting RREF); a torn last entry is ignored
+    with open(path, "rb") as trace:
+        magic, version = HEADER.unpack(trace.read(HEADER.size))
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"'{path}' is not a ravrf trace")
+        while True:
+            chunk = trace.read(ENTRY.size * 4096)
+            chunk = chunk[:len(chunk) - len(chunk) % ENTRY.size]
+            if not chunk:
+                return
+            for op, blockType, size, padding, recordRREF, resultRREF in ENTRY.iter_unpack(chunk):
+                yield op, BlockType(blockType), size, padding, recordRREF, resultRREF
+
+def replay(tracePath: pathlib.Path, target: pathlib.Path = None, storage = None, interval: int = 10000) -> list[dict]:
+    # Runs the trace against a new file and returns a sample every <interval> operations and at the end:
+    # ops, seconds, opsPerSecond, fileSize, freeBlocks, relocations and savesInPlace. The blocks of
+    # the prologue are laid out first and are not counted as operations.
+    # Records are zero filled; only their sizes matter to the allocator. Without a target the file
+    # goes in a temporary directory that is removed afterwards.
+    from raFile import raFile
+    from storage import FileStorage
+
+    if target is None:
+        with tempfile.TemporaryDirectory() as directory:
+            target = pathlib.Path(directory) / "replay.ravrf"
+            try:
+                return replay(tracePath, target, storage, interval)
+            finally:
+                if storage is not None and not storage.PERSISTENT:
+                    storage.remove(target)
+
+    entries = readTrace(tracePath)
+    prologue = []
+    for entry in entries:
+        if entry[0] != BLOCK:
+            entries = itertools.chain([entry], entries)
+            break
+        prologue.append(entry)
+
+    rave = raFile.Create(pathlib.Path(target), storage = storage or FileStorage, alignment = alignmentOf(prologue))
+    zeros = bytes(0)
+    samples = []
+    ops = sampledOps = 0
+    try:
+        rrefs = recreate(rave, prologue)       # traced RREF -> RREF in the replay
+        start = time.perf_counter()
+        for op, blockType, size, padding, recordRREF, resultRREF in entries:
+            if op == ADD_MANY:
+                group = list(itertools.islice(entries, size))
+                if len(group) != size or any(entry[0] != ADD for entry in group):
+                    raise ValueError("Trace ends inside an AddMany group")
+                sizes = [entry[2] for entry in group]
+                if max(sizes) > len(zeros):
+                    zeros = bytes(max(max(sizes), 2 * len(zeros)))
+                recordRREFs = rave.AddMany([memoryview(zeros)[:recordSize] for recordSize in sizes],
+                                           [entry[3] for entry in group], blockType)
+                rrefs.update(zip((entry[5] for entry in group), recordRREFs))
+                ops += size
+            else:
+                if size > len(zeros):
+                    zeros = bytes(max(size, 2 * len(zeros)))
+                replayOne(rave, rrefs, op, blockType, memoryview(zeros)[:size], padding, recordRREF, resultRREF)
+                ops += 1
+            if ops - sampledOps >= interval:
+                samples.append(sample(rave, ops, time.perf_counter() - start))
+                sampledOps = ops
+        if ops != sampledOps or ops == 0:
+            samples.append(sample(rave, ops, time.perf_counter() - start))
+    finally:
+        rave.Close()
+    return samples
+
+def replayOne(rave, rrefs: dict, op: int, blockType: BlockType, data: memoryview, padding: int, recordRREF: int,
+              resultRREF: int) -> None:
+    if op == ADD:
+        rrefs[resultRREF] = rave.Add(data, padding, blockType)
+    elif op == SAVE:
+        rrefs[resultRREF] = rave.Save(known(rrefs, recordRREF), data, padding, blockType)
+    elif op == DELETE:
+        rave.Delete(known(rrefs, recordRREF))
+    elif op == PUT_META:
+        rave.PutMeta(data, padding)
+    else:
+        raise ValueError(f"Unknown trace operation {op}")
+
+def alignmentOf(prologue: list) -> int:
+    # An aligned file starts with a PAD block that fills the first alignment unit after the config
+    if prologue and prologue[0][1] == BlockType.PAD_BLOCK and prologue[0][4] == RavrfConfig.getStorageSize():
+        return RavrfConfig.getStorageSize() + prologue[0][3] + CalcMinBlockSize()
+    return 0
+
+def known(rrefs: dict, recordRREF: int) -> int:
+    if recordRREF not in rrefs:
+        raise ValueError(f"Trace uses record {recordRREF}, which is neither in the prologue nor added")
+    return rrefs.pop(recordRREF)
+
+def recreate(rave, prologue: list) -> dict:
+    # Lays the prologue's blocks out at the same addresses: each is appended in file order, as a record
+    # of the same size, and the AVAILABLE ones are then deleted together. META becomes the meta block;
+    # RESERVED becomes a DATA record; SUMMARY and other system blocks become INDEX placeholders that only
+    # hold their space. Returns traced RREF -> RREF for the DATA, RESERVED and INDEX records.
+    rrefs = {}
+    available = []
+    for _, blockType, size, recordSize, blockRREF, _ in prologue:
+        if blockType == BlockType.PAD_BLOCK and blockRREF == RavrfConfig.getStorageSize():
+            continue
+        data = bytes(min(max(size, 1), recordSize))
+        if blockType == BlockType.META_BLOCK:
+            rave.PutMeta(data, recordSize - len(data))
+        elif blockType in (BlockType.DATA_BLOCK, BlockType.INDEX_BLOCK):
+            rrefs[blockRREF] = rave.Add(data, recordSize - len(data), blockType)
+        elif blockType == BlockType.RESERVED_BLOCK:
+            # An open writer's block, which the trace goes on to commit, grow or abort
+            rrefs[blockRREF] = rave.Add(data, recordSize - len(data))
+        else:
+            placeholderRREF = rave.Add(data, recordSize - len(data), BlockType.INDEX_BLOCK)
+            if blockType == BlockType.AVAILABLE:
+                available.append(placeholderRREF)
+    rave.DeleteMany(available)
+    return rrefs
+
+def sample(rave, ops: int, seconds: float) -> dict:
+    stats = rave.GetStats()
+    return {"ops": ops, "seconds": seconds, "opsPerSecond": ops / seconds if seconds > 0 else 0.0,
+            "fileSize": stats["fileSize"], "freeBlocks": len(rave.GetFreeExtents()),
+            "relocations": stats["relocations"], "savesInPlace": stats["savesInPlace"]}
+
+def main():
+    if len(sys.argv) < 2:
+        print("Usage: workloadTrace.py <trace> [<interval>] [file|mmap|memory]")
+        sys.exit(1)
+
+    import storage
+    backends = {"file": storage.FileStorage, "mmap": storage.MmapStorage, "memory": storage.MemoryStorage}
+    interval = int(sys.argv[2]) if len(sys.argv) > 2 else 10000
+    backend = backends[sys.argv[3]] if len(sys.argv) > 3 else storage.FileStorage
+
+    print(f"{'ops':>10} {'seconds':>9} {'ops/s':>10} {'file size':>12} {'free':>7} {'moved':>8} {'in place':>9}")
+    for row in replay(pathlib.Path(sys.argv[1]), storage = backend, interval = interval):
+        print(f"{row['ops']:>10} {row['seconds']:>9.3f} {row['opsPerSecond']:>10.0f} {row['fileSize']:>12} "
+              f"{row['freeBlocks']:>7} {row['relocations']:>8} {row['savesInPlace']:>9}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+from pathlib import Path
+import random
+import sys
+
+srcPath = f"{Path.cwd()}/src"
+sys.path.append(f"{srcPath}/SIRAF")
+sys.path.append(f"{srcPath}/ravrf")
+import raFile
+from externalSort import externalSort
+from hashIndex import HashIndex
+from table import Result, Table
+
+def test_external_sort_spills_runs_and_stays_stable():
+    records = [b"%03d:%05d" % (random.randrange(100), number) for number in range(3000)]
+    ordered = list(externalSort(iter(records), lambda record: record[:3], memoryBytes = 4096))
+    assert ordered == sorted(records, key = lambda record: record[:3])
+
+def test_bulk_load_clusters_records_and_builds_index(tmp_path):
+    table = Table.create("people: int id, str name, key hash (id)", tmp_path, expectedKeys = 5000)
+    numbers = list(range(5000))
+    random.shuffle(numbers)
+    records = [{"id": number, "name": f"name-{number}"} for number in numbers]
+    records.append({"id": 42, "name": "duplicate"})
+    reply = table.load(iter(records), memoryBytes = 32768, batchBytes = 4096)
+    assert reply["result"] == Result.SUCCESS
+    assert (reply["count"], reply["duplicates"]) == (5000, 1)
+    assert table.recordcount()["count"] == 5000
+    assert table.find([42])["records"] == [{"id": 42, "name": "name-42"}]
+
+    reply = table.load([{"id": 6000, "name": "late"}])
+    assert reply["result"] == Result.FAIL
+    table.close()
+
+    table = Table.open(tmp_path / "people.ravrf")
+    for number in random.sample(range(5000), 100):
+        assert table.find([number])["records"] == [{"id": number, "name": f"name-{number}"}]
+    assert table.find([5000])["records"] == []
+    assert [record["id"] for record in table.find()["records"]] == list(range(5000))
+    assert table.add({"id": 5000, "name": "added"})["result"] == Result.SUCCESS
+    assert table.find([5000])["records"] == [{"id": 5000, "name": "added"}]
+    table.close()
+
+def test_bulk_load_without_index_rejects_bad_keys(tmp_path):
+    table = Table.create("items: str code, int size, key (code)", tmp_path)
+    reply = table.load([{"code": "b", "size": 1}, {"code": None, "size": 2}])
+    assert reply["result"] == Result.FAIL
+    assert table.recordcount()["count"] == 0
+    reply = table.load([{"code": "b", "size": 1}, {"code": "a", "size": 2}])
+    assert reply["count"] == 2
+    assert [record["code"] for record in table.find()["records"]] == ["a", "b"]
+    table.close()
+
+def test_hash_index_build_spills_and_fills_buckets(tmp_path):
+    entries = [(b"key-%05d" % number, 1000 + number) for number in range(4000)]
+    layouts = []
+    for memoryBytes in (4096, 64 * 1024 * 1024):
+        rave = raFile.raFile.Create(tmp_path / f"index{memoryBytes}.ravrf")
+        index = HashIndex.build(rave, iter(entries), memoryBytes = memoryBytes, batchBytes = 8192)
+        assert all(index.find(key) == recordRREF for key, recordRREF in entries)
+        assert index.find(b"absent") is None
+        layouts.append((index.depth, len(index.bucketRREFs())))
+        rave.Close()
+    assert layouts[0] == layouts[1]
+    assert layouts[0][1] < 4000 * 20 // HashIndex.BUCKET_SIZE * 2
+
+def test_bulk_load_sizes_the_filter_for_the_keys_loaded(tmp_path):
+    table = Table.create("items: str code, int size, key (code)", tmp_path, expectedKeys = 10)
+    reply = table.load(({"code": f"c{number}", "size": number} for number in range(3000)), memoryBytes = 16384)
+    assert reply["count"] == 3000
+    assert table._Table__meta["filter"]["capacity"] == 3000
+    assert table._Table__filter.count == 3000
+    assert table.find(["c1234"])["records"] == [{"code": "c1234", "size": 1234}]
+    assert table.add({"code": "c1234", "size": 0})["result"] == Result.FAIL
+    table.close()
@@ -0,0 +1,81 @@
+from pathlib import Path
+import datetime
+import pytest
+import sys
+
+srcPath = f"{Path.cwd()}/src"
+sys.path.append(f"{srcPath}/SIRAF")
+sys.path.append(f"{srcPath}/ravrf")
+numpy = pytest.importorskip("numpy")
+import columnExport
+import raFile
+from recordCodec import RecordCodec
+from schema import Schema
+
+DEFINITION = ("readings: str sensor, int sequence, float value, bool valid, complex phase, date day, "
+              "time at, timestamp logged, str note, key (sensor, sequence)")
+
+def reading(index: int) -> dict:
+    return {"sensor": f"s{index % 7}", "sequence": index - 50, "value": index / 4,
+            "valid": index % 3 == 0, "phase": complex(index, -index),
+            "day": datetime.date(2026, 1, 1) + datetime.timedelta(days = index),
+            "at": datetime.time(index % 24, index % 60), "logged": datetime.datetime(2026, 10, 19, 1, 2, 3, index),
+            "note": None if index % 5 == 0 else "é" * (index % 4)}
+
+@pytest.fixture
+def readings(tmp_path):
+    schema = Schema.parse(DEFINITION)
+    codec = RecordCodec(schema)
+    rave = raFile.raFile.Create(tmp_path / "readings.ravrf")
+    rave.PutMeta(schema.toMeta())
+    records = [reading(index) for index in range(3000)]
+    rrefs = [rave.Add(codec.encode(record)) for record in records]
+    rave.DeleteMany(rrefs[::10])
+    yield rave, [(rref, record) for index, (rref, record) in enumerate(zip(rrefs, records)) if index % 10 != 0]
+    rave.Close()
+
+def test_export_columns(readings):
+    rave, expected = readings
+    columns, nulls = columnExport.exportColumns(rave, batchSize = 500)
+    assert columns["rref"].tolist() == [rref for rref, _ in expected]
+    assert columns["sequence"].tolist() == [record["sequence"] for _, record in expected]
+    assert columns["value"].dtype == numpy.float64
+    assert columns["valid"].tolist() == [record["valid"] for _, record in expected]
+    assert columns["phase"].tolist() == [record["phase"] for _, record in expected]
+    assert columns["day"].astype(object).tolist() == [record["day"] for _, record in expected]
+    assert columns["at"][7] == numpy.timedelta64(expected[7][1]["at"].hour * 60 + expected[7][1]["at"].minute, "m")
+    assert columns["logged"].astype(object).tolist() == [record["logged"] for _, record in expected]
+    assert columns["note"].tolist() == [record["note"] for _, record in expected]
+    assert nulls["note"].tolist() == [record["note"] is None for _, record in expected]
+    assert not nulls["value"].any()
+
+def test_export_allocates_columns_once(readings):
+    rave, expected = readings
+    columns, nulls = columnExport.exportColumns(rave, batchSize = 500)
+    assert all(column.base.shape == (len(expected),) for column in columns.values())
+    assert all(null.base.shape == (len(expected),) for null in nulls.values())
+
+    # A size hint that falls short still grows to fit
+    exporter = columnExport.ColumnExporter(RecordCodec.fromMeta(rave.GetMeta()), ["sequence"], expectedRows = 10)
+    scanned = list(rave.Scan())
+    for start in range(0, len(scanned), 700):
+        exporter.addBatch(scanned[start:start + 700])
+    columns, _ = exporter.finish()
+    assert columns["sequence"].tolist() == [record["sequence"] for _, record in expected]
+
+def test_export_records_subset(readings):
+    rave, expected = readings
+    records, nulls = columnExport.exportRecords(rave, fields = ["sensor", "value"])
+    assert records.dtype.names == ("rref", "sensor", "value")
+    assert records["value"].sum() == pytest.approx(sum(record["value"] for _, record in expected))
+    assert set(nulls) == {"sensor", "value"}
+
+def test_sidecar_round_trip(readings, tmp_path):
+    rave, expected = readings
+    columnExport.writeSidecar(rave, tmp_path / "sidecar")
+    columns, nulls = columnExport.loadSidecar(tmp_path / "sidecar")
+    assert isinstance(columns["value"], numpy.memmap)
+    assert columns["value"].tolist() == [record["value"] for _, record in expected]
+    assert len(columns["note"]) == len(expected)
+    assert columns["note"][3] == (expected[3][1]["note"] or "")
+    assert nulls["note"].tolist() == [record["note"] is None for _, record in expected]
@@ -0,0 +1,113 @@
+from pathlib import Path
+import pytest
+import random
+import sys
+
+srcPath = f"{Path.cwd()}/src"
+sys.path.append(f"{srcPath}/SIRAF")
+sys.path.append(f"{srcPath}/ravrf")
+import raFile
+from blockDescriptor import BlockType
+from hashIndex import HashIndex
+from schema import Schema
+from table import Result, Table
+
+@pytest.fixture
+def rave(tmp_path):
+    ravrFile = raFile.raFile.Create(tmp_path / "index.ravrf")
+    yield ravrFile
+    ravrFile.Close()
+
+def test_hash_index_splits_and_finds_with_one_bucket_read(rave, tmp_path):
+    index = HashIndex.create(rave)
+    keys = {f"key-{number:06}".encode(): number + 1 for number in range(5000)}
+    for key, value in keys.items():
+        index.insert(key, value)
+    assert index.depth > 0
+    assert len(index.bucketRREFs()) > 1
+
+    reads = index.bucketReads
+    for key in random.sample(list(keys), 200):
+        assert index.find(key) == keys[key]
+    assert index.find(b"missing") is None
+    assert index.bucketReads - reads == 201
+
+    with pytest.raises(ValueError):
+        index.insert(b"key-000010", 99)
+    assert index.remove(b"key-000010") == 11
+    assert index.remove(b"key-000010") is None
+    index.update(b"key-000011", 77)
+
+    directoryRREF = index.directoryRREF
+    rave.Close()
+    rave.Open(tmp_path / "index.ravrf")
+    reopened = HashIndex(rave, directoryRREF)
+    assert reopened.depth == index.depth
+    assert reopened.find(b"key-000010") is None
+    assert reopened.find(b"key-000011") == 77
+    assert reopened.find(b"key-004999") == 5000
+    assert rave.RecordCount() == 0
+
+def test_index_blocks_are_not_data(rave):
+    index = HashIndex.create(rave)
+    with pytest.raises(ValueError):
+        rave.ReadData(index.directoryRREF)
+    with pytest.raises(ValueError):
+        rave.Add(b"summary", 0, BlockType.SUMMARY_BLOCK)
+    assert list(rave.Scan()) == []
+
+def test_schema_selects_hash_index():
+    parsed = Schema.parse("people: str name, int age, key hash (name)")
+    assert parsed.index == Schema.HASH_INDEX
+    assert str(parsed) == "people: str name, int age, key hash (name)"
+    assert Schema.parse(str(parsed)) == parsed
+    assert Schema.parse("people: str name, key (name)").index is None
+    assert Schema.parse("people: str name, key (name)") != parsed
+
+@pytest.mark.parametrize("definition", ["people: str name, int age, key hash (name, age)",
+                                        "people: str name, int age, key (name, age)"])
+def test_table_calls(tmp_path, definition):
+    table = Table.create(definition, tmp_path)
+    for number in range(300):
+        assert table.add({"name": f"n{number % 10}", "age": number})["result"] == Result.SUCCESS
+    duplicate = table.add({"name": "n1", "age": 1})
+    assert duplicate["result"] == Result.FAIL and duplicate["message"] == "Key already exists"
+    assert table.add({"name": "n1"})["result"] == Result.FAIL
+
+    assert table.find(["n3", 13])["records"] == [{"name": "n3", "age": 13}]
+    assert table.find(["n3", 14])["records"] == []
+    assert table.find(["n3", 14])["result"] == Result.SUCCESS
+    assert len(table.find(["n3"])["records"]) == 30
+    assert len(table.find([None, (290, ">=")], ["age"])["records"]) == 10
+    assert table.find([None, (1, "~")])["result"] == Result.FAIL
+
+    assert table.update({"name": "n3", "age": 13})["result"] == Result.SUCCESS
+    assert table.update({"name": "n3", "age": 14})["result"] == Result.FAIL
+    assert table.delete(["n3", 13])["records"] == [{"name": "n3", "age": 13}]
+    assert table.delete(["n3", 13])["result"] == Result.FAIL
+    assert table.recordcount()["count"] == 299
+    assert table.close()["result"] == Result.SUCCESS
+
+    table = Table.open(tmp_path / "people.ravrf")
+    assert table.find(["n3", 13])["records"] == []
+    assert table.find(["n4", 14])["records"] == [{"name": "n4", "age": 14}]
+    assert table.add({"name": "n3", "age": 13})["result"] == Result.SUCCESS
+    assert table.recordcount()["count"] == 300
+    table.close()
+
+@pytest.mark.parametrize("definition", ["people: str name, int age, key hash (name, age)",
+                                        "people: str name, int age, key (name, age)"])
+def test_table_calls_reject_badly_typed_values(tmp_path, definition):
+    table = Table.create(definition, tmp_path)
+    assert table.add({"name": "n1", "age": 1})["result"] == Result.SUCCESS
+    for bad in ("x", 1.5, 2 ** 70, True):
+        assert table.add({"name": "n2", "age": bad})["result"] == Result.FAIL
+        assert table.update({"name": "n1", "age": bad})["result"] == Result.FAIL
+        assert table.find(["n1", bad])["result"] == Result.FAIL
+        assert table.delete(["n1", bad])["result"] == Result.FAIL
+    assert table.add({"name": 7, "age": 2})["result"] == Result.FAIL
+    assert table.find([7, 1])["result"] == Result.FAIL
+    assert table.find([None, ("x", ">=")])["result"] == Result.FAIL
+    assert table.find(["n1", 1])["records"] == [{"name": "n1", "age": 1}]
+    assert table.recordcount()["count"] == 1
+    table.close()
@@ -0,0 +1,74 @@
+from pathlib import Path
+import pytest
+import sys
+
+srcPath = f"{Path.cwd()}/src"
+sys.path.append(f"{srcPath}/SIRAF")
+sys.path.append(f"{srcPath}/ravrf")
+from keyFilter import KeyFilter
+from table import Result, Table
+
+def test_filter_sizing_and_false_positive_rate():
+    keyFilter = KeyFilter.sized(10000, 0.01)
+    assert keyFilter.hashCount == 7
+    assert 95000 < keyFilter.counterCount < 96000
+    for number in range(10000):
+        keyFilter.add(b"in-%d" % number)
+    assert all(b"in-%d" % number in keyFilter for number in range(10000))
+    falsePositives = sum(keyFilter.mayContain(b"out-%d" % number) for number in range(20000))
+    assert falsePositives < 20000 * 0.02
+    with pytest.raises(ValueError):
+        KeyFilter.sized(100, 1.5)
+
+def test_filter_remove_and_round_trip():
+    keyFilter = KeyFilter.sized(100, 0.01)
+    keyFilter.add(b"kept")
+    keyFilter.add(b"gone")
+    keyFilter.remove(b"gone")
+    assert b"gone" not in keyFilter
+    restored = KeyFilter.decode(keyFilter.encode())
+    assert (restored.count, restored.hashCount, restored.counterCount) == (1, keyFilter.hashCount, keyFilter.counterCount)
+    assert b"kept" in restored and b"gone" not in restored
+
+def test_saturated_counters_stay_set():
+    keyFilter = KeyFilter(1, 1)
+    for _ in range(20):
+        keyFilter.add(b"same")
+    for _ in range(20):
+        keyFilter.remove(b"same")
+    assert b"same" in keyFilter
+
+def test_table_skips_index_for_absent_keys(tmp_path):
+    table = Table.create("people: str name, int age, key hash (name)", tmp_path, expectedKeys = 2000)
+    index = table._Table__index
+    for number in range(1000):
+        assert table.add({"name": f"n{number}", "age": number})["result"] == Result.SUCCESS
+
+    reads = index.bucketReads
+    for number in range(1000):
+        assert table.find([f"absent{number}"])["records"] == []
+    assert index.bucketReads - reads < 50
+    assert table.find(["n5"])["records"] == [{"name": "n5", "age": 5}]
+    assert table.delete(["n5"])["result"] == Result.SUCCESS
+    assert table.find(["n5"])["records"] == []
+    table.close()
+
+    table = Table.open(tmp_path / "people.ravrf")
+    assert table.find(["n6"])["records"] == [{"name": "n6", "age": 6}]
+    assert table.add({"name": "n6", "age": 1})["result"] == Result.FAIL
+    table.close()
+
+def test_stale_filter_is_rebuilt_on_open(tmp_path):
+    table = Table.create("people: str name, int age, key (name)", tmp_path, expectedKeys = 100)
+    table.add({"name": "before", "age": 1})
+    table.close()
+
+    table = Table.open(tmp_path / "people.ravrf")
+    table.add({"name": "after", "age": 2})
+    table._Table__rave.Close()         # lost without the filter being written back
+
+    table = Table.open(tmp_path / "people.ravrf")
+    assert table.find(["after"])["records"] == [{"name": "after", "age": 2}]
+    assert table.add({"name": "after", "age": 3})["result"] == Result.FAIL
+    assert table.rebuildFilter(500)["count"] == 2
+    table.close()
@@ -0,0 +1,94 @@
+from pathlib import Path
+import datetime
+import json
+import pytest
+import sys
+
+srcPath = f"{Path.cwd()}/src/SIRAF"
+sys.path.append(srcPath)
+import recordCodec
+import schema
+
+DEFINITION = ("people: str last_name, str first_name, int age, float height, bool active, complex phase, "
+              "date birth_date, time alarm, timestamp updated, str descriptor, key (last_name, first_name)")
+
+def samplePerson() -> dict:
+    return {"last_name": "Stanley", "first_name": "Jim", "age": 61, "height": 1.82, "active": True,
+            "phase": complex(1.5, -2), "birth_date": datetime.date(1964, 3, 9),
+            "alarm": datetime.time(6, 45, 30, 125), "updated": datetime.datetime(2026, 10, 19, 8, 30, 1, 5),
+            "descriptor": "likes ISAM files ✓"}
+
+def test_schema_parse_round_trip():
+    parsed = schema.Schema.parse(DEFINITION)
+    assert parsed.name == "people"
+    assert parsed.key == ["last_name", "first_name"]
+    assert parsed.getField("alarm").field_type == schema.FieldType.TIME
+    assert schema.Schema.parse(str(parsed)) == parsed
+    assert schema.Schema.fromMeta(parsed.toMeta({"other": 1})) == parsed
+
+@pytest.mark.parametrize("definition", [
+    "people: str name",
+    "people: str name, key (nickname)",
+    "people: string name, key (name)",
+    "people: str key, key (key)",
+    "people: str name, int name, key (name)",
+])
+def test_schema_rejects(definition):
+    with pytest.raises(ValueError):
+        schema.Schema.parse(definition)
+
+def test_codec_round_trip():
+    codec = recordCodec.RecordCodec(schema.Schema.parse(DEFINITION))
+    person = samplePerson()
+    data = codec.encode(person)
+    assert codec.decode(data) == person
+    assert len(data) < len(json.dumps({name: str(value) for name, value in person.items()}))
+
+def test_codec_nulls():
+    codec = recordCodec.RecordCodec(schema.Schema.parse(DEFINITION))
+    record = codec.decode(codec.encode({"last_name": "Doe", "age": -5}))
+    assert record["last_name"] == "Doe" and record["age"] == -5
+    assert all(record[name] is None for name in record if name not in ("last_name", "age"))
+
+def test_codec_single_field():
+    codec = recordCodec.RecordCodec(schema.Schema.parse(DEFINITION))
+    person = samplePerson()
+    person["first_name"] = None
+    data = codec.encode(person)
+    for name, value in person.items():
+        assert codec.decodeField(data, name) == value
+    with pytest.raises(KeyError):
+        codec.decodeField(data, "missing")
+
+def test_codec_key():
+    codec = recordCodec.RecordCodec(schema.Schema.parse(DEFINITION))
+    person = samplePerson()
+    key = codec.encodeKey(person)
+    assert codec.keyCodec.decode(key) == {"last_name": "Stanley", "first_name": "Jim"}
+    assert key == codec.encodeKey({"first_name": "Jim", "last_name": "Stanley", "age": 3})
+    with pytest.raises(ValueError):
+        codec.encodeKey({"last_name": "Stanley"})
+
+def test_codec_aware_timestamp():
+    codec = recordCodec.RecordCodec(schema.Schema.parse("log: timestamp at, key (at)"))
+    aware = datetime.datetime(2026, 1, 1, 12, tzinfo = datetime.timezone(datetime.timedelta(hours = 2)))
+    assert codec.decode(codec.encode({"at": aware}))["at"] == datetime.datetime(2026, 1, 1, 10)
+
+@pytest.mark.parametrize("name, value, error", [
+    ("age", "x", TypeError), ("age", 1.5, TypeError), ("age", True, TypeError), ("age", 2 ** 70, ValueError),
+    ("height", "tall", TypeError), ("active", 1, TypeError), ("last_name", 5, TypeError),
+    ("birth_date", datetime.datetime(2026, 1, 1), TypeError), ("alarm", "06:45", TypeError),
+])
+def test_codec_checks_value_types(name, value, error):
+    codec = recordCodec.RecordCodec(schema.Schema.parse(DEFINITION))
+    person = samplePerson()
+    person[name] = value
+    with pytest.raises(error):
+        codec.encode(person)
+
+def test_codec_widens_ints_for_floats():
+    codec = recordCodec.RecordCodec(schema.Schema.parse(DEFINITION))
+    person = samplePerson()
+    person["height"], person["phase"] = 2, 3
+    record = codec.decode(codec.encode(person))
+    assert (record["height"], record["phase"]) == (2.0, complex(3))
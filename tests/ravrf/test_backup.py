@@ -0,0 +1,88 @@
+from pathlib import Path
+import pytest
+import random
+import sys
+
+srcPath = f"{Path.cwd()}/src/ravrf"
+sys.path.append(srcPath)
+import backup
+import raFile
+
+def churn(rave, live: dict, rounds: int) -> None:
+    for _ in range(rounds):
+        action = random.random()
+        if live and action < 0.3:
+            victim = random.choice(sorted(live))
+            rave.Delete(victim)
+            del live[victim]
+        elif live and action < 0.6:
+            target = random.choice(sorted(live))
+            data = random.randbytes(random.randint(1, 200))
+            del live[target]
+            live[rave.Save(target, data, 20)] = data
+        else:
+            data = random.randbytes(random.randint(1, 200))
+            live[rave.Add(data, 20)] = data
+
+def test_full_and_incremental_restore(tmp_path):
+    random.seed(37)
+    path = tmp_path / "data.ravrf"
+    rave = raFile.raFile.Create(path)
+    live = {}
+    churn(rave, live, 3000)
+    assert rave.EnableChangeLog() == 0
+    with pytest.raises(ValueError):
+        backup.incrementalBackup(rave, tmp_path / "too-early.bak")
+
+    backups = [tmp_path / "full.bak"]
+    assert backup.fullBackup(rave, backups[0]) == 0
+    images = [path.read_bytes()]
+    for index in range(3):
+        churn(rave, live, 20)
+        backups.append(tmp_path / f"inc{index}.bak")
+        assert backup.incrementalBackup(rave, backups[-1]) == index + 1
+        images.append(path.read_bytes())
+    rave.Close()
+
+    assert all(increment.stat().st_size < backups[0].stat().st_size / 4 for increment in backups[1:])
+    for count in range(1, len(backups) + 1):
+        restored = backup.restore(backups[:count], tmp_path / f"restored{count}.ravrf")
+        assert restored.read_bytes() == images[count - 1]
+
+    rave = raFile.raFile(tmp_path / "restored4.ravrf")
+    rave.Open()
+    assert dict(rave.Scan()) == live
+    rave.Close()
+
+def test_change_log_survives_reopen(tmp_path):
+    path = tmp_path / "reopen.ravrf"
+    rave = raFile.raFile.Create(path)
+    rave.EnableChangeLog()
+    backup.fullBackup(rave, tmp_path / "full.bak")
+    rrefs = [rave.Add(b"r" * 100) for _ in range(10)]
+    rave.Close()
+
+    rave = raFile.raFile(path)
+    rave.Open()
+    rave.Save(rrefs[3], b"s" * 50)
+    backup.incrementalBackup(rave, tmp_path / "inc.bak")
+    image = path.read_bytes()
+    rave.Close()
+
+    restored = backup.restore([tmp_path / "full.bak", tmp_path / "inc.bak"], tmp_path / "restored.ravrf")
+    assert restored.read_bytes() == image
+
+def test_restore_rejects_gaps(tmp_path):
+    path = tmp_path / "gap.ravrf"
+    rave = raFile.raFile.Create(path)
+    rave.EnableChangeLog()
+    backup.fullBackup(rave, tmp_path / "full.bak")
+    rave.Add(b"one")
+    backup.incrementalBackup(rave, tmp_path / "inc1.bak")
+    rave.Add(b"two")
+    backup.incrementalBackup(rave, tmp_path / "inc2.bak")
+    rave.Close()
+    with pytest.raises(ValueError):
+        backup.restore([tmp_path / "full.bak", tmp_path / "inc2.bak"], tmp_path / "restored.ravrf")
+    with pytest.raises(ValueError):
+        backup.restore([tmp_path / "inc1.bak"], tmp_path / "restored.ravrf")
@@ -0,0 +1,60 @@
+from pathlib import Path
+import pytest
+import sys
+
+srcPath = f"{Path.cwd()}/src/ravrf"
+sys.path.append(srcPath)
+from blockCache import BlockCache
+from blockDescriptor import HeadBlock
+
+def head(size: int) -> HeadBlock:
+    return HeadBlock.initData(size, size, 0, 0)
+
+def test_cache_rejects_empty_budget():
+    with pytest.raises(ValueError):
+        BlockCache(0)
+
+def test_cache_evicts_least_recently_used():
+    cache = BlockCache(3 * (15 + 10))
+    for rref in (100, 200, 300):
+        cache.put(rref, head(10), b"x" * 10)
+    assert cache.getData(100)[1] == b"x" * 10
+    cache.put(400, head(10), b"y" * 10)
+    assert cache.getHead(200) is None
+    assert [cache.getHead(rref) is not None for rref in (100, 300, 400)] == [True, True, True]
+    assert cache.size == 3 * 25
+    assert cache.getStats()["cacheEvictions"] == 1
+
+def test_cache_skips_oversized_payload():
+    cache = BlockCache(64)
+    cache.put(100, head(100), b"z" * 100)
+    assert cache.getHead(100) is not None
+    assert cache.getData(100) == (None, None)
+    assert cache.size == 15
+
+def test_cache_counts_and_invalidates():
+    cache = BlockCache(1024)
+    cache.put(100, head(4), bytearray(b"data"))
+    assert cache.getData(100)[1] == b"data"
+    cache.invalidate(100)
+    assert cache.getData(100) == (None, None)
+    stats = cache.getStats()
+    assert (stats["cacheHits"], stats["cacheMisses"], stats["cacheBytes"]) == (1, 1, 0)
+
+def test_cache_drops_fill_that_raced_an_invalidate():
+    cache = BlockCache(1024)
+    epoch = cache.epoch
+    cache.invalidate(100)               # a writer rewrote the record while the reader was on disk
+    cache.put(100, head(3), b"old", epoch)
+    assert cache.getHead(100) is None
+    cache.put(100, head(3), b"new", cache.epoch)
+    assert cache.getData(100)[1] == b"new"
+
+def test_cache_hands_out_copies_of_heads():
+    cache = BlockCache(1024)
+    cached = head(4)
+    cache.put(100, cached, b"data")
+    cached.record_size = 99
+    cache.getHead(100).record_size = 77
+    assert cache.getHead(100).record_size == 4
+    assert cache.getData(100)[0].record_size == 4
@@ -119,6 +119,22 @@ def test_data_496byte_decode_end():
     newTail = blockDescriptor.EndBlock.decode(data)
     assert newTail.encode() == data
 
+def test_find_block_start_knows_every_block_type():
+    # A block of each type, then a torn head: the search skips the damage and stops on every type
+    content = bytearray(40)
+    starts = []
+    for blockType in blockDescriptor.BlockType:
+        starts.append(len(content))
+        content += blockDescriptor.HeadBlock(blockType, 4, 4, 0, 0).encode() + b"data"
+        content += blockDescriptor.EndBlock(4, blockType).encode()
+    readAt = lambda offset, length: bytes(content[offset:offset + length])
+    for start in starts:
+        assert blockDescriptor.fencedHead(readAt, start, len(content)) is not None
+        assert blockDescriptor.findBlockStart(readAt, start - 3 if start > 40 else start, len(content)) == start
+    content[starts[2]] = 0
+    assert blockDescriptor.fencedHead(readAt, starts[2], len(content)) is None
+    assert blockDescriptor.findBlockStart(readAt, starts[1] + 1, len(content)) == starts[3]
+
 def main():
     print("Running tests for blockDescriptor")  
     test_getHeadStorageSize()
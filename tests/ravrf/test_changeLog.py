@@ -0,0 +1,43 @@
+from pathlib import Path
+import sys
+
+srcPath = f"{Path.cwd()}/src/ravrf"
+sys.path.append(srcPath)
+from changeLog import ChangeLog
+
+def openLog(tmp_path) -> ChangeLog:
+    path = ChangeLog.pathFor(tmp_path / "log.ravrf")
+    ChangeLog.write(path, 3)
+    return ChangeLog(path)
+
+def test_ranges_merge(tmp_path):
+    changeLog = openLog(tmp_path)
+    for start, end in [(100, 200), (300, 400), (200, 250), (390, 500), (50, 60), (0, 40)]:
+        changeLog.record(start, end)
+    assert changeLog.ranges() == [(0, 40), (50, 60), (100, 250), (300, 500)]
+    changeLog.record(60, 100)
+    assert changeLog.ranges() == [(0, 40), (50, 250), (300, 500)]
+    changeLog.close()
+
+def test_covered_writes_are_not_logged(tmp_path):
+    changeLog = openLog(tmp_path)
+    changeLog.record(0, 1000)
+    size = changeLog.pathFor(tmp_path / "log.ravrf").stat().st_size
+    for start in range(0, 900, 10):
+        changeLog.record(start, start + 15)
+    assert changeLog.pathFor(tmp_path / "log.ravrf").stat().st_size == size
+    changeLog.close()
+
+def test_log_reloads_and_rotates(tmp_path):
+    changeLog = openLog(tmp_path)
+    changeLog.record(10, 20)
+    changeLog.record(40, 50)
+    changeLog.close()
+
+    changeLog = ChangeLog(ChangeLog.pathFor(tmp_path / "log.ravrf"))
+    assert (changeLog.epoch, changeLog.ranges()) == (3, [(10, 20), (40, 50)])
+    assert changeLog.rotate() == 4
+    changeLog.close()
+    changeLog = ChangeLog(ChangeLog.pathFor(tmp_path / "log.ravrf"))
+    assert (changeLog.epoch, changeLog.ranges()) == (4, [])
+    changeLog.close()
@@ -1,4 +1,5 @@
 from pathlib import Path
+import pytest
 import struct
 import sys
 
@@ -34,4 +35,27 @@ def test_config_encode_custom():
     assert data[0:9] == b"/~ravrf~/"
     assert data[9] == 1
     assert struct.unpack(">I", data[10:14])[0] == 123456
-    assert struct.unpack(">I", data[14:18])[0] == 654321
\ No newline at end of file
+    assert struct.unpack(">I", data[14:18])[0] == 654321
+
+def test_config_summary_round_trip():
+    cfg = config.RavrfConfig()
+    cfg.meta_address = 40
+    cfg.summary_address = 1234
+    cfg.summary_generation = 7
+    data = cfg.encode()
+    assert len(data) == 40
+    assert struct.unpack(">II", data[20:28]) == (1234, 7)
+    cfg2 = config.RavrfConfig.decode(data)
+    assert (cfg2.summary_address, cfg2.summary_generation) == (1234, 7)
+    assert cfg2.encode() == data
+
+def test_config_alignment_round_trip():
+    cfg = config.RavrfConfig(alignment=4096)
+    cfg.meta_address = 4096
+    data = cfg.encode()
+    assert len(data) == 40
+    assert data[28] == 12
+    assert config.RavrfConfig.decode(data).alignment == 4096
+    assert config.RavrfConfig.decode(config.RavrfConfig().encode()).alignment == 0
+    with pytest.raises(ValueError):
+        config.RavrfConfig(alignment=3000)
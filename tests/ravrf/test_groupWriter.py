@@ -0,0 +1,126 @@
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+import pytest
+import sys
+import threading
+
+srcPath = f"{Path.cwd()}/src/ravrf"
+sys.path.append(srcPath)
+import raFile
+from groupWriter import GroupWriter
+
+@pytest.fixture
+def rave(tmp_path):
+    ravrFile = raFile.raFile.Create(tmp_path / "group.ravrf")
+    yield ravrFile
+    ravrFile.Close()
+
+def test_producers_get_their_rrefs_and_adds_are_grouped(rave, tmp_path):
+    def produce(producer: int) -> list:
+        futures = [writer.Add(b"%02d-%04d" % (producer, number)) for number in range(500)]
+        return [(b"%02d-%04d" % (producer, number), future.result()) for number, future in enumerate(futures)]
+
+    with GroupWriter(rave, durable = True) as writer:
+        with ThreadPoolExecutor(max_workers = 8) as executor:
+            added = [pair for pairs in executor.map(produce, range(8)) for pair in pairs]
+        stats = writer.GetStats()
+
+    assert stats["operations"] == 4000
+    assert stats["groups"] < 4000
+    assert len({recordRREF for _, recordRREF in added}) == 4000
+    assert all(rave.ReadData(recordRREF) == data for data, recordRREF in added)
+    rave.Close()
+    rave.Open(tmp_path / "group.ravrf")
+    assert rave.RecordCount() == 4000
+
+def test_operations_apply_in_order_and_errors_stay_with_their_future(rave):
+    writer = GroupWriter(rave)
+    first = writer.Add(b"first", 8)
+    saved = writer.Save(first.result(), b"first, saved")
+    gone = writer.Add(b"gone")
+    deleted = writer.Delete(gone.result())
+    bad = writer.Delete(1)
+    meta = writer.PutMeta(b"meta")
+    writer.Flush()
+
+    assert saved.result() == first.result()
+    assert writer.ReadData(first.result()) == b"first, saved"
+    assert deleted.result() is None and meta.result() is None
+    with pytest.raises(ValueError):
+        bad.result()
+    assert rave.GetMeta() == b"meta"
+    assert rave.RecordCount() == 1
+    with pytest.raises(ValueError):
+        writer.Add(b"")
+
+    writer.Close()
+    with pytest.raises(IOError):
+        writer.Add(b"late")
+
+def test_a_bad_add_fails_only_its_own_future(rave, monkeypatch):
+    writer = GroupWriter(rave)
+    with pytest.raises(ValueError):
+        writer.Add(b"bad", "oops")
+    with pytest.raises(ValueError):
+        writer.Add(b"bad", -1)
+
+    # A failure inside the grouped AddMany falls back to one Add per record
+    add = rave.Add
+
+    def failingAddMany(records, padding, blockType):
+        raise IOError("AddMany failed")
+
+    def failingAdd(data, padding, blockType):
+        if data == b"bad":
+            raise IOError("Add failed")
+        return add(data, padding, blockType)
+
+    monkeypatch.setattr(rave, "AddMany", failingAddMany)
+    monkeypatch.setattr(rave, "Add", failingAdd)
+    futures = [writer.Add(data) for data in (b"one", b"two", b"bad", b"three", b"four")]
+    writer.Close()
+    assert [rave.ReadData(futures[index].result()) for index in (0, 1, 3, 4)] == [b"one", b"two", b"three", b"four"]
+    with pytest.raises(IOError):
+        futures[2].result()
+
+def test_a_failed_add_many_gives_its_region_back(rave, tmp_path, monkeypatch):
+    def prepare(target) -> list:
+        target.Add(b"a" * 100)
+        hole = target.Add(b"h" * 2000)
+        target.Add(b"c" * 100)
+        target.Delete(hole)
+        return [b"%03d" % number * 20 for number in range(10)]
+
+    # The same records added one by one, with nothing failing, as the reference layout
+    control = raFile.raFile.Create(tmp_path / "control.ravrf")
+    records = prepare(control)
+    control.PutMeta(b"meta")
+    for data in records:
+        control.Add(data)
+    expected = (control.GetStats()["fileSize"], control.GetFreeExtents())
+    control.Close()
+
+    records = prepare(rave)
+    writevAt = raFile.FileStorage.writevAt
+    putMeta = rave.PutMeta
+    queued = threading.Event()
+
+    def failingWritevAt(storage, offset, buffers):
+        # A single record is at most head, data, padding and end; only the grouped write is longer
+        if len(buffers) > 4:
+            raise IOError("Write failed")
+        writevAt(storage, offset, buffers)
+
+    def blockingPutMeta(data, padding):
+        queued.wait()
+        putMeta(data, padding)
+
+    monkeypatch.setattr(raFile.FileStorage, "writevAt", failingWritevAt)
+    monkeypatch.setattr(rave, "PutMeta", blockingPutMeta)
+    writer = GroupWriter(rave)
+    writer.PutMeta(b"meta")             # holds the writer until every Add is queued behind it
+    futures = [writer.Add(data) for data in records]
+    queued.set()
+    writer.Close()
+    assert [rave.ReadData(future.result()) for future in futures] == records
+    assert (rave.GetStats()["fileSize"], rave.GetFreeExtents()) == expected
@@ -0,0 +1,60 @@
+from pathlib import Path
+import operator
+import random
+import sys
+
+srcPath = f"{Path.cwd()}/src/ravrf"
+sys.path.append(srcPath)
+import parallelScan
+import raFile
+from blockDescriptor import BlockType, HeadBlock, EndBlock, findBlockStart
+
+def createFile(path: Path, records: int) -> dict:
+    random.seed(31)
+    rave = raFile.raFile.Create(path)
+    try:
+        live = {}
+        for index in range(records):
+            data = f"{index % 5}:".encode("utf-8") + random.randbytes(random.randint(1, 400))
+            live[rave.Add(data, random.choice((0, 10)))] = data
+        victims = random.sample(sorted(live), records // 4)
+        rave.DeleteMany(victims)
+        for victim in victims:
+            del live[victim]
+        return live
+    finally:
+        rave.Close()
+
+def fakeBlocks() -> bytes:
+    # Repeated inside a payload these look like a chain of perfectly fenced blocks
+    return HeadBlock(BlockType.DATA_BLOCK, 4, 4, 0, 0).encode() + b"fake" + EndBlock(4, BlockType.DATA_BLOCK).encode()
+
+def test_parallel_scan_matches_sequential(tmp_path):
+    path = tmp_path / "scan.ravrf"
+    live = createFile(path, 2000)
+    matches = parallelScan.parallelScan(path, operator.methodcaller("startswith", b"3:"), len,
+                                        workers = 4, minRangeSize = 4096)
+    assert matches == sorted((rref, len(data)) for rref, data in live.items() if data.startswith(b"3:"))
+
+def test_parallel_scan_survives_fake_fences(tmp_path):
+    path = tmp_path / "fake.ravrf"
+    rave = raFile.raFile.Create(path)
+    try:
+        expected = [(rave.Add(b"x" * 20 + fakeBlocks() * 30 + b"y" * index), 0) for index in range(60)]
+    finally:
+        rave.Close()
+    assert parallelScan.parallelScan(path, projection = operator.itemgetter(slice(0, 0)),
+                                     workers = 3, minRangeSize = 64) == [(rref, b"") for rref, _ in expected]
+
+def test_snap_finds_next_block(tmp_path):
+    path = tmp_path / "snap.ravrf"
+    live = createFile(path, 50)
+    rrefs = sorted(live)
+    storage = raFile.FileStorage(path)
+    try:
+        size = storage.getSize()
+        assert findBlockStart(storage.readAt, rrefs[10] + 1, size) > rrefs[10]
+        assert findBlockStart(storage.readAt, rrefs[10], size) == rrefs[10]
+        assert findBlockStart(storage.readAt, size - 1, size) == size
+    finally:
+        storage.close()
@@ -1,9 +1,680 @@
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 import pytest
+import random
 import sys
 
-srcPath = f"{Path.cwd()}/../../src/ravrf"
+srcPath = f"{Path.cwd()}/src/ravrf"
 sys.path.append(srcPath)
-print(f"Path = {srcPath}")
 import raFile
+from blockDescriptor import BlockType, HeadBlock, EndBlock
+from config import RavrfConfig
+from storage import FileStorage, MemoryStorage, MmapStorage
 
+@pytest.fixture
+def rave(tmp_path):
+    ravrFile = raFile.raFile.Create(tmp_path / "test.ravrf")
+    yield ravrFile
+    ravrFile.Close()
+
+def walkBlocks(path: Path) -> tuple[RavrfConfig, list]:
+    content = path.read_bytes()
+    config = RavrfConfig.decode(content[:RavrfConfig.getStorageSize()])
+    blocks = []
+    location = RavrfConfig.getStorageSize()
+    while location < len(content):
+        head = HeadBlock.decode(content[location:location + HeadBlock.getStorageSize()])
+        endRREF = location + HeadBlock.getStorageSize() + head.record_size
+        end = EndBlock.decode(content[endRREF:endRREF + EndBlock.getStorageSize()])
+        assert (end.block_type, end.record_size) == (head.block_type, head.record_size)
+        blocks.append((location, head))
+        location = endRREF + EndBlock.getStorageSize()
+    return config, blocks
+
+def checkFreeList(path: Path) -> list:
+    # Every AVAILABLE block is on the free list exactly once, links agree and none are adjacent
+    config, blocks = walkBlocks(path)
+    available = {rref: head for rref, head in blocks if head.block_type == BlockType.AVAILABLE}
+    chain = []
+    prevRREF, availableRREF = 0, config.first_available_address
+    while availableRREF > 0:
+        assert availableRREF in available and availableRREF not in chain
+        assert available[availableRREF].prev_available == prevRREF
+        chain.append(availableRREF)
+        prevRREF, availableRREF = availableRREF, available[availableRREF].next_available
+    assert sorted(chain) == sorted(available)
+    for (_, head), (_, nextHead) in zip(blocks, blocks[1:]):
+        assert not (head.block_type == nextHead.block_type == BlockType.AVAILABLE)
+    return chain
+
+def test_add_accepts_buffers(rave):
+    first = rave.Add(bytearray(b"from a bytearray"))
+    second = rave.Add(memoryview(b"--from a memoryview--")[2:-2])
+    assert rave.ReadData(first) == b"from a bytearray"
+    assert rave.ReadData(second) == b"from a memoryview"
+
+def test_add_padding_is_zero_filled(rave):
+    rref = rave.Add(b"padded", 100_000)
+    assert rave.ReadData(rref) == b"padded"
+    assert rave.Add(b"next") == rref + 15 + 6 + 100_000 + 5
+
+def test_save_in_place_from_memoryview(rave):
+    rref = rave.Add(b"original record", 10)
+    buffer = bytearray(b"updated record!!")
+    assert rave.Save(rref, memoryview(buffer)) == rref
+    assert rave.ReadData(rref) == b"updated record!!"
+
+def test_save_relocates_when_too_large(rave):
+    rref = rave.Add(b"short")
+    newRREF = rave.Save(rref, "a much longer record than before")
+    assert newRREF != rref
+    assert rave.ReadData(newRREF) == b"a much longer record than before"
+
+def test_concurrent_reads(rave):
+    records = {rave.Add(f"record {index}".encode("utf-8") * (index + 1)): index for index in range(200)}
+    with ThreadPoolExecutor(max_workers = 8) as executor:
+        results = list(executor.map(rave.ReadData, records))
+    for rref, data in zip(records, results):
+        assert data == f"record {records[rref]}".encode("utf-8") * (records[rref] + 1)
+
+def test_read_many_keeps_caller_order(rave):
+    records = {rave.Add(f"record {index}".encode("utf-8") * (index % 7 + 1)): index for index in range(50)}
+    rrefs = list(records)[::-1] + list(records)[:5]
+    expected = [rave.ReadData(rref) for rref in rrefs]
+    assert rave.ReadMany(rrefs) == expected
+    assert rave.ReadMany(rrefs, gap = 0) == expected
+
+def test_stream_many_coalesces_reads(rave, monkeypatch):
+    rrefs = [rave.Add(bytes([index]) * 100) for index in range(100)]
+    reads = []
+    originalReadAt = raFile.FileStorage.readAt
+    monkeypatch.setattr(raFile.FileStorage, "readAt",
+                        lambda self, offset, length: reads.append(offset) or originalReadAt(self, offset, length))
+    gap = 4096
+    streamed = list(rave.StreamMany(rrefs[::-2], gap))
+    assert [rref for rref, _ in streamed] == sorted(rrefs[::-2])
+    assert all(data == bytes([rrefs.index(rref)]) * 100 for rref, data in streamed)
+
+    # Every other 120 byte block, from rrefs[1] to the end of the file. A read runs gap bytes past
+    # what the block in hand needs, so the next read starts where the last one ended:
+    #   1. the first head and gap bytes
+    #   2. from there up to the data of the first block it cut short (rrefs[35]), and gap bytes
+    #   3. up to the head of the first block wholly past that (rrefs[71]), and gap bytes, to the end
+    headSize = HeadBlock.getStorageSize()
+    second = rrefs[1] + headSize + gap
+    third = rrefs[35] + headSize + 100 + gap
+    assert second < rrefs[35] + headSize + 100 and rrefs[35] + headSize <= second
+    assert rrefs[69] + headSize + 100 <= third < rrefs[71]
+    assert third + headSize + gap >= rrefs[99] + headSize + 100
+    assert reads == [rrefs[1], second, third]
+
+def test_stream_many_reads_no_further_than_gap(rave, monkeypatch):
+    rrefs = [rave.Add(bytes([index]) * 100, 400) for index in range(20)]
+    lengths = []
+    originalReadAt = raFile.FileStorage.readAt
+    monkeypatch.setattr(raFile.FileStorage, "readAt",
+                        lambda self, offset, length: lengths.append(length) or originalReadAt(self, offset, length))
+    assert rave.ReadMany(rrefs[::3], gap = 0) == [bytes([index]) * 100 for index in range(0, 20, 3)]
+    assert sum(lengths) == 7 * (HeadBlock.getStorageSize() + 100)
+    lengths.clear()
+    rave.ReadMany(rrefs[::3], gap = 16)
+    assert max(lengths) <= 100 + 16
+
+def test_read_many_rejects_other_blocks(rave):
+    rave.PutMeta(b"meta data")
+    rref = rave.Add(b"data")
+    with pytest.raises(ValueError):
+        rave.ReadMany([rref, 40])
+
+def test_delete_many_merges_runs(rave, tmp_path):
+    rrefs = [rave.Add(f"record {index}".encode("utf-8"), index % 3) for index in range(20)]
+    rave.Delete(rrefs[5])
+    rave.DeleteMany([rrefs[4], rrefs[6], rrefs[7], rrefs[12], rrefs[14], rrefs[13], rrefs[19]])
+    chain = checkFreeList(tmp_path / "test.ravrf")
+    assert sorted(chain) == [rrefs[4], rrefs[12], rrefs[19]]
+    survivors = [rref for index, rref in enumerate(rrefs) if index not in (4, 5, 6, 7, 12, 13, 14, 19)]
+    assert rave.ReadMany(survivors) == [rave.ReadData(rref) for rref in survivors]
+
+def test_delete_many_writes_config_once(rave, monkeypatch):
+    rrefs = [rave.Add(b"x" * 50) for _ in range(30)]
+    writes = []
+    originalWritevAt = raFile.FileStorage.writevAt
+    monkeypatch.setattr(raFile.FileStorage, "writevAt",
+                        lambda self, offset, buffers: writes.append(offset) or originalWritevAt(self, offset, buffers))
+    rave.DeleteMany(rrefs[::2] + rrefs[10:20])
+    assert writes.count(0) == 1
+    assert len(writes) == 1 + 2 * 10
+
+def test_delete_meta_clears_config(rave):
+    rave.PutMeta(b"schema")
+    metaRREF = rave.Add(b"data") - 15 - 6 - 5
+    rave.Delete(metaRREF)
+    assert rave.GetMeta() == b""
+
+def test_random_add_delete_keeps_free_list(rave, tmp_path):
+    random.seed(26)
+    live = {}
+    for round in range(40):
+        for _ in range(random.randint(1, 10)):
+            data = bytes([round]) * random.randint(1, 300)
+            live[rave.Add(data, random.choice((0, 0, 20)))] = data
+        victims = random.sample(sorted(live), random.randint(0, len(live) // 2))
+        if random.random() < 0.5:
+            rave.DeleteMany(victims)
+        else:
+            for victim in victims:
+                rave.Delete(victim)
+        for victim in victims:
+            del live[victim]
+        checkFreeList(tmp_path / "test.ravrf")
+    assert rave.ReadMany(list(live)) == list(live.values())
+
+def storedBytes(storage, path: Path) -> bytes:
+    store = storage(path)
+    try:
+        return store.readAt(0, store.getSize())
+    finally:
+        store.close()
+
+def test_backends_store_identical_files(tmp_path):
+    images = []
+    for storage in (FileStorage, MmapStorage, MemoryStorage):
+        random.seed(41)
+        path = tmp_path / f"{storage.__name__}.ravrf"
+        rave = raFile.raFile.Create(path, storage = storage)
+        live = {}
+        for round in range(30):
+            for _ in range(random.randint(1, 8)):
+                live[rave.Add(bytes([round]) * random.randint(1, 300), random.choice((0, 20)))] = round
+            victims = random.sample(sorted(live), random.randint(0, len(live) // 2))
+            rave.DeleteMany(victims)
+            for victim in victims:
+                del live[victim]
+        rave.PutMeta(b"meta")
+        rave.Close()
+
+        rave.Open()
+        assert rave.RecordCount() == len(live)
+        assert sorted(rave.Scan()) == sorted((rref, bytes(rave.ReadData(rref))) for rref in live)
+        rave.Close()
+        images.append(storedBytes(storage, path))
+        assert path.exists() == storage.PERSISTENT
+    MemoryStorage.remove(tmp_path / "MemoryStorage.ravrf")
+    assert images[0] == images[1] == images[2]
+
+def test_memory_storage_has_no_change_log(tmp_path):
+    rave = raFile.raFile.Create(tmp_path / "memory.ravrf", storage = MemoryStorage)
+    try:
+        with pytest.raises(IOError):
+            rave.EnableChangeLog()
+    finally:
+        rave.Close()
+        MemoryStorage.remove(tmp_path / "memory.ravrf")
+
+@pytest.mark.parametrize("alignment", [64, 512, 4096])
+def test_aligned_blocks_stay_on_boundaries(tmp_path, alignment):
+    path = tmp_path / "aligned.ravrf"
+    rave = raFile.raFile.Create(path, alignment = alignment)
+    random.seed(alignment)
+    live = {}
+    for round in range(30):
+        for _ in range(random.randint(1, 8)):
+            data = bytes([round]) * random.randint(1, 3000)
+            live[rave.Add(data, random.choice((0, 20)))] = data
+        for victim in random.sample(sorted(live), random.randint(0, len(live) // 2)):
+            rave.Delete(victim)
+            del live[victim]
+        rref = random.choice(sorted(live))
+        data = live.pop(rref) * 2
+        live[rave.Save(rref, data)] = data
+        rave.PutMeta(b"m" * random.randint(1, 900))
+    rave.Close()
+
+    config, blocks = walkBlocks(path)
+    assert config.alignment == alignment
+    assert blocks[0] == (40, blocks[0][1]) and blocks[0][1].block_type == BlockType.PAD_BLOCK
+    assert blocks[1][0] == alignment
+    for rref, head in blocks[1:]:
+        assert rref % alignment == 0
+        assert (head.record_size + 20) % alignment == 0
+    assert path.stat().st_size % alignment == 0
+    checkFreeList(path)
+
+    rave.Open()
+    assert rave.ReadMany(list(live)) == list(live.values())
+    assert list(rave.Scan(direct = True)) == list(rave.Scan())
+    assert rave.RecordCount() == len(live)
+    rave.Close()
+
+def test_damaged_config_keeps_alignment(tmp_path):
+    path = tmp_path / "aligned.ravrf"
+    rave = raFile.raFile.Create(path, alignment = 512)
+    rrefs = [rave.Add(b"a" * 100) for _ in range(10)]
+    rave.Close()
+    content = bytearray(path.read_bytes())
+    content[17] ^= 0xFF
+    path.write_bytes(content)
+
+    rave.Open()
+    assert rave.RecordCount() == 10
+    assert rave.Add(b"b" * 100) % 512 == 0
+    rave.Close()
+    assert walkBlocks(path)[0].alignment == 512
+    with pytest.raises(ValueError):
+        raFile.raFile.Create(tmp_path / "bad.ravrf", alignment = 32)
+
+def test_stream_large_record(rave, tmp_path):
+    random.seed(29)
+    chunk = random.randbytes(65536)
+    before = rave.Add(b"before")
+    with rave.OpenWriter(100_000) as writer:
+        for index in range(40):
+            writer.write(chunk[index:] + chunk[:index])
+    after = rave.Add(b"after")
+    checkFreeList(tmp_path / "test.ravrf")
+
+    with rave.OpenReader(writer.rref) as reader:
+        assert reader.size == 40 * 65536
+        for index in range(40):
+            assert reader.read(65536) == chunk[index:] + chunk[:index]
+        assert reader.read(10) == b""
+        reader.seek(-3, 2)
+        assert reader.read() == chunk[36:39]
+    assert rave.ReadMany([before, after]) == [b"before", b"after"]
+
+def test_stream_writer_memory_is_bounded(rave):
+    import tracemalloc
+    chunk = bytes(range(256)) * 256
+    tracemalloc.start()
+    with rave.OpenWriter(1024) as writer:
+        for _ in range(128):
+            writer.write(chunk)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    assert peak < 4 * 1024 * 1024
+    assert len(rave.ReadData(writer.rref)) == 128 * len(chunk)
+
+def test_stream_writer_abort_frees_block(rave, tmp_path):
+    with pytest.raises(RuntimeError):
+        with rave.OpenWriter(500) as writer:
+            writer.write(b"partial")
+            raise RuntimeError("producer failed")
+    assert writer.rref == 0
+    assert checkFreeList(tmp_path / "test.ravrf") == [40]
+
+def test_open_writer_is_not_a_record_until_closed(tmp_path):
+    path = tmp_path / "writer.ravrf"
+    rave = raFile.raFile.Create(path)
+    kept = rave.Add(b"kept")
+    writer = rave.OpenWriter(200)
+    writer.write(b"streamed")
+    assert list(rave.Scan()) == [(kept, b"kept")]
+    assert rave.RecordCount() == 1
+    assert rave.Recover()["records"] == 1
+    writer.close()
+    assert list(rave.Scan()) == [(kept, b"kept"), (writer.rref, b"streamed")]
+    assert rave.RecordCount() == 2
+
+    # A writer still open at Close loses its block, and so does one a crash leaves behind
+    abandoned = rave.OpenWriter(300)
+    abandoned.write(b"never closed")
+    rave.Close()
+    with pytest.raises(ValueError):
+        abandoned.close()
+    rave.Open(path)
+    assert rave.RecordCount() == 2
+    assert all(head.block_type != BlockType.RESERVED_BLOCK for _, head in walkBlocks(path)[1])
+    crashed = rave.OpenWriter(400)
+    crashed.write(b"crashed")
+    rave._raFile__file.close()
+    rave._raFile__file = None
+    with pytest.raises(IOError):
+        crashed.close()
+
+    rave = raFile.raFile(path)
+    rave.Open()
+    assert [data for _, data in rave.Scan()] == [b"kept", b"streamed"]
+    assert rave.RecordCount() == 2
+    checkFreeList(path)
+    rave.Close()
+
+def test_scan_skips_available_and_meta(rave):
+    rrefs = [rave.Add(bytes([index]) * (index * 1000 + 1)) for index in range(100)]
+    rave.PutMeta(b"meta")
+    rave.DeleteMany(rrefs[10:60])
+    assert list(rave.Scan()) == [(rref, rave.ReadData(rref)) for rref in rrefs[:10] + rrefs[60:]]
+
+def test_summary_reopens_without_walk(tmp_path, monkeypatch):
+    path = tmp_path / "summary.ravrf"
+    rave = raFile.raFile.Create(path)
+    rrefs = [rave.Add(bytes([index]) * (index + 1), index % 4) for index in range(200)]
+    rave.DeleteMany(rrefs[3:150:4])
+    count = rave.RecordCount()
+    rave.Close()
+
+    config, blocks = walkBlocks(path)
+    summaries = [rref for rref, head in blocks if head.block_type == BlockType.SUMMARY_BLOCK]
+    assert summaries == [config.summary_address]
+    checkFreeList(path)
+
+    reads = []
+    originalReadAt = raFile.FileStorage.readAt
+    monkeypatch.setattr(raFile.FileStorage, "readAt",
+                        lambda self, offset, length: reads.append(offset) or originalReadAt(self, offset, length))
+    rave = raFile.raFile(path)
+    rave.Open()
+    assert reads == [0, config.summary_address, config.first_available_address]
+    assert rave.RecordCount() == count == 200 - 37
+    assert rave.GetFreeExtents() == [(rref, head.record_size) for rref, head in blocks
+                                     if head.block_type == BlockType.AVAILABLE]
+    rave.Close()
+
+def test_summary_rebuilt_after_unclean_close(tmp_path):
+    path = tmp_path / "crash.ravrf"
+    rave = raFile.raFile.Create(path)
+    rrefs = [rave.Add(b"x" * 100) for _ in range(50)]
+    rave.Close()
+
+    rave = raFile.raFile(path)
+    rave.Open()
+    rave.DeleteMany(rrefs[10:20])
+    rave.Add(b"y" * 30)
+    # Simulate a crash: the file is dropped without Close writing the summary
+    rave._raFile__file.close()
+    rave._raFile__file = None
+
+    rave = raFile.raFile(path)
+    rave.Open()
+    _, blocks = walkBlocks(path)
+    assert rave.RecordCount() == 41
+    assert rave.GetFreeExtents() == [(rref, head.record_size) for rref, head in blocks
+                                     if head.block_type == BlockType.AVAILABLE]
+    rave.Close()
+
+def test_summary_tracks_allocation(rave, tmp_path):
+    random.seed(34)
+    live = []
+    for _ in range(300):
+        if live and random.random() < 0.4:
+            rave.Delete(live.pop(random.randrange(len(live))))
+        else:
+            live.append(rave.Add(b"z" * random.randint(1, 200)))
+    _, blocks = walkBlocks(tmp_path / "test.ravrf")
+    assert rave.RecordCount() == len(live)
+    assert rave.GetFreeExtents() == [(rref, head.record_size) for rref, head in blocks
+                                     if head.block_type == BlockType.AVAILABLE]
+
+def test_cache_serves_reads_and_stays_coherent(tmp_path):
+    random.seed(35)
+    path = tmp_path / "cached.ravrf"
+    rave = raFile.raFile.Create(path, cacheSize = 16 * 1024)
+    live = {}
+    for _ in range(400):
+        action = random.random()
+        if live and action < 0.3:
+            victim = random.choice(sorted(live))
+            rave.Delete(victim)
+            del live[victim]
+        elif live and action < 0.5:
+            target = random.choice(sorted(live))
+            data = random.randbytes(random.randint(1, 300))
+            del live[target]
+            live[rave.Save(target, data, 10)] = data
+        else:
+            data = random.randbytes(random.randint(1, 300))
+            live[rave.Add(data)] = data
+        if live:
+            hot = random.choice(sorted(live))
+            assert rave.ReadData(hot) == live[hot]
+    checkFreeList(path)
+    assert all(rave.ReadData(rref) == data for rref, data in live.items())
+
+    stats = rave.GetStats()
+    assert stats["cacheHits"] > 0 and stats["cacheMisses"] > 0
+    assert stats["cacheBytes"] <= 16 * 1024
+    rave.Close()
+
+def test_no_cache_reports_zero_stats(rave):
+    rref = rave.Add(b"plain")
+    rave.ReadData(rref)
+    assert rave.GetStats()["cacheHits"] == 0
+
+def test_snapshot_keeps_old_view(rave, tmp_path):
+    rrefs = [rave.Add(f"record {index}".encode("utf-8"), 8) for index in range(30)]
+    rave.PutMeta(b"old meta")
+    expected = [(rref, f"record {index}".encode("utf-8")) for index, rref in enumerate(rrefs)]
+
+    with rave.Snapshot() as snapshot:
+        rave.DeleteMany(rrefs[5:10])
+        moved = rave.Save(rrefs[12], b"changed")
+        added = rave.Add(b"new record")
+        rave.PutMeta(b"new meta")
+        assert moved != rrefs[12]
+        assert rave.RecordCount() == 26
+        with pytest.raises(ValueError):
+            rave.ReadData(rrefs[5])
+        assert rrefs[5] not in dict(rave.Scan())
+
+        assert list(snapshot.Scan()) == expected
+        assert snapshot.ReadData(rrefs[12]) == b"record 12"
+        assert snapshot.GetMeta() == b"old meta"
+        with pytest.raises(ValueError):
+            snapshot.ReadData(added)
+        assert checkFreeList(tmp_path / "test.ravrf") == []
+
+    with pytest.raises(ValueError):
+        snapshot.ReadData(rrefs[0])
+    chain = checkFreeList(tmp_path / "test.ravrf")
+    assert rrefs[5] in chain and rrefs[12] in chain
+    assert rave.GetMeta() == b"new meta"
+    live = dict(rave.Scan())
+    assert live[moved] == b"changed" and live[added] == b"new record" and len(live) == 26
+
+def test_snapshots_release_in_any_order(rave, tmp_path):
+    rrefs = [rave.Add(b"a" * 40) for _ in range(10)]
+    first = rave.Snapshot()
+    rave.Delete(rrefs[0])
+    second = rave.Snapshot()
+    rave.Delete(rrefs[1])
+    assert [rref for rref, _ in first.Scan()] == rrefs
+    assert [rref for rref, _ in second.Scan()] == rrefs[1:]
+    second.Release()
+    assert checkFreeList(tmp_path / "test.ravrf") == []
+    first.Release()
+    assert checkFreeList(tmp_path / "test.ravrf") == [rrefs[0]]
+
+def test_snapshot_scan_runs_beside_writer(tmp_path):
+    import threading
+    random.seed(36)
+    path = tmp_path / "busy.ravrf"
+    rave = raFile.raFile.Create(path, cacheSize = 64 * 1024)
+    live = {}
+    for _ in range(300):
+        data = random.randbytes(random.randint(1, 500))
+        live[rave.Add(data)] = data
+    victims = random.sample(sorted(live), 100)
+    rave.DeleteMany(victims)
+    for victim in victims:
+        del live[victim]
+    expected = sorted(live.items())
+
+    snapshot = rave.Snapshot()
+    stop = threading.Event()
+
+    def writer():
+        while not stop.is_set():
+            if live and random.random() < 0.4:
+                victim = random.choice(sorted(live))
+                del live[victim]
+                rave.Delete(victim)
+            elif live and random.random() < 0.5:
+                target = random.choice(sorted(live))
+                data = random.randbytes(random.randint(1, 500))
+                del live[target]
+                live[rave.Save(target, data)] = data
+            else:
+                data = random.randbytes(random.randint(1, 2000))
+                live[rave.Add(data)] = data
+
+    thread = threading.Thread(target = writer)
+    thread.start()
+    try:
+        for _ in range(3):
+            assert list(snapshot.Scan()) == expected
+    finally:
+        stop.set()
+        thread.join()
+    snapshot.Release()
+    checkFreeList(path)
+    assert dict(rave.Scan()) == live
+    rave.Close()
+
+def growRecords(rave, rounds: int) -> list:
+    random.seed(38)
+    rrefs = [rave.Add(b"v" * 100) for _ in range(200)]
+    sizes = [100] * len(rrefs)
+    for _ in range(rounds):
+        index = random.randrange(len(rrefs))
+        sizes[index] += random.randint(1, 24)
+        rrefs[index] = rave.Save(rrefs[index], b"v" * sizes[index])
+    return rrefs
+
+def test_adaptive_padding_cuts_relocations(tmp_path):
+    fixed = raFile.raFile.Create(tmp_path / "fixed.ravrf")
+    growRecords(fixed, 2000)
+    adaptive = raFile.raFile.Create(tmp_path / "adaptive.ravrf", adaptivePadding = True)
+    rrefs = growRecords(adaptive, 2000)
+
+    fixedStats, adaptiveStats = fixed.GetStats(), adaptive.GetStats()
+    assert fixedStats["relocations"] + fixedStats["savesInPlace"] == 2000
+    assert adaptiveStats["relocations"] < fixedStats["relocations"] / 2
+    assert adaptiveStats["learnedPadding"] == 32
+    assert sum(adaptiveStats["growthHistogram"]) == 2000
+    assert sorted(len(data) for data in adaptive.ReadMany(rrefs)) == sorted(len(data) for _, data in fixed.Scan())
+    fixed.Close()
+    adaptive.Close()
+
+def test_growth_histogram_survives_reopen(tmp_path):
+    path = tmp_path / "growth.ravrf"
+    rave = raFile.raFile.Create(path, adaptivePadding = True)
+    growRecords(rave, 100)
+    histogram = rave.GetStats()["growthHistogram"]
+    rave.Close()
+
+    rave = raFile.raFile(path, adaptivePadding = True)
+    rave.Open()
+    assert rave.GetStats()["growthHistogram"] == histogram
+    assert len(rave.ReadData(rave.Add(b"new"))) == 3
+    assert rave.GetStats()["learnedPadding"] == 32
+    rave.Close()
+
+def crashAfterWrites(rave, monkeypatch, writes: int, operation) -> None:
+    # Runs operation but lets only the first few writes reach the file, then drops the file unclosed
+    calls = []
+    originalWritevAt = raFile.FileStorage.writevAt
+    def writevAt(self, offset, buffers):
+        if len(calls) >= writes:
+            raise OSError("simulated crash")
+        calls.append(offset)
+        originalWritevAt(self, offset, buffers)
+    monkeypatch.setattr(raFile.FileStorage, "writevAt", writevAt)
+    try:
+        operation()
+    except OSError:
+        pass
+    monkeypatch.undo()
+    rave._raFile__file.close()
+    rave._raFile__file = None
+
+@pytest.mark.parametrize("writes", range(6))
+def test_recover_after_crash(tmp_path, monkeypatch, writes):
+    path = tmp_path / "crash.ravrf"
+    rave = raFile.raFile.Create(path)
+    rave.PutMeta(b"meta")
+    rrefs = [rave.Add(bytes([index]) * 50, 10) for index in range(40)]
+    rave.DeleteMany(rrefs[10:20] + rrefs[30:33])
+    survivors = rrefs[:10] + rrefs[20:25] + rrefs[27:30] + rrefs[33:39]
+    rave.Close()
+
+    rave = raFile.raFile(path)
+    rave.Open()
+    crashAfterWrites(rave, monkeypatch, writes,
+                     lambda: (rave.Add(b"n" * 100), rave.DeleteMany([rrefs[25], rrefs[26], rrefs[39]])))
+
+    rave = raFile.raFile(path)
+    rave.Open()
+    checkFreeList(path)
+    assert rave.ReadMany(survivors) == [bytes([rrefs.index(rref)]) * 50 for rref in survivors]
+    assert rave.GetMeta() == b"meta"
+    assert rave.RecordCount() == len(list(rave.Scan()))
+    assert rave.GetFreeExtents() == [(rref, head.record_size) for rref, head in walkBlocks(path)[1]
+                                     if head.block_type == BlockType.AVAILABLE]
+    rave.Add(b"after recovery")
+    rave.Close()
+    checkFreeList(path)
+
+def test_recover_rebuilds_damaged_config(tmp_path):
+    path = tmp_path / "config.ravrf"
+    rave = raFile.raFile.Create(path)
+    rave.PutMeta(b"schema")
+    rrefs = [rave.Add(b"c" * 30) for _ in range(20)]
+    rave.DeleteMany(rrefs[5:8])
+    rave.Close()
+    content = bytearray(path.read_bytes())
+    content[17] ^= 0xFF                 # first_available_address no longer matches the checksum
+    path.write_bytes(content)
+
+    rave = raFile.raFile(path)
+    rave.Open()
+    assert rave.GetMeta() == b"schema"
+    assert rave.RecordCount() == 17
+    assert checkFreeList(path)[0] == rrefs[5]
+    rave.Close()
+
+def test_recover_cuts_partial_tail_and_reports(rave, tmp_path):
+    path = tmp_path / "test.ravrf"
+    rrefs = [rave.Add(b"t" * 40) for _ in range(5)]
+    report = rave.Recover()
+    assert (report["relinked"], report["damaged"], report["records"]) == (False, [], 5)
+
+    rave.Close()
+    size = path.stat().st_size
+    with open(path, "ab") as file:
+        file.write(b"D\x00\x00")
+    rave = raFile.raFile(path)
+    rave.Open()
+    assert path.stat().st_size == size
+    assert rave.ReadMany(rrefs) == [b"t" * 40] * 5
+    rave.Close()
+
+def test_recover_frees_torn_block(rave, tmp_path):
+    path = tmp_path / "test.ravrf"
+    rrefs = [rave.Add(b"u" * 40) for _ in range(6)]
+    with open(path, "r+b") as file:
+        file.seek(rrefs[2] + 15 + 40)
+        file.write(b"\xff" * 5)         # the end fence of the third record is gone
+    report = rave.Recover()
+    assert report["damaged"] == [(rrefs[2], rrefs[3])]
+    assert checkFreeList(path) == [rrefs[2]]
+    assert rave.RecordCount() == 5
+
+def test_add_many_writes_one_contiguous_region(rave, tmp_path):
+    first = rave.Add(b"first", 0)
+    records = [bytes([65 + number]) * (number + 1) for number in range(20)]
+    recordRREFs = rave.AddMany(records, [number % 3 for number in range(20)])
+    assert recordRREFs == sorted(recordRREFs) and recordRREFs[0] > first
+    assert [rave.ReadData(recordRREF) for recordRREF in recordRREFs] == records
+    assert rave.RecordCount() == 21
+    assert rave.AddMany([]) == []
+    with pytest.raises(ValueError):
+        rave.AddMany([b"a", b""])
+    with pytest.raises(ValueError):
+        rave.AddMany([b"a", b"b"], [1])
+
+    rave.Close()
+    rave.Open(tmp_path / "test.ravrf")
+    _, blocks = walkBlocks(tmp_path / "test.ravrf")
+    locations = [location for location, _ in blocks]
+    start = locations.index(recordRREFs[0])
+    assert locations[start:start + 20] == recordRREFs
+    assert [data for _, data in rave.Scan()] == [b"first"] + records
@@ -0,0 +1,89 @@
+from pathlib import Path
+import operator
+import pytest
+import sys
+
+srcPath = f"{Path.cwd()}/src/ravrf"
+sys.path.append(srcPath)
+import shardedFile
+from shardedFile import ShardedRaFile, ShardRREF
+
+def test_handle_encode_decode():
+    handle = ShardRREF(3, 123_456)
+    assert ShardRREF.decode(handle.encode()) == handle
+    assert ShardRREF.decode(ShardRREF(0, 0xFFFFFFFF).encode()) == (0, 0xFFFFFFFF)
+
+def test_hash_sharding_round_trip(tmp_path):
+    sharded = ShardedRaFile.Create(tmp_path / "people", shardCount = 4)
+    try:
+        handles = {sharded.Add(f"key{index}", f"record {index}".encode("utf-8")): index for index in range(200)}
+        assert {handle.shard for handle in handles} == {0, 1, 2, 3}
+        assert all(handle.shard == sharded.ShardFor(f"key{index}") for handle, index in handles.items())
+    finally:
+        sharded.Close()
+
+    reopened = ShardedRaFile(tmp_path / "people")
+    reopened.Open()
+    try:
+        expected = [f"record {index}".encode("utf-8") for index in handles.values()]
+        assert reopened.ReadMany(list(handles)) == expected
+        reopened.DeleteMany(list(handles)[:100])
+        assert sorted(data for _, data in reopened.Scan()) == sorted(expected[100:])
+    finally:
+        reopened.Close()
+
+def test_range_sharding(tmp_path):
+    sharded = ShardedRaFile.Create(tmp_path / "ranges", partition = ShardedRaFile.RANGE, boundaries = ["g", "p"])
+    try:
+        assert [sharded.Add(key, key.encode("utf-8")).shard for key in ("apple", "grape", "zebra", "g")] == [0, 1, 2, 1]
+        with pytest.raises(FileExistsError):
+            ShardedRaFile.Create(tmp_path / "ranges")
+    finally:
+        sharded.Close()
+
+def test_scan_shards_in_processes(tmp_path):
+    sharded = ShardedRaFile.Create(tmp_path / "parallel", shardCount = 3)
+    try:
+        for index in range(90):
+            sharded.Add(index, (b"even " if index % 2 == 0 else b"odd ") + str(index).encode("utf-8"))
+        matches = sharded.ScanShards(operator.methodcaller("startswith", b"even"), processes = 2)
+        assert len(matches) == 45
+        assert all(sharded.ReadData(handle) == data for handle, data in matches)
+        assert sharded.MapShards(shardedFile.scanShard, bool) == \
+            [[(handle.rref, data) for handle, data in sharded.Scan() if handle.shard == shard] for shard in range(3)]
+    finally:
+        sharded.Close()
+
+def test_scan_shards_leaves_the_shards_unchanged(tmp_path):
+    sharded = ShardedRaFile.Create(tmp_path / "unchanged", shardCount = 2)
+    try:
+        handles = [sharded.Add(index, b"record %d" % index) for index in range(40)]
+        sharded.DeleteMany(handles[::3])
+        paths = [sharded.GetShardPath(shard) for shard in range(2)]
+        before = [path.read_bytes() for path in paths]
+        assert len(sharded.ScanShards(bool, processes = 2)) == 26
+        assert [path.read_bytes() for path in paths] == before
+    finally:
+        sharded.Close()
+
+def test_compact_shards_packs_records_and_maps_handles(tmp_path):
+    sharded = ShardedRaFile.Create(tmp_path / "compact", shardCount = 3)
+    try:
+        handles = {sharded.Add(index, b"record %d" % index + b"." * (index % 50), 64): index for index in range(300)}
+        deleted = [handle for handle, index in handles.items() if index % 3 != 0]
+        sharded.DeleteMany(deleted)
+        for handle in deleted:
+            del handles[handle]
+        sizes = [sharded.GetShardPath(shard).stat().st_size for shard in range(3)]
+
+        moved = sharded.CompactShards(processes = 2)
+        assert moved
+        for handle, index in handles.items():
+            assert sharded.ReadData(moved.get(handle, handle)) == b"record %d" % index + b"." * (index % 50)
+        assert sorted(data for _, data in sharded.Scan()) == \
+            sorted(b"record %d" % index + b"." * (index % 50) for index in handles.values())
+        assert all(sharded.GetShardPath(shard).stat().st_size < sizes[shard] for shard in range(3))
+        assert sharded.Add(1000, b"after")
+    finally:
+        sharded.Close()
+    assert not list((tmp_path / "compact").glob("*.compact.ravrf"))
@@ -0,0 +1,140 @@
+from pathlib import Path
+import pytest
+import sys
+import threading
+
+srcPath = f"{Path.cwd()}/src/ravrf"
+sys.path.append(srcPath)
+import storage
+
+def test_writev_joins_buffers(tmp_path):
+    file = storage.FileStorage(tmp_path / "data.bin", create = True)
+    try:
+        file.writevAt(3, [b"abc", bytearray(b"def"), memoryview(b"xghix")[1:-1]])
+        assert file.getSize() == 12
+        assert file.readAt(0, 12) == b"\x00\x00\x00abcdefghi"
+    finally:
+        file.close()
+
+def test_writev_many_zero_views(tmp_path):
+    file = storage.FileStorage(tmp_path / "data.bin", create = True)
+    try:
+        zeros = storage.FileStorage.zeros(70_000_000)
+        assert len(zeros) > 1024
+        file.writevAt(0, [b"<"] + zeros + [b">"])
+        assert file.getSize() == 70_000_002
+        assert file.readAt(70_000_000, 2) == b"\x00>"
+    finally:
+        file.close()
+
+def test_read_past_end_is_short(tmp_path):
+    file = storage.FileStorage(tmp_path / "data.bin", create = True)
+    try:
+        file.writeAt(0, b"12345")
+        assert file.readAt(3, 10) == b"45"
+        assert file.readAt(10, 10) == b""
+    finally:
+        file.close()
+
+def test_create_existing_fails(tmp_path):
+    storage.FileStorage(tmp_path / "data.bin", create = True).close()
+    with pytest.raises(FileExistsError):
+        storage.FileStorage(tmp_path / "data.bin", create = True)
+
+@pytest.fixture(params = [storage.FileStorage, storage.MmapStorage, storage.MemoryStorage])
+def backend(request, tmp_path):
+    path = tmp_path / "data.bin"
+    opened = request.param(path, create = True)
+    yield opened
+    opened.close()
+    storage.MemoryStorage.remove(path)
+
+def test_backends_agree(backend):
+    assert backend.getSize() == 0
+    assert backend.readAt(0, 10) == b""
+    backend.writevAt(3, [b"abc", bytearray(b"def"), memoryview(b"xghix")[1:-1]])
+    assert backend.getSize() == 12
+    assert backend.readAt(0, 12) == b"\x00\x00\x00abcdefghi"
+    backend.writeAt(1, b"Z")
+    assert backend.readAt(0, 4) == b"\x00Z\x00a"
+    assert backend.readAt(10, 10) == b"hi"
+    backend.truncate(5)
+    assert backend.getSize() == 5
+    assert backend.readAt(0, 10) == b"\x00Z\x00ab"
+    backend.truncate(0)
+    assert backend.getSize() == 0
+    backend.writevAt(0, storage.Storage.zeros(70_000) + [b"!"])
+    assert backend.readAt(69_999, 5) == b"\x00!"
+    backend.sync()
+
+def test_memory_store_outlives_close(tmp_path):
+    path = tmp_path / "data.bin"
+    with pytest.raises(FileNotFoundError):
+        storage.MemoryStorage(path)
+    store = storage.MemoryStorage(path, create = True)
+    store.writeAt(0, b"kept")
+    store.close()
+    assert not store.isOpen()
+    with pytest.raises(FileExistsError):
+        storage.MemoryStorage(path, create = True)
+    assert storage.MemoryStorage(path).readAt(0, 4) == b"kept"
+    assert not path.exists()
+    storage.MemoryStorage.remove(path)
+    assert not storage.MemoryStorage.exists(path)
+
+def test_mmap_reopens_file_contents(tmp_path):
+    path = tmp_path / "data.bin"
+    mapped = storage.MmapStorage(path, create = True)
+    mapped.writeAt(0, b"mapped bytes")
+    mapped.close()
+    assert path.read_bytes() == b"mapped bytes"
+    mapped = storage.MmapStorage(path)
+    try:
+        assert mapped.readAt(7, 5) == b"bytes"
+    finally:
+        mapped.close()
+
+def test_storage_is_abstract():
+    with pytest.raises(TypeError):
+        storage.Storage()
+
+    class Partial(storage.Storage):
+        def readAt(self, offset: int, length: int) -> bytes:
+            return b""
+
+    with pytest.raises(TypeError):
+        Partial()
+
+def test_mmap_reads_while_another_thread_grows_it(tmp_path):
+    mapped = storage.MmapStorage(tmp_path / "data.bin", create = True)
+    mapped.writeAt(0, b"head")
+    stop = threading.Event()
+    reads = []
+
+    def read():
+        while not stop.is_set():
+            reads.append(mapped.readAt(0, 4))
+
+    reader = threading.Thread(target = read)
+    reader.start()
+    try:
+        for block in range(1, 500):
+            mapped.writeAt(block * 4096, b"grow")
+    finally:
+        stop.set()
+        reader.join()
+    assert reads and all(data == b"head" for data in reads)
+    assert mapped.getSize() == 499 * 4096 + 4
+    mapped.close()
+
+def test_direct_reader_matches_buffered_reads(tmp_path):
+    path = tmp_path / "data.bin"
+    content = bytes(range(256)) * 40
+    path.write_bytes(content)
+    reader = storage.DirectReader(path)
+    try:
+        for offset, length in ((0, 10), (4090, 20), (5000, 6000), (10000, 1000), (20000, 5)):
+            assert reader.readAt(offset, length) == content[offset:offset + length]
+        assert reader.readAt(0, 3 * 1024 * 1024) == content
+    finally:
+        reader.close()
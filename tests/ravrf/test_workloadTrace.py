@@ -0,0 +1,160 @@
+from pathlib import Path
+import pytest
+import random
+import sys
+
+srcPath = f"{Path.cwd()}/src/ravrf"
+sys.path.append(srcPath)
+import raFile
+import workloadTrace
+from blockDescriptor import BlockType
+from storage import MemoryStorage
+
+def tracedWorkload(path: Path, tracePath: Path) -> tuple[list, int, int]:
+    random.seed(42)
+    rave = raFile.raFile.Create(path)
+    rave.StartTrace(tracePath)
+    live = []
+    for round in range(300):
+        choice = random.random()
+        if choice < 0.5 or not live:
+            live.append(rave.Add(b"a" * random.randint(1, 400), random.choice((0, 16))))
+        elif choice < 0.8:
+            index = random.randrange(len(live))
+            live[index] = rave.Save(live[index], b"s" * random.randint(1, 600))
+        elif choice < 0.95:
+            rave.DeleteMany([live.pop(random.randrange(len(live))) for _ in range(min(len(live), 3))])
+        else:
+            rave.PutMeta(b"m" * random.randint(1, 100))
+    rave.Add(b"index", 10, BlockType.INDEX_BLOCK)
+    stats = rave.GetStats()
+    extents = rave.GetFreeExtents()
+    rave.Close()
+    return extents, stats["fileSize"], stats["relocations"]
+
+def test_replay_reproduces_allocation(tmp_path):
+    tracePath = tmp_path / "work.trace"
+    extents, fileSize, relocations = tracedWorkload(tmp_path / "traced.ravrf", tracePath)
+    entries = list(workloadTrace.readTrace(tracePath))
+    assert len(entries) >= 301
+    assert entries[-1][:2] == (workloadTrace.ADD, BlockType.INDEX_BLOCK)
+
+    samples = workloadTrace.replay(tracePath, tmp_path / "replay.ravrf", interval = 100)
+    assert [row["ops"] for row in samples][:3] == [100, 200, 300]
+    assert samples[-1]["ops"] == len(entries)
+    assert samples[-1]["fileSize"] == fileSize
+    assert samples[-1]["relocations"] == relocations
+    assert samples[-1]["freeBlocks"] == len(extents)
+
+    # Close writes the same summary block to both files
+    reopened = []
+    for name in ("traced.ravrf", "replay.ravrf"):
+        rave = raFile.raFile(tmp_path / name)
+        rave.Open()
+        reopened.append(rave.GetFreeExtents())
+        rave.Close()
+    assert reopened[0] == reopened[1]
+
+def test_replay_in_memory_leaves_nothing_behind(tmp_path):
+    tracePath = tmp_path / "work.trace"
+    _, fileSize, _ = tracedWorkload(tmp_path / "traced.ravrf", tracePath)
+    samples = workloadTrace.replay(tracePath, storage = MemoryStorage)
+    assert samples[-1]["fileSize"] == fileSize
+    assert sorted(path.name for path in tmp_path.iterdir()) == ["traced.ravrf", "work.trace"]
+
+@pytest.mark.parametrize("alignment", [0, 256])
+def test_trace_started_on_a_reopened_file_replays(tmp_path, alignment):
+    random.seed(7)
+    path = tmp_path / "existing.ravrf"
+    rave = raFile.raFile.Create(path, alignment = alignment)
+    existing = [rave.Add(b"e" * random.randint(1, 300), random.choice((0, 8))) for _ in range(60)]
+    rave.DeleteMany(existing[10:20])
+    rave.PutMeta(b"meta")
+    rave.Close()
+
+    rave = raFile.raFile(path)
+    rave.Open()
+    rave.StartTrace(tmp_path / "work.trace")
+    rave.Delete(existing[0])
+    rave.Save(existing[30], b"s" * 700)
+    rave.Save(existing[31], b"s")
+    for _ in range(30):
+        rave.Add(b"n" * random.randint(1, 200))
+    rave.PutMeta(b"more meta" * 20)
+    stats = rave.GetStats()
+    freeBlocks = len(rave.GetFreeExtents())
+    rave.Close()
+
+    entries = list(workloadTrace.readTrace(tmp_path / "work.trace"))
+    assert entries[0][0] == workloadTrace.BLOCK
+    samples = workloadTrace.replay(tmp_path / "work.trace", tmp_path / "replay.ravrf")
+    assert samples[-1]["ops"] == sum(1 for entry in entries if entry[0] != workloadTrace.BLOCK)
+    assert (samples[-1]["fileSize"], samples[-1]["freeBlocks"]) == (stats["fileSize"], freeBlocks)
+    assert (samples[-1]["relocations"], samples[-1]["savesInPlace"]) == (1, 1)
+
+def test_add_many_replays_as_one_allocation(tmp_path):
+    random.seed(3)
+    rave = raFile.raFile.Create(tmp_path / "traced.ravrf")
+    rave.StartTrace(tmp_path / "work.trace")
+    live = []
+    for _ in range(50):
+        live += rave.AddMany([b"m" * random.randint(1, 300) for _ in range(5)], random.choice((0, 4)))
+        rave.DeleteMany([live.pop(random.randrange(len(live))) for _ in range(2)])
+    fileSize = rave.GetStats()["fileSize"]
+    extents = rave.GetFreeExtents()
+    rave.Close()
+
+    entries = list(workloadTrace.readTrace(tmp_path / "work.trace"))
+    assert sum(1 for entry in entries if entry[0] == workloadTrace.ADD_MANY) == 50
+    samples = workloadTrace.replay(tmp_path / "work.trace", tmp_path / "replay.ravrf", interval = 7)
+    assert samples[-1]["ops"] == 350
+    assert (samples[-1]["fileSize"], samples[-1]["freeBlocks"]) == (fileSize, len(extents))
+
+def test_trace_stops_and_rejects_other_files(tmp_path):
+    rave = raFile.raFile.Create(tmp_path / "traced.ravrf")
+    rave.StartTrace(tmp_path / "work.trace")
+    rave.Add(b"traced")
+    rave.StopTrace()
+    rave.Add(b"not traced")
+    rave.Close()
+    assert len(list(workloadTrace.readTrace(tmp_path / "work.trace"))) == 1
+    with pytest.raises(ValueError):
+        list(workloadTrace.readTrace(tmp_path / "traced.ravrf"))
+
+def test_streamed_records_replay(tmp_path):
+    random.seed(5)
+    rave = raFile.raFile.Create(tmp_path / "traced.ravrf")
+    rave.StartTrace(tmp_path / "work.trace")
+    live = []
+    for round in range(60):
+        with rave.OpenWriter(random.randint(1, 200)) as writer:
+            # Some writers outgrow their reservation and move
+            writer.write(b"w" * random.randint(1, 400))
+        live.append(writer.rref)
+        if round % 3 == 0:
+            live[0] = rave.Save(live[0], b"s" * random.randint(1, 600))
+        if round % 4 == 0:
+            rave.Delete(live.pop(random.randrange(len(live))))
+    writer = rave.OpenWriter(50)
+    writer.abort()
+    fileSize = rave.GetStats()["fileSize"]
+    extents = rave.GetFreeExtents()
+    rave.Close()
+
+    samples = workloadTrace.replay(tmp_path / "work.trace", tmp_path / "replay.ravrf")
+    assert (samples[-1]["fileSize"], samples[-1]["freeBlocks"]) == (fileSize, len(extents))
+
+def test_trace_started_beside_an_open_writer_replays(tmp_path):
+    rave = raFile.raFile.Create(tmp_path / "traced.ravrf")
+    rave.Add(b"before")
+    writer = rave.OpenWriter(100)
+    rave.StartTrace(tmp_path / "work.trace")
+    writer.write(b"w" * 300)            # outgrows the reservation, which is then deleted
+    writer.close()
+    rave.Delete(writer.rref)
+    fileSize = rave.GetStats()["fileSize"]
+    extents = rave.GetFreeExtents()
+    rave.Close()
+
+    samples = workloadTrace.replay(tmp_path / "work.trace", tmp_path / "replay.ravrf")
+    assert (samples[-1]["fileSize"], samples[-1]["freeBlocks"]) == (fileSize, len(extents))